@@ -1,4 +1,4 @@
-from fastapi import APIRouter, HTTPException, Depends  # 导入FastAPI路由与异常、依赖注入
+from fastapi import APIRouter, HTTPException, Depends, Request  # 导入FastAPI路由与异常、依赖注入
 from pydantic import BaseModel  # 导入Pydantic模型
 from sqlalchemy.orm import Session  # 导入SQLAlchemy会话
 from jose import jwt  # 导入JWT库
@@ -7,12 +7,13 @@ import secrets  # 导入安全随机库
 import hashlib  # 导入哈希库，用于SHA1加密
 import re  # 导入正则表达式库，用于密码验证
 from app.core.database import get_db  # 导入数据库会话依赖
-from app.core.config import SECRET_KEY, ALGORITHM  # 导入JWT配置
+from app.core.config import SECRET_KEY, ALGORITHM, RATE_LIMIT_TRUST_FORWARDED  # 导入JWT与限流配置
 from app.models.user import User  # 导入用户模型
 
 # 新增导入：验证码模型与邮件服务
 from app.models.verification_code import VerificationCode  # 导入验证码模型
-from app.services.email_service import send_email  # 导入邮件发送服务
+from app.services.email_service import email_outbox  # 导入后台发件箱
+from app.services.rate_limiter import send_code_email_limiter, send_code_ip_limiter  # 导入发送验证码限流器
 
 router = APIRouter()  # 创建路由对象
 
@@ -93,13 +94,30 @@ def create_access_token(data: dict, expires_delta: timedelta = None):  # 创建J
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)  # 生成JWT
     return encoded_jwt  # 返回令牌
 
+def _client_ip(http_request: Request) -> str:  # 获取客户端IP（可配置信任反向代理的 X-Forwarded-For）
+    if RATE_LIMIT_TRUST_FORWARDED:
+        forwarded = http_request.headers.get("x-forwarded-for", "")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return http_request.client.host if http_request.client else ""
+
 @router.post("/send-code")
-def send_register_code(request: SendCodeRequest, db: Session = Depends(get_db)):  # 发送注册验证码接口
-    """向邮箱发送注册/重置密码验证码，验证码有效期5分钟"""
+def send_register_code(request: SendCodeRequest, http_request: Request, db: Session = Depends(get_db)):  # 发送注册验证码接口
+    """向邮箱发送注册/重置密码验证码，验证码有效期5分钟；同一邮箱或IP发送过于频繁时返回429"""
     email = request.email.strip()  # 去除首尾空格
     if not email:  # 校验邮箱非空
         raise HTTPException(status_code=400, detail="邮箱不能为空")  # 抛出异常
 
+    # 频率限制（在写库与发信之前）：先按IP，再按邮箱
+    wait = send_code_ip_limiter.acquire(_client_ip(http_request)) or send_code_email_limiter.acquire(email.lower())
+    if wait > 0:
+        retry_after = max(1, int(wait + 0.999))  # 向上取整的建议重试时间
+        raise HTTPException(
+            status_code=429,
+            detail=f"发送过于频繁，请 {retry_after} 秒后重试",
+            headers={"Retry-After": str(retry_after)},
+        )
+
     # 生成6位数字验证码
     code = "".join(secrets.choice("0123456789") for _ in range(6))  # 6位随机数字
 
@@ -124,12 +142,10 @@ def send_register_code(request: SendCodeRequest, db: Session = Depends(get_db)):
     </div>
     """
 
-    try:
-        send_email(to_email=email, subject=subject, html_content=html_content)  # 发送邮件
-    except Exception as e:
-        # 依然返回成功，避免用户已收邮件但接口报错
-        print(f"[send-code] 邮件发送异常，但验证码已入库，email={email}, err={e}")
-        return {"msg": "验证码已发送，请检查邮箱"}
+    # 加入后台发件箱后立即返回，发送失败由发信线程重连重试并记录
+    if not email_outbox.submit(to_email=email, subject=subject, html_content=html_content):
+        # 依然返回成功，验证码已入库，用户可稍后重新获取
+        print(f"[send-code] 发件箱已满，验证码已入库但邮件未发送，email={email}")
 
     return {"msg": "验证码已发送，请检查邮箱"}
 
@@ -1,123 +1,537 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException  # 导入FastAPI组件
-from app.services.recognize_service import fileTrans  # 导入语音转写服务
-from app.services.summarize_service import summarize_text  # 导入文本总结服务
-from app.core.config import ALIYUN_AK_ID, ALIYUN_AK_SECRET, ALIYUN_APP_KEY  # 导入配置
-from app.services.oss_service import upload_bytes_and_get_url  # 导入OSS上传服务
-from app.services.transcode_service import to_mp3_bytes  # 导入转码服务
+from fastapi import APIRouter, HTTPException, Header, Request, Response  # 导入FastAPI组件
+from fastapi.responses import StreamingResponse  # 导入流式响应
+from starlette.concurrency import run_in_threadpool  # 导入线程池执行工具（异步接口中调用任务存储、调度器等阻塞代码）
+from app.services.recognize_service import fileTrans, get_manager  # 导入语音转写服务
+from app.services.segment_service import detect_silences, plan_segments, transcribe_segments  # 导入长音频分段转写
+from app.services.summarize_service import summarize_transcript, save_summary_artifact, SummaryFailed  # 导入文本总结服务
+from app.core.config import ALIYUN_AK_ID, ALIYUN_AK_SECRET, ALIYUN_APP_KEY, SSE_HEARTBEAT_SECONDS, SSE_STORE_POLL_SECONDS, SSE_PARTIAL_FLUSH_SECONDS, ASR_SEGMENT_MIN_DURATION, ASR_BACKEND, BATCH_MAX_ITEMS, BATCH_OBJECT_PREFIX, UPLOAD_MAX_BYTES  # 导入配置
+from app.services.oss_service import upload_stream_and_get_url, upload_file_and_get_url, object_key_from_url, delete_objects, open_object  # 导入OSS上传服务
+from app.services.transcode_service import open_mp3_stream, open_plan_stream, probe_media, plan_transcode, estimate_duration, report_plan  # 导入转码服务
+from app.services.upload_service import spool_upload, spool_multipart, remove_spooled, SpooledFile, UploadTooLargeError  # 导入上传落盘工具
+from app.services.task_scheduler import scheduler, QueueFullError, BATCH_LANE  # 导入任务调度器
+from app.services.task_store import task_store, RESULT_FIELDS, TERMINAL_STATUSES  # 导入任务状态存储
+from app.services.result_cache import result_cache  # 导入内容哈希结果缓存
+from app.services import cancellation  # 导入协作式取消
+from app.services.cancellation import CancelToken, TaskCancelled, run_cancellable  # 导入取消令牌工具
+from app.core import metrics  # 导入进程内指标
+from app.core.log import log_event  # 导入结构化日志
+from app.core.http_cache import make_etag, etag_matches, set_etag, not_modified  # 导入条件请求工具
+from app.services.task_events import task_events  # 导入任务事件中心（SSE推送）
 
 # ============== 异步任务接口（前端调用） ==============
-import threading  # 导入线程库
+import asyncio  # 导入asyncio（SSE生成器在事件循环中等待）
 import uuid  # 导入uuid生成工具
+import time  # 导入时间库
+import os  # 导入文件操作
+import json  # 导入json，用于SSE数据编码
+from typing import List, Optional  # 导入类型注解
+from urllib.parse import parse_qs  # 解析仅含普通字段的表单
 
 router = APIRouter()  # 创建路由对象
 
-# 任务状态存储（内存字典，生产可替换为Redis/数据库）
-# 结构：tasks[task_id] = {"status": str, "progress": int, "stage": str, "error": str|None, "transcript": str|None, "summary": str|None, "cancelled": bool}
-tasks = {}  # 初始化任务表
+# 任务状态存储在 task_store 中（数据库或内存，见 TASK_STORE_BACKEND），多worker进程共享
+# 字段：status, progress, stage, error, transcript, summary, cancelled
 
-def _is_cancelled(task_id: str) -> bool:  # 检查任务是否被取消
-    return tasks.get(task_id, {}).get("cancelled", False)  # 读取取消标记
+def _check_cancelled(task_id: str) -> bool:  # 读取存储中的取消标记（供其它worker进程的取消生效）
+    return task_store.is_cancelled(task_id)  # 读取取消标记
 
-def _run_task(task_id: str, file_link: str):  # 后台执行任务函数
+def _extract_transcript(recog_resp) -> tuple:  # 从转写响应中提取 (全文, 句子文本列表)
+    if not recog_resp or not isinstance(recog_resp, dict):
+        raise RuntimeError("转写服务返回异常")  # 抛出异常
+    # 提取转写文本（保留句子边界，供长文本分块总结使用）
+    transcript = ""
+    sentences = []
     try:
-        if _is_cancelled(task_id):  # 若已取消
-            tasks[task_id].update({"status": "cancelled", "stage": "cancelled", "progress": 0})  # 标记取消
-            return  # 结束
-        tasks[task_id].update({"status": "running", "stage": "recognizing", "progress": 10})  # 更新为识别阶段
-        # 调用转写（注意：此步骤内部轮询较久，取消会在步骤结束后生效）
-        recog_resp = fileTrans(ALIYUN_AK_ID, ALIYUN_AK_SECRET, ALIYUN_APP_KEY, file_link)  # 执行转写
-        if _is_cancelled(task_id):  # 步骤返回后再次检查取消
-            tasks[task_id].update({"status": "cancelled", "stage": "cancelled", "progress": 0})
-            return
-        if not recog_resp or not isinstance(recog_resp, dict):
-            raise RuntimeError("转写服务返回异常")  # 抛出异常
-        # 提取转写文本
+        result = recog_resp.get("Result") or {}
+        sentences = [seg.get("Text", "") for seg in (result.get("Sentences") or [])]
+        transcript = "".join(sentences)
+        if not transcript:
+            transcript = result.get("Result", "") or result.get("Text", "") or ""
+    except Exception:
         transcript = ""
-        try:
-            result = recog_resp.get("Result") or {}
-            sentences = result.get("Sentences") or []
-            transcript = "".join([seg.get("Text", "") for seg in sentences])
-            if not transcript:
-                transcript = result.get("Result", "") or result.get("Text", "") or ""
-        except Exception:
-            transcript = ""
-        if not transcript.strip():
-            raise RuntimeError("未识别到有效语音内容")  # 无有效文本
-        tasks[task_id].update({"progress": 60, "stage": "summarizing", "transcript": transcript})  # 更新进度与转写文本
-        if _is_cancelled(task_id):  # 在进入总结前检查取消
-            tasks[task_id].update({"status": "cancelled", "stage": "cancelled"})
+    if not transcript.strip():
+        raise RuntimeError("未识别到有效语音内容")  # 无有效文本
+    return transcript, sentences
+
+def _transcribe(token: CancelToken, file_link: str, duration: float = None) -> tuple:  # 调用语音转写，返回 (全文, 句子文本列表)
+    # 调用转写（轮询由共享的事件循环完成，本线程只等待结果；取消会立即停止轮询）
+    with scheduler.stage("asr", token):  # 受转写等待并发上限约束
+        recog_resp = fileTrans(ALIYUN_AK_ID, ALIYUN_AK_SECRET, ALIYUN_APP_KEY, file_link, duration, cancel_token=token)  # 执行转写
+    return _extract_transcript(recog_resp)
+
+def _stream_upload(stream, started: float, **fields) -> None:  # 记录边转码边上传的耗时拆分
+    # 等待ffmpeg输出的时间计为转码，其余时间为OSS上传
+    elapsed = time.monotonic() - started
+    metrics.observe_stage("transcode", stream.read_seconds)
+    metrics.observe_stage("oss_put", max(0.0, elapsed - stream.read_seconds))
+    log_event("span", stage="transcode+oss_put", seconds=round(elapsed, 3), transcode_seconds=round(stream.read_seconds, 3), bytes=stream.bytes_read, **fields)
+
+def _upload_audio(task_id: str, token: CancelToken, src_path: str, filename: str, plan, digest: Optional[str] = None) -> tuple:  # 按转码方案处理并上传音频，返回 (URL, 时长秒)
+    base = filename.rsplit('.', 1)[0]
+    source_bytes = os.path.getsize(src_path)
+    started = time.monotonic()
+    if plan.action == "passthrough":  # 源音频已符合要求：直接上传原文件（按内容SHA-256断点续传，重新提交相同文件时跳过已上传的分片）
+        with metrics.span("oss_put", task_id=task_id, bytes=source_bytes):
+            file_link = upload_file_and_get_url(src_path, base + plan.ext, plan.content_type, folder='uploads/audio', cancel_token=token, resume_key=digest)
+        encoded_bytes = source_bytes
+    else:
+        # 复制音轨或重新编码：ffmpeg输出经管道直接流式上传，不落盘也不整体驻留内存；取消时结束ffmpeg并放弃上传
+        with scheduler.stage("transcode", token):  # 受转码并发上限约束
+            with open_plan_stream(src_path, plan, cancel_token=token) as audio:  # 从暂存文件转码
+                upload_started = time.monotonic()
+                file_link = upload_stream_and_get_url(audio, base + plan.ext, plan.content_type, folder='uploads/audio', cancel_token=token)  # 边转码边上传
+                _stream_upload(audio, upload_started, task_id=task_id, action=plan.action)
+                encoded_bytes = audio.bytes_read
+        plan = plan._replace(duration=estimate_duration(plan, encoded_bytes))
+    report_plan(plan, source_bytes, encoded_bytes, time.monotonic() - started)
+    return file_link, plan.duration
+
+def _transcribe_segmented(task_id: str, token: CancelToken, src_path: str, filename: str, duration: float) -> tuple:  # 按静音分段并行转写长音频
+    with scheduler.stage("transcode", token):  # 静音检测需完整解码音频，受转码并发上限约束
+        segments = plan_segments(duration, detect_silences(src_path, cancel_token=token))
+    log_event("asr_segmented", task_id=task_id, duration=round(duration), segments=len(segments))
+    base = filename.rsplit('.', 1)[0]
+    object_keys = []  # 片段音频只用于转写，结束后删除
+
+    def prepare(index: int, start: float, end: float, abort: CancelToken) -> str:  # 转码并上传一个片段（abort 在任务取消或其它片段失败时触发）
+        with scheduler.stage("transcode", abort):
+            with open_mp3_stream(src_path=src_path, cancel_token=abort, start=start, duration=end - start) as audio:
+                upload_started = time.monotonic()
+                link = upload_stream_and_get_url(audio, f"{base}_part{index:03d}.mp3", 'audio/mpeg', folder='uploads/segments', cancel_token=abort)
+                _stream_upload(audio, upload_started, task_id=task_id, segment=index)
+        object_keys.append(object_key_from_url(link))
+        return link
+
+    def on_segment(done: int, total: int) -> None:  # 识别阶段进度 10 -> 60
+        _update(task_id, progress=10 + int(50 * done / total))
+
+    manager = get_manager(ALIYUN_AK_ID, ALIYUN_AK_SECRET, ALIYUN_APP_KEY)
+    try:
+        with scheduler.stage("asr", token):  # 整个任务占用一个转写等待名额
+            recog_resp = transcribe_segments(segments, prepare, manager.submit, cancel_token=token, on_segment=on_segment)
+    finally:
+        _cleanup_objects(task_id, object_keys)
+    return _extract_transcript(recog_resp)
+
+PROGRESS_FIELDS = ("status", "progress", "stage", "error", "cancelled", "summary_url")  # 推送给进度订阅者的小字段
+
+def _update(task_id: str, **fields) -> None:  # 写入任务存储，并向进度订阅者推送变化的小字段
+    task_store.update(task_id, **fields)
+    delta = {k: v for k, v in fields.items() if k in PROGRESS_FIELDS}
+    for key in ("transcript", "summary"):  # 大字段只推送"已就绪"标记，内容按需通过 /status 获取
+        if fields.get(key):
+            delta[f"{key}_ready"] = True
+    if delta:
+        task_events.publish(task_id, "progress", delta)
+
+def _save_summary_url(task_id: str, digest: str, url: str) -> None:  # 总结产物上传完成后记录URL
+    task_store.update(task_id, summary_url=url)
+    result_cache.store(digest, summary_url=url)
+
+def _cleanup_objects(task_id: str, object_keys: list) -> None:  # 删除任务创建的OSS对象
+    try:
+        delete_objects(object_keys)
+    except Exception as e:
+        print(f"[summary] 清理OSS对象失败 task_id={task_id}, keys={object_keys}, err={e}")
+
+def _run_task(task_id: str, src_path: str, filename: str, digest: str = None):  # 后台执行任务函数（由调度器工作线程调用）
+    token = cancellation.register(task_id, lambda: _check_cancelled(task_id))  # 协作式取消令牌
+    created_objects = []  # 本任务上传的OSS对象（取消时清理）
+    task_events.open(task_id)  # 创建事件通道，供 /stream 订阅
+
+    partial = []  # 已生成的总结片段
+    flushed_at = [0.0]  # 上次写入任务存储的时间
+
+    def on_token(text: str) -> None:  # 总结流式输出回调：转发给本进程的SSE订阅者，并定期写入任务存储供其它worker进程的订阅者读取
+        token.raise_if_cancelled()  # 取消后中断流式读取
+        task_events.publish(task_id, "token", text)
+        partial.append(text)
+        now = time.monotonic()
+        if SSE_PARTIAL_FLUSH_SECONDS > 0 and now - flushed_at[0] >= SSE_PARTIAL_FLUSH_SECONDS:
+            flushed_at[0] = now
+            task_store.save_partial(task_id, "".join(partial))
+    try:
+        token.raise_if_cancelled()  # 排队期间已取消
+        cached = result_cache.lookup(digest)  # 按内容哈希查找已有阶段产物
+        if cached.get("summary"):  # 排队期间相同内容已完成总结
+            _update(task_id, status="done", progress=100, stage="finished", transcript=cached.get("transcript"), summary=cached["summary"], summary_url=cached.get("summary_url"))
             return
-        # 生成总结
-        import tempfile, os
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.txt', mode='w', encoding='utf-8') as tf:
-            tf.write(transcript)
-            temp_path = tf.name
+        _update(task_id, status="running", stage="transcoding", progress=5)  # 更新为转码阶段
+        file_link = cached.get("audio_url")  # 命中音频层则跳过转码上传
+        duration = None  # 音频时长（秒），用于决定转写轮询节奏
+        transcript = cached.get("transcript")  # 命中转写层则跳过转写
+        sentences = None  # 句子列表（缓存命中时由总结服务按标点切分）
+        plan = None  # 转码方案（先探测源文件）
+        if not file_link and not transcript:
+            plan = plan_transcode(probe_media(src_path), filename)
+            duration = plan.duration
+            if ASR_SEGMENT_MIN_DURATION > 0 and duration and duration >= ASR_SEGMENT_MIN_DURATION:  # 长音频：分段并行转码、上传与转写
+                _update(task_id, stage="recognizing", progress=10)
+                transcript, sentences = _transcribe_segmented(task_id, token, src_path, filename, duration)
+                result_cache.store(digest, transcript=transcript)  # 缓存转写文本（片段音频不缓存）
+        if not file_link and not transcript:
+            file_link, duration = _upload_audio(task_id, token, src_path, filename, plan, digest)
+            if not file_link:
+                raise RuntimeError("文件处理失败，请重试")
+            created_objects.append(object_key_from_url(file_link))
+        remove_spooled(src_path)  # 尽早删除暂存文件
+        token.raise_if_cancelled()  # 转码上传后检查取消
+        if not transcript:
+            _update(task_id, stage="recognizing", progress=10)  # 更新为识别阶段
+            transcript, sentences = _transcribe(token, file_link, duration)
+            result_cache.store(digest, audio_url=file_link, transcript=transcript)  # 缓存音频对象与转写文本
+        created_objects = []  # 音频已进入缓存，之后取消也不再删除
+        _update(task_id, progress=60, stage="summarizing", transcript=transcript)  # 更新进度与转写文本
+        token.raise_if_cancelled()  # 在进入总结前检查取消
+        # 生成总结（转写文本直接在内存中传递）
         try:
-            summary = summarize_text(input_file=temp_path)
-        finally:
-            try:
-                os.remove(temp_path)
-            except Exception:
-                pass
-        if _is_cancelled(task_id):  # 总结后再检查一次取消
-            tasks[task_id].update({"status": "cancelled", "stage": "cancelled"})
-            return
+            summary = run_cancellable(token, summarize_transcript, transcript, sentences=sentences, on_token=on_token, cancel_token=token)  # 长文本按句子分块并行总结；每次模型请求各占一个大模型阶段空位；取消时立即释放工作线程
+        except SummaryFailed as e:  # 调用失败或审核未通过：展示提示文本，但不缓存、不上传产物
+            summary, succeeded = e.result, False
+        else:
+            succeeded = bool(summary)
+        if succeeded:
+            result_cache.store(digest, summary=summary)  # 只缓存成功生成的总结
+            save_summary_artifact(summary, on_done=lambda url: _save_summary_url(task_id, digest, url))  # 产物在后台上传，不阻塞任务完成
         if not summary:
             summary = "(总结生成失败或为空)"  # 占位
-        tasks[task_id].update({"status": "done", "progress": 100, "stage": "finished", "summary": summary})  # 完成
+        _update(task_id, status="done", progress=100, stage="finished", summary=summary)  # 完成
+    except TaskCancelled:
+        _update(task_id, status="cancelled", stage="cancelled", progress=0)  # 标记取消
+        _cleanup_objects(task_id, created_objects)  # 删除本任务留下的OSS对象
     except Exception as e:
-        tasks[task_id].update({"status": "error", "stage": "failed", "error": str(e)})  # 标记失败
+        _update(task_id, status="error", stage="failed", error=str(e))  # 标记失败
+    finally:
+        remove_spooled(src_path)  # 确保暂存文件被删除（取消/失败时）
+        task_events.close(task_id)  # 通知SSE订阅者任务已结束
+        cancellation.unregister(task_id)
+        if token.cancelled_at is not None:  # 记录 取消->工作线程释放 的延迟
+            metrics.inc("task_cancel_free_seconds_sum", time.monotonic() - token.cancelled_at)
+            metrics.inc("task_cancel_free_count")
 
-@router.post("/start")
-def start_task(  # 提交任务接口
-    file: UploadFile = File(...),  # 上传文件（必需）
-):
-    """提交任务，返回 task_id，后台异步执行识别与总结。上传本地文件后先转mp3再上传OSS。"""
-    # 校验配置
-    if not (ALIYUN_AK_ID and ALIYUN_AK_SECRET and ALIYUN_APP_KEY):
+def _check_config() -> None:  # 校验语音识别配置
+    if ASR_BACKEND != "fake" and not (ALIYUN_AK_ID and ALIYUN_AK_SECRET and ALIYUN_APP_KEY):
         raise HTTPException(status_code=500, detail="缺少阿里云语音识别配置")
-    # 转mp3并上传到OSS
+
+MULTIPART_PART_OVERHEAD = 64 * 1024  # 每个multipart部分除文件内容外的开销上限（边界、部分头、字段值）
+
+def _multipart_body(properties: dict, required: list) -> dict:  # 接口文档中的 multipart 请求体（请求体由 spool_multipart 流式解析，不经过FastAPI表单参数）
+    return {"requestBody": {"required": True, "content": {"multipart/form-data": {"schema": {"type": "object", "properties": properties, "required": required}}}}}
+
+async def _receive_upload(request: Request, file_field: str, max_files: int) -> tuple:
+    """边接收请求体边写入暂存文件（内存占用与文件大小无关），返回 (上传文件列表, 普通字段)
+    Content-Length 已超出上限时不读取请求体直接返回413；接收过程中单个文件超出上限时立即停止接收"""
+    try:
+        declared = int(request.headers.get("content-length") or 0)
+    except ValueError:
+        declared = 0
+    if declared > max_files * (UPLOAD_MAX_BYTES + MULTIPART_PART_OVERHEAD):
+        raise HTTPException(status_code=413, detail=str(UploadTooLargeError(UPLOAD_MAX_BYTES)))
+    if request.headers.get("content-type", "").startswith("application/x-www-form-urlencoded"):  # 仅含普通字段（如 object_keys）的表单
+        body = b""
+        async for chunk in request.stream():
+            body += chunk
+            if len(body) > MULTIPART_PART_OVERHEAD:
+                raise HTTPException(status_code=413, detail="表单内容过长")
+        return [], parse_qs(body.decode("utf-8", "replace"))
     try:
-        file_bytes = file.file.read()
-        mp3_bytes = to_mp3_bytes(file_bytes, file.filename or "upload.bin")  # 转为mp3
-        file_link = upload_bytes_and_get_url(mp3_bytes, (file.filename or "upload").rsplit('.',1)[0] + '.mp3', 'audio/mpeg', folder='uploads/audio')  # 上传
+        with metrics.span("upload_read", declared_bytes=declared):
+            return await spool_multipart(request.headers.get("content-type"), request.stream(), file_field, max_files)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"转码或上传到OSS失败：{str(e)}")
-    if not file_link:
-        raise HTTPException(status_code=400, detail="文件处理失败，请重试")
-    # 生成task_id并初始化状态
+        raise HTTPException(status_code=500, detail=f"读取上传文件失败：{str(e)}")
+
+def _create_task(src_path: Optional[str], digest: Optional[str], **fields) -> tuple:
+    """创建任务记录，返回 (task_id, 是否命中缓存)；内容哈希命中总结层时直接创建已完成的任务并删除暂存文件"""
     task_id = uuid.uuid4().hex  # 生成唯一ID
-    tasks[task_id] = {"status": "queued", "progress": 0, "stage": "queued", "error": None, "transcript": None, "summary": None, "cancelled": False}  # 初始化任务
-    # 启动后台线程
-    t = threading.Thread(target=_run_task, args=(task_id, file_link), daemon=True)  # 创建守护线程
-    t.start()  # 启动线程
-    return {"task_id": task_id}  # 返回任务ID
+    cached = result_cache.lookup(digest, count=False) if digest else {}  # 未命中由工作线程计数
+    if cached.get("summary"):
+        result_cache.count_hit("summary")
+        remove_spooled(src_path)
+        task_store.create(task_id, status="done", progress=100, stage="finished", cancelled=False, transcript=cached.get("transcript"), summary=cached["summary"], summary_url=cached.get("summary_url"), **fields)
+        return task_id, True
+    task_store.create(task_id, status="queued", progress=0, stage="queued", cancelled=False, **fields)  # 初始化任务
+    return task_id, False
+
+def _queue_full(e: QueueFullError) -> HTTPException:  # 队列已满时的429响应
+    retry_after = max(1, int(e.eta_seconds))  # 建议重试时间
+    return HTTPException(
+        status_code=429,
+        detail=f"当前任务较多，请约 {retry_after} 秒后重试",
+        headers={"Retry-After": str(retry_after)},
+    )
+
+@router.post("/start", openapi_extra=_multipart_body({"file": {"type": "string", "format": "binary"}}, ["file"]))
+async def start_task(request: Request):  # 提交任务接口（上传文件字段：file）
+    """提交任务，返回 task_id 与排队信息；转mp3、上传OSS、识别与总结均在后台工作线程中执行。队列已满时返回429。
+    相同内容（SHA-256）已有总结时直接返回已完成的任务。请求体边接收边写入暂存文件，超过 UPLOAD_MAX_BYTES 时立即返回413。"""
+    _check_config()  # 校验配置
+    files, _ = await _receive_upload(request, "file", max_files=1)
+    if not files:
+        raise HTTPException(status_code=400, detail="请上传文件")
+    return await run_in_threadpool(_start_spooled, files[0])
+
+def _start_spooled(upload: SpooledFile) -> dict:  # 为已落盘的上传创建并提交任务
+    # 生成task_id并初始化状态
+    task_id, cached = _create_task(upload.path, upload.digest)
+    if cached:
+        return {"task_id": task_id, "queue_position": None, "eta_seconds": 0, "cached": True}
+    # 提交到调度器队列
+    try:
+        position = scheduler.submit(task_id, _run_task, upload.path, upload.filename or "upload.bin", upload.digest)  # 入队
+    except QueueFullError as e:
+        task_store.delete(task_id)  # 未入队则移除任务
+        remove_spooled(upload.path)  # 删除暂存文件
+        raise _queue_full(e)
+    task_events.open(task_id)  # 排队期间即可订阅 /stream
+    return {"task_id": task_id, "queue_position": position, "eta_seconds": scheduler.estimate_wait(position), "cached": False}  # 返回任务ID与排队信息
+
+def _run_object_task(task_id: str, object_key: str, filename: str):  # 批量提交的OSS对象：先下载到暂存文件，再按普通任务执行
+    if task_store.is_cancelled(task_id):  # 排队期间已取消
+        _update(task_id, status="cancelled", stage="cancelled", progress=0)
+        task_events.close(task_id)
+        return
+    try:
+        _update(task_id, status="running", stage="downloading", progress=1)
+        with metrics.span("oss_get", task_id=task_id, object_key=object_key):
+            src_path, _, digest = spool_upload(open_object(object_key), filename)  # 边下载边计算SHA-256（用于结果缓存）
+    except Exception as e:
+        _update(task_id, status="error", stage="failed", error=f"读取OSS对象失败：{str(e)}")
+        task_events.close(task_id)
+        return
+    _run_task(task_id, src_path, filename, digest)
+
+@router.post("/batch", openapi_extra=_multipart_body({
+    "files": {"type": "array", "items": {"type": "string", "format": "binary"}},  # 多个上传文件
+    "object_keys": {"type": "array", "items": {"type": "string"}},  # 已在OSS中的对象名（可重复该字段）
+}, []))
+async def start_batch(request: Request):  # 批量提交接口
+    """一次提交多个文件（files）或OSS对象（object_keys），返回 batch_id 与各项的 task_id、排队信息。
+    批次中的任务进入所有批次共用的调度通道，与单个提交轮转执行；队列容纳不下整个批次时全部拒绝并返回429。"""
+    _check_config()  # 校验配置
+    limit = min(BATCH_MAX_ITEMS, scheduler.queue_limit)
+    uploads, fields = await _receive_upload(request, "files", max_files=limit)
+    try:
+        return await run_in_threadpool(_start_batch, uploads, fields.get("object_keys", []), limit)
+    except HTTPException:
+        for upload in uploads:
+            remove_spooled(upload.path)
+        raise
+
+def _start_batch(uploads: list, object_keys: list, limit: int) -> dict:  # 校验并提交批次（失败时由调用方删除暂存文件）
+    object_keys = [k.strip() for k in object_keys if k.strip()]
+    count = len(uploads) + len(object_keys)
+    if not count:
+        raise HTTPException(status_code=400, detail="请至少提供一个文件或OSS对象")
+    if count > limit:
+        raise HTTPException(status_code=400, detail=f"单个批次最多 {limit} 项")
+    if object_keys and not BATCH_OBJECT_PREFIX:  # 未配置允许的前缀时不接受OSS对象（接口无鉴权，不能读取桶内任意对象）
+        raise HTTPException(status_code=403, detail="未开放按OSS对象名提交")
+    for key in object_keys:
+        if not key.startswith(BATCH_OBJECT_PREFIX) or ".." in key.split("/"):
+            raise HTTPException(status_code=400, detail=f"OSS对象名须以 {BATCH_OBJECT_PREFIX} 开头：{key}")
+    spooled = [(u.path, u.digest, u.filename or "upload.bin") for u in uploads]  # (暂存路径, SHA-256, 文件名)
+    batch_id = uuid.uuid4().hex
+    items, entries = [], []  # 响应中的各项；待入队的 (task_id, fn, args)
+    for index, (src_path, digest, filename) in enumerate(spooled):
+        task_id, cached = _create_task(src_path, digest, batch_id=batch_id, batch_index=index)
+        items.append({"task_id": task_id, "filename": filename, "cached": cached})
+        if not cached:
+            entries.append((task_id, _run_task, (src_path, filename, digest)))
+    for offset, key in enumerate(object_keys):
+        task_id, _ = _create_task(None, None, batch_id=batch_id, batch_index=len(spooled) + offset)
+        items.append({"task_id": task_id, "object_key": key, "cached": False})
+        entries.append((task_id, _run_object_task, (key, os.path.basename(key) or "object.bin")))
+    positions = []
+    if entries:
+        try:
+            positions = scheduler.submit_many(entries, lane=BATCH_LANE)  # 整个批次原子入队（所有批次共用一个通道，与单个提交轮转）
+        except QueueFullError as e:
+            for item in items:
+                task_store.delete(item["task_id"])  # 未入队则移除整个批次
+            for src_path, _, _ in spooled:
+                remove_spooled(src_path)
+            raise _queue_full(e)
+    queued = dict(zip((entry[0] for entry in entries), positions))
+    for item in items:
+        position = queued.get(item["task_id"])
+        if position is not None:
+            task_events.open(item["task_id"])  # 排队期间即可订阅 /stream
+        item["queue_position"] = position
+        item["eta_seconds"] = scheduler.estimate_wait(position) if position else 0
+    return {"batch_id": batch_id, "items": items}
+
+@router.get("/batch/status")
+def get_batch_status(batch_id: str, response: Response, if_none_match: Optional[str] = Header(None)):  # 查询批次进度接口
+    """返回批次汇总进度（各状态数量、平均进度、是否全部结束）与各项的小字段状态；转写/总结请按 task_id 调用 /status 获取"""
+    tasks = task_store.list_batch(batch_id)  # 一次查询，不读取大字段
+    if not tasks:
+        raise HTTPException(status_code=404, detail="批次不存在")
+    etag = make_etag("batch", batch_id, [(t["task_id"], t.get("version")) for t in tasks])
+    if etag_matches(if_none_match, etag):
+        return not_modified(etag)
+    counts = {}
+    for t in tasks:
+        counts[t.get("status")] = counts.get(t.get("status"), 0) + 1
+    set_etag(response, etag)
+    return {
+        "batch_id": batch_id,
+        "total": len(tasks),
+        "counts": counts,  # 状态 -> 数量
+        "progress": round(sum(t.get("progress") or 0 for t in tasks) / len(tasks)),  # 平均进度
+        "finished": all(t.get("status") in TERMINAL_STATUSES for t in tasks),  # 是否全部结束
+        "items": [{"task_id": t["task_id"], **{k: t.get(k) for k in PROGRESS_FIELDS}} for t in tasks],
+    }
 
 @router.get("/status")
-def get_status(task_id: str):  # 查询任务状态接口
-    """根据 task_id 查询任务状态与进度，返回部分结果（如有）"""
-    data = tasks.get(task_id)  # 获取任务
+def get_status(  # 查询任务状态接口
+    task_id: str,
+    response: Response,
+    compact: bool = False,
+    include: str = "",
+    if_none_match: Optional[str] = Header(None),  # 客户端缓存的ETag
+):
+    """根据 task_id 查询任务状态与进度，返回部分结果（如有）
+    compact=true 时只返回小字段：转写/总结仅在 include 中列出时返回（如 include=summary）
+    队列统计（等待时长等随时间变化）仅在 include 含 queue 时返回，此类响应不带 ETag
+    其它响应带 ETag（任务版本号 + 排队位置 + 请求的字段）；If-None-Match 命中时只读取任务版本号并返回304"""
+    requested = set(include.split(","))
+    wanted = set(RESULT_FIELDS) if not compact else requested & set(RESULT_FIELDS)
+    with_queue = "queue" in requested
+    queued_at = scheduler.position(task_id)  # 不在本进程队列中时为None
+    variant = [compact, sorted(wanted)]
+    if if_none_match and not with_queue:
+        version = task_store.get_version(task_id)  # 只读版本号，不读取任务其它字段
+        if version is None:
+            raise HTTPException(status_code=404, detail="任务不存在")
+        etag = make_etag("task", task_id, version, queued_at, variant)
+        if etag_matches(if_none_match, etag):
+            metrics.inc("status_not_modified")
+            return not_modified(etag)
+    data = task_store.get(task_id, include_results=bool(wanted))  # 获取任务（不需要时不读取大字段）
     if not data:  # 未找到
-        raise HTTPException(status_code=404, detail="任务不存在")  # 返回404
-    # 返回当前状态
-    return {
+        raise HTTPException(status_code=404, detail="任务不存在")
+    # 排队中的任务附带队列位置与预计等待时间
+    position = queued_at if data.get("status") == "queued" else None
+    result = {
         "task_id": task_id,
         "status": data.get("status"),
         "progress": data.get("progress"),
         "stage": data.get("stage"),
         "error": data.get("error"),
-        "transcript": data.get("transcript"),  # 识别完成后可返回
-        "summary": data.get("summary"),  # 完成后返回
         "cancelled": data.get("cancelled", False),  # 是否已取消
+        "summary_url": data.get("summary_url"),  # 总结产物URL（后台上传完成后才有）
+        "queue_position": position,  # 队列位置（仅排队中）
+        "eta_seconds": scheduler.estimate_wait(position) if position else None,  # 预计等待秒数（仅排队中，随排队位置变化）
     }
+    for key in RESULT_FIELDS:  # transcript 识别完成后可返回，summary 完成后返回
+        if key in wanted:
+            result[key] = data.get(key)
+    if with_queue:
+        result["queue"] = scheduler.stats()  # 队列深度、等待时间等调度统计
+        response.headers["Cache-Control"] = "no-store"
+    else:
+        set_etag(response, make_etag("task", task_id, data.get("version"), queued_at, variant))
+    return result
 
 @router.post("/cancel")
 def cancel_task(task_id: str):  # 取消任务接口
-    """设置任务为取消状态（最佳努力取消，可能需等待当前步骤结束）"""
-    if task_id not in tasks:  # 任务不存在
+    """设置任务为取消状态；运行中的任务会中断当前步骤（结束ffmpeg、停止转写轮询、放弃上传与大模型等待）"""
+    data = task_store.get(task_id, include_results=False)  # 获取任务（不读取大字段）
+    if not data:  # 任务不存在
         raise HTTPException(status_code=404, detail="任务不存在")
-    tasks[task_id]["cancelled"] = True  # 标记取消
+    _update(task_id, cancelled=True)  # 标记取消（任意worker进程均可见）
+    cancellation.cancel(task_id)  # 任务在本进程运行时立即中断
     # 若尚未开始运行，可立即置为取消
-    if tasks[task_id].get("status") in ("queued",):
-        tasks[task_id].update({"status": "cancelled", "stage": "cancelled", "progress": 0})
+    if data.get("status") in ("queued",):
+        _update(task_id, status="cancelled", stage="cancelled", progress=0)
     return {"msg": "任务已标记为取消", "task_id": task_id}  # 返回结果
+
+def _sse(event: str, data, event_id: Optional[int] = None) -> str:  # 编码一条SSE消息
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+def _final_events(task_id: str, with_summary: bool) -> list:  # 任务已结束时，从任务存储读取最终结果（在线程池中调用）
+    data = task_store.get(task_id, include_results=with_summary) or {}
+    status = data.get("status")
+    messages = []
+    if with_summary and status == "done":
+        messages.append(_sse("summary", {"text": data.get("summary") or ""}))
+    messages.append(_sse("end", {"status": status, "error": data.get("error")}))
+    return messages
+
+async def _stream_events(task_id: str, last_id: int, kind: str):  # SSE事件生成器（异步：等待期间不占用线程池），只转发 kind 类型的事件
+    if not task_events.has_channel(task_id):  # 任务不在本进程运行：按 SSE_STORE_POLL_SECONDS 轮询任务存储
+        sent = 0  # 已推送的总结文本长度（token）
+        last_progress = None  # 上次推送的进度（progress）
+        beat = time.monotonic()  # 上次发送数据的时间（用于心跳）
+        while True:
+            data = await run_in_threadpool(task_store.get, task_id, False) or {}
+            if data.get("status") in TERMINAL_STATUSES:
+                for message in await run_in_threadpool(_final_events, task_id, kind == "token"):
+                    yield message
+                return
+            message = None
+            if kind == "progress":  # 只在存储中的进度变化时推送
+                progress = {k: data.get(k) for k in PROGRESS_FIELDS}
+                if progress != last_progress:
+                    last_progress, message = progress, _sse("progress", progress)
+            elif data.get("stage") == "summarizing":  # 读取运行任务的进程定期写入的已生成文本，只推送新增部分
+                text = await run_in_threadpool(task_store.get_partial, task_id) or ""
+                if len(text) > sent:
+                    message = _sse("token", {"text": text[sent:]})  # 不带id：事件序号只在任务所在进程内有效
+                    sent = len(text)
+            if message is None and time.monotonic() - beat >= SSE_HEARTBEAT_SECONDS:
+                message = ": keep-alive\n\n"  # 心跳注释
+            if message is not None:
+                beat = time.monotonic()
+                yield message
+            await asyncio.sleep(SSE_STORE_POLL_SECONDS)
+            if task_events.has_channel(task_id):  # 排队后在本进程开始运行
+                break
+    async for item in task_events.subscribe(task_id, last_id, timeout=SSE_HEARTBEAT_SECONDS):
+        if item is None:
+            yield ": keep-alive\n\n"  # 心跳注释
+            continue
+        event_id, event, payload = item
+        if event == kind:
+            yield _sse(event, {"text": payload} if kind == "token" else payload, event_id)
+    for message in await run_in_threadpool(_final_events, task_id, kind == "token"):
+        yield message
+
+def _sse_response(task_id: str, last_event_id: Optional[str], kind: str) -> StreamingResponse:
+    if not task_store.get(task_id, include_results=False):
+        raise HTTPException(status_code=404, detail="任务不存在")
+    try:
+        last_id = int(last_event_id) if last_event_id else 0
+    except ValueError:
+        last_id = 0
+    return StreamingResponse(
+        _stream_events(task_id, last_id, kind),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.get("/stream")
+def stream_summary(task_id: str, last_event_id: Optional[str] = Header(None)):  # 总结流式输出接口（SSE）
+    """
+    以 Server-Sent Events 推送总结生成过程中的增量文本
+    - event: token   data: {"text": 新增片段}（带 id，可用 Last-Event-ID 断线续传）
+      任务在其它worker进程运行时，按 SSE_STORE_POLL_SECONDS 读取该进程定期写入任务存储的已生成文本，token 事件不带 id
+    - event: summary data: {"text": 完整总结}（任务完成时，以存储中的最终结果为准）
+    - event: end     data: {"status": 终态, "error": 错误信息}
+    """
+    return _sse_response(task_id, last_event_id, "token")
+
+@router.get("/events")
+def stream_progress(task_id: str, last_event_id: Optional[str] = Header(None)):  # 任务进度推送接口（SSE）
+    """
+    以 Server-Sent Events 推送任务进度，替代轮询 /status
+    - event: progress data: 变化的字段（status/progress/stage/error/cancelled，及 transcript_ready/summary_ready 标记）
+      任务在其它worker进程运行时，每 SSE_STORE_POLL_SECONDS 读取一次任务存储，只在进度变化时推送；心跳仍按 SSE_HEARTBEAT_SECONDS
+    - event: end      data: {"status": 终态, "error": 错误信息}；结果可通过 /status?compact=true&include=summary 获取一次
+    """
+    return _sse_response(task_id, last_event_id, "progress")
@@ -1,12 +1,17 @@
-from fastapi import APIRouter, Depends, HTTPException, Header  # 导入FastAPI组件
+import json  # 导入json，用于NDJSON导出
+from fastapi import APIRouter, Depends, HTTPException, Header, Query, Response  # 导入FastAPI组件
+from fastapi.responses import StreamingResponse  # 导入流式响应
 from sqlalchemy.orm import Session  # 导入会话
 from jose import jwt, JWTError  # 导入JWT
 from datetime import date  # 导入日期类型
 from typing import Optional  # 导入可选类型
-from app.core.database import get_db  # 导入DB依赖
-from app.core.config import SECRET_KEY  # 导入密钥
+from app.core.database import get_db, SessionLocal  # 导入DB依赖与会话工厂
+from app.core.config import SECRET_KEY, USER_LIST_DEFAULT_LIMIT, USER_LIST_MAX_LIMIT  # 导入密钥与分页配置
 from app.models.user import User  # 导入用户模型
 from app.models.profile import UserProfile  # 导入资料模型
+from app.services.user_cache import user_cache, UserSnapshot  # 导入已登录用户缓存
+from app.core import metrics  # 导入进程内指标
+from app.core.http_cache import etag_matches, set_etag, not_modified  # 导入条件请求工具
 
 # 新增导入：文件上传与OSS服务
 from fastapi import UploadFile, File  # 导入上传文件类型
@@ -15,38 +20,70 @@ from app.services.oss_service import upload_bytes_and_get_url  # 导入OSS上传
 router = APIRouter()  # 路由
 
 # JWT令牌验证函数
-def get_current_user(token: str = Header(...), db: Session = Depends(get_db)):
-    """从JWT令牌获取当前用户"""
-    credentials_exception = HTTPException(
+def _credentials_exception():
+    return HTTPException(
         status_code=401,
         detail="无法验证凭证",
         headers={"WWW-Authenticate": "Bearer"},
     )
+
+def _decode_token(token: str) -> tuple:
+    """解码JWT，返回 (user_id, email)；同一令牌的解码结果在缓存有效期内复用"""
+    cached = user_cache.get_token(token)
+    if cached is not None:
+        return cached
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=["HS256"])  # 解码JWT
         email: str = payload.get("sub")  # 获取邮箱
         if email is None:
-            raise credentials_exception
+            raise _credentials_exception()
     except JWTError:
-        raise credentials_exception
-    user = db.query(User).filter(User.email == email).first()  # 查询用户
-    if user is None:
-        raise credentials_exception
+        raise _credentials_exception()
+    user_id = payload.get("user_id")  # 登录时写入的用户ID
+    user_cache.put_token(token, user_id, email, payload.get("exp"))
+    return user_id, email
+
+def get_current_user_snapshot(token: str = Header(...), db: Session = Depends(get_db)) -> UserSnapshot:
+    """从JWT令牌获取当前用户+资料快照（缓存命中时不访问数据库），用于只读接口"""
+    user_id, email = _decode_token(token)
+    snapshot = user_cache.get_user(db, user_id, email)
+    if snapshot is None or snapshot.email != email:
+        raise _credentials_exception()
+    return snapshot
+
+def get_current_user(token: str = Header(...), db: Session = Depends(get_db)):
+    """从JWT令牌获取当前用户（ORM对象，用于需要修改用户数据的接口）"""
+    user_id, email = _decode_token(token)
+    if user_id is not None:
+        user = db.query(User).filter(User.id == user_id).first()  # 按主键查询用户
+    else:
+        user = db.query(User).filter(User.email == email).first()  # 兼容不含user_id的旧令牌
+    if user is None or user.email != email:
+        raise _credentials_exception()
     return user  # 返回用户
 
+PROFILE_CACHE_CONTROL = "private, no-cache"  # 资料因用户而异，只允许浏览器缓存（使用前须重新验证）
+
 @router.get("/profile")
-def get_profile(current_user: User = Depends(get_current_user), db: Session = Depends(get_db)):
-    """获取当前用户信息+资料"""
-    profile = db.query(UserProfile).filter(UserProfile.user_id == current_user.id).first()  # 查资料
+def get_profile(
+    response: Response,
+    current_user: UserSnapshot = Depends(get_current_user_snapshot),
+    if_none_match: Optional[str] = Header(None),  # 客户端缓存的ETag
+):
+    """获取当前用户信息+资料；响应带 ETag，If-None-Match 命中时返回304"""
+    if etag_matches(if_none_match, current_user.etag):
+        metrics.inc("profile_not_modified")
+        return not_modified(current_user.etag, PROFILE_CACHE_CONTROL)
+    set_etag(response, current_user.etag, PROFILE_CACHE_CONTROL)
     return {
         "id": current_user.id,
         "username": current_user.username,
         "email": current_user.email,  # 邮箱不可修改
         "member_type": current_user.member_type,  # 会员类型（已经是字符串）
         "is_vip": current_user.member_type == "vip",  # 是否为VIP
-        "avatar_url": profile.avatar_url if profile else None,
-        "gender": profile.gender if profile else None,
-        "birth_date": profile.birth_date.isoformat() if (profile and profile.birth_date) else None,
+        "avatar_url": current_user.avatar_url,
+        "gender": current_user.gender,
+        "birth_date": current_user.birth_date.isoformat() if current_user.birth_date else None,
     }
 
 from pydantic import BaseModel  # 导入Pydantic
@@ -83,6 +120,7 @@ def update_profile(body: UpdateProfileRequest, current_user: User = Depends(get_
     # 提交
     db.add(current_user)
     db.add(profile)
+    user_cache.invalidate(db, current_user.id)  # 资料已变更，增加版本号（与修改一起提交），各进程缓存的快照随之失效
     db.commit()
     db.refresh(current_user)
     db.refresh(profile)
@@ -109,19 +147,48 @@ def upload_avatar(  # 上传头像接口
         db.add(profile)
     profile.avatar_url = url  # 设置头像URL
     db.add(profile)
+    user_cache.invalidate(db, current_user.id)  # 头像已变更，增加版本号（与修改一起提交），各进程缓存的快照随之失效
     db.commit()  # 提交
     db.refresh(profile)  # 刷新
     return {"avatar_url": url}  # 返回URL
 
+USER_LIST_COLUMNS = (User.id, User.username, User.email)  # 列表只查询这些列（不加载密码哈希等字段）
+
+def _user_page(db: Session, after_id: int, limit: int) -> list:  # 按 id 游标读取一页（走主键索引，与页码深度无关）
+    rows = (
+        db.query(*USER_LIST_COLUMNS)
+        .filter(User.id > after_id)
+        .order_by(User.id)
+        .limit(limit)
+        .all()
+    )
+    return [{"id": row.id, "username": row.username, "email": row.email} for row in rows]
+
+def _export_users(after_id: int):  # 逐批读取并输出NDJSON，内存占用与用户总数无关
+    while True:
+        db = SessionLocal()  # 每批使用独立会话，客户端读取较慢时不长期占用连接
+        try:
+            page = _user_page(db, after_id, USER_LIST_MAX_LIMIT)
+        finally:
+            db.close()
+        if not page:
+            return
+        yield "".join(json.dumps(user, ensure_ascii=False) + "\n" for user in page)
+        after_id = page[-1]["id"]
+
 @router.get("/all")
-def get_all_users(db: Session = Depends(get_db)):
-    """获取所有用户（仅用于测试）"""
-    users = db.query(User).all()
-    return [
-        {
-            "id": user.id,
-            "username": user.username,
-            "email": user.email,
-        }
-        for user in users
-    ]
+def get_all_users(
+    response: Response,
+    after_id: int = 0,  # 游标：返回 id 大于该值的用户
+    limit: int = Query(USER_LIST_DEFAULT_LIMIT, ge=1, le=USER_LIST_MAX_LIMIT),  # 每页条数
+    format: str = "json",  # json（分页）或 ndjson（流式导出全部）
+    db: Session = Depends(get_db),
+):
+    """获取用户列表（仅用于测试/管理导出）：按 id 游标分页，下一页游标在响应头 X-Next-After-Id 中（无更多数据时不返回）；
+    format=ndjson 时从 after_id 开始流式导出全部用户，每行一个JSON对象"""
+    if format == "ndjson":
+        return StreamingResponse(_export_users(after_id), media_type="application/x-ndjson")
+    users = _user_page(db, after_id, limit)
+    if len(users) == limit:
+        response.headers["X-Next-After-Id"] = str(users[-1]["id"])
+    return users
@@ -1,15 +1,72 @@
-from sqlalchemy import create_engine
+import logging
+import time
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
-from app.core.config import DATABASE_URL
-
-# 创建数据库引擎
-engine = create_engine(
+from app.core import metrics  # 导入进程内指标
+from app.core.log import log_event  # 导入结构化日志
+from app.core.config import (
     DATABASE_URL,
-    echo=True,  # 打印SQL语句，便于调试
-    pool_pre_ping=True,  # 连接前测试数据库连接
+    DB_ECHO,
+    DB_POOL_SIZE,
+    DB_MAX_OVERFLOW,
+    DB_POOL_RECYCLE,
+    DB_POOL_TIMEOUT,
+    DB_SLOW_QUERY_MS,
 )
 
+
+def _engine_options(url: str) -> dict:  # 连接池参数（SQLite 使用 SQLAlchemy 默认的池，不支持这些参数）
+    options = {
+        "echo": DB_ECHO,  # 默认关闭：逐条同步打印SQL会拖慢每个请求
+        "pool_pre_ping": True,  # 连接前测试数据库连接
+    }
+    if not url.startswith("sqlite"):
+        options.update(
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_recycle=DB_POOL_RECYCLE,
+            pool_timeout=DB_POOL_TIMEOUT,
+        )
+    return options
+
+
+# 创建数据库引擎
+engine = create_engine(DATABASE_URL, **_engine_options(DATABASE_URL))
+
+
+# 开始时间记在本次执行的 context 上：语句出错时 after_cursor_execute 不会触发，随 context 一起丢弃即可，不会在连接上累积
+@event.listens_for(engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_started = time.perf_counter()
+
+
+@event.listens_for(engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_query_started", None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    metrics.observe("db_query_seconds", elapsed)
+    if DB_SLOW_QUERY_MS > 0 and elapsed * 1000 >= DB_SLOW_QUERY_MS:  # 只记录慢查询，参数不写入日志（可能含验证码等敏感信息）
+        metrics.inc("db_slow_queries")
+        log_event("slow_query", logging.WARNING, ms=round(elapsed * 1000, 1), statement=" ".join(statement.split()), executemany=executemany)
+
+
+def pool_status() -> dict:
+    """连接池使用情况：已借出、空闲与溢出连接数（池类型不支持时返回空字典）"""
+    pool = engine.pool
+    if not hasattr(pool, "checkedout"):
+        return {}
+    status = {"checked_out": pool.checkedout()}
+    if hasattr(pool, "checkedin"):
+        status["checked_in"] = pool.checkedin()
+    if hasattr(pool, "overflow"):
+        status["overflow"] = max(0, pool.overflow())
+    return status
+
+
 # 创建会话工厂
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
@@ -0,0 +1,33 @@
+import hashlib  # 导入哈希库
+import json  # 导入json
+from typing import Optional  # 导入类型注解
+from fastapi import Response  # 导入响应类型
+
+# 条件请求（ETag / If-None-Match）工具：ETag 由版本号等小字段计算，命中时返回304，不读取也不序列化大字段
+
+
+def make_etag(*parts) -> str:  # 由若干可JSON序列化的部分计算弱ETag
+    raw = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str, separators=(",", ":"))
+    return f'W/"{hashlib.blake2b(raw.encode("utf-8"), digest_size=12).hexdigest()}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:  # 按弱比较判断 If-None-Match 是否命中
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if (candidate[2:] if candidate.startswith("W/") else candidate) == opaque:
+            return True
+    return False
+
+
+def set_etag(response: Response, etag: str, cache_control: str = "no-cache") -> None:  # 为正常响应设置缓存头
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = cache_control  # 允许缓存，但每次使用前须携带ETag重新验证
+
+
+def not_modified(etag: str, cache_control: str = "no-cache") -> Response:  # 304响应（无响应体）
+    return Response(status_code=304, headers={"ETag": etag, "Cache-Control": cache_control})
@@ -0,0 +1,31 @@
+import json  # 导入json
+import logging  # 导入标准日志库
+import sys  # 导入sys
+from app.core.config import LOG_LEVEL, LOG_MAX_FIELD_CHARS  # 导入日志配置
+
+# 应用日志：每条日志为一行JSON（event + 字段），字段过长时截断，避免把完整转写结果写入日志
+logger = logging.getLogger("app")
+if not logger.handlers:
+    _handler = logging.StreamHandler(sys.stdout)
+    _handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False
+
+
+def truncate(value, limit: int = LOG_MAX_FIELD_CHARS):
+    """把字段转换为可JSON序列化的值；字符串（或序列化后的dict/list）超过 limit 时截断并注明原长度"""
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    text = value if isinstance(value, str) else json.dumps(value, ensure_ascii=False, default=str)
+    if len(text) > limit:
+        return f"{text[:limit]}...(共{len(text)}字符)"
+    return text
+
+
+def log_event(event: str, level: int = logging.INFO, **fields) -> None:  # 输出一条结构化日志
+    if not logger.isEnabledFor(level):
+        return
+    record = {"event": event}
+    record.update({k: truncate(v) for k, v in fields.items()})
+    logger.log(level, json.dumps(record, ensure_ascii=False))
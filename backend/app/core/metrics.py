@@ -0,0 +1,130 @@
+import bisect  # 导入二分查找，用于直方图分桶
+import re  # 导入正则，规范指标名
+import threading  # 导入线程库
+import time  # 导入时间库
+from contextlib import contextmanager  # 导入上下文管理器工具
+from typing import Callable, Dict, Tuple  # 导入类型注解
+
+# 进程内指标（计数器、直方图、仪表），由 /metrics 接口以 Prometheus 文本格式输出
+_lock = threading.Lock()  # 指标锁
+_counters = {}  # 指标名 -> 累计值
+_histograms = {}  # (指标名, 标签) -> [各桶计数, 总和, 次数]
+_gauges = {}  # 指标名 -> (取值函数, 说明)
+
+# 直方图分桶（秒）：覆盖从毫秒级的接口调用到数十分钟的长音频转写
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def inc(name: str, value: float = 1) -> None:  # 计数器累加
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+
+def observe(name: str, value: float, **labels) -> None:  # 记录一次观测值（如耗时秒数）
+    key = (name, tuple(sorted((k, str(v)) for k, v in labels.items())))
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = [[0] * len(BUCKETS), 0.0, 0]
+        index = bisect.bisect_left(BUCKETS, value)
+        if index < len(BUCKETS):
+            hist[0][index] += 1
+        hist[1] += value
+        hist[2] += 1
+
+
+@contextmanager
+def span(stage: str, **fields):
+    """
+    流水线阶段计时：耗时记入 pipeline_stage_seconds{stage=...}，并输出一条结构化日志
+    fields 只用于日志（如 task_id），不作为指标标签，避免标签基数膨胀
+    """
+    from app.core.log import log_event  # 延迟导入，避免循环依赖
+    started = time.monotonic()
+    status = "ok"
+    try:
+        yield
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        elapsed = time.monotonic() - started
+        observe("pipeline_stage_seconds", elapsed, stage=stage)
+        log_event("span", stage=stage, seconds=round(elapsed, 3), status=status, **fields)
+
+
+def observe_stage(stage: str, seconds: float) -> None:  # 直接记录某阶段耗时（无法用 span 包裹时）
+    observe("pipeline_stage_seconds", seconds, stage=stage)
+
+
+def register_gauge(name: str, fn: Callable[[], object], help_text: str = "", label: str = "label") -> None:
+    """注册仪表：fn 返回数值，或 {标签值: 数值} 字典（标签名为 label）；在输出指标时才取值"""
+    with _lock:
+        _gauges[name] = (fn, help_text, label)
+
+
+def snapshot() -> dict:  # 获取当前全部计数器的副本
+    with _lock:
+        return dict(_counters)
+
+
+_INVALID = re.compile(r"[^a-zA-Z0-9_:]")
+
+
+def _metric_name(name: str) -> str:
+    return _INVALID.sub("_", name)
+
+
+def _escape(value) -> str:  # 标签值转义
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: Labels, extra: Dict[str, str] = None) -> str:
+    items = list(labels) + list((extra or {}).items())
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+def render_prometheus() -> str:  # 以 Prometheus 文本格式输出全部指标
+    with _lock:
+        counters = dict(_counters)
+        histograms = {k: (list(v[0]), v[1], v[2]) for k, v in _histograms.items()}
+        gauges = dict(_gauges)
+    lines = []
+    for name, value in sorted(counters.items()):
+        metric = _metric_name(name)
+        lines.append(f"# TYPE {metric} counter")
+        lines.append(f"{metric} {value}")
+    by_name = {}
+    for (name, labels), data in histograms.items():
+        by_name.setdefault(name, []).append((labels, data))
+    for name, series in sorted(by_name.items()):
+        metric = _metric_name(name)
+        lines.append(f"# TYPE {metric} histogram")
+        for labels, (buckets, total, count) in sorted(series):
+            cumulative = 0
+            for bound, n in zip(BUCKETS, buckets):
+                cumulative += n
+                lines.append(f"{metric}_bucket{_format_labels(labels, {'le': str(bound)})} {cumulative}")
+            lines.append(f"{metric}_bucket{_format_labels(labels, {'le': '+Inf'})} {count}")
+            lines.append(f"{metric}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{metric}_count{_format_labels(labels)} {count}")
+    for name, (fn, help_text, label_name) in sorted(gauges.items()):
+        metric = _metric_name(name)
+        try:
+            value = fn()
+        except Exception as e:  # 取值失败不影响其它指标
+            lines.append(f"# {metric} unavailable: {e}")
+            continue
+        if help_text:
+            lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} gauge")
+        if isinstance(value, dict):
+            for label, v in sorted(value.items()):
+                lines.append(f"{metric}{_format_labels(((label_name, label),))} {v}")
+        else:
+            lines.append(f"{metric} {value}")
+    return "\n".join(lines) + "\n"
@@ -1,12 +1,27 @@
+import logging  # 导入日志级别
+import time  # 导入时间库（关闭时的等待期限）
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from app.api import auth, summary, user  # 导入所有API路由
-from app.core.database import engine, Base
+from app.core.database import engine, Base, pool_status
+from app.services.task_scheduler import scheduler  # 导入任务调度器
+from app.services.task_store import start_purger, start_reaper  # 导入过期任务清理与中断任务回收
+from app.services.upload_service import start_spool_sweeper  # 导入遗留暂存文件清理
+from app.services.verification_service import start_code_purger  # 导入过期验证码清理
+from app.services.oss_service import init_oss, start_checkpoint_sweeper  # 导入OSS客户端初始化与过期断点清理
+from app.services.artifact_uploader import artifact_uploader  # 导入产物后台上传
+from app.services.email_service import email_outbox  # 导入后台发件箱
+from app.core import metrics  # 导入进程内指标
+from app.core.config import SHUTDOWN_DRAIN_SECONDS  # 导入关闭时等待后台队列的期限
+from app.core.log import log_event  # 导入结构化日志
+from app.services.recognize_service import pending_jobs  # 导入进行中的转写任务数
 
 # 导入所有模型以确保表被创建
 from app.models.user import User  # 导入用户模型
 from app.models.verification_code import VerificationCode  # 导入验证码模型
 from app.models.profile import UserProfile  # 导入用户资料模型
+from app.models.task import SummaryTask  # 导入总结任务模型
 
 app = FastAPI(title="Smart Video Summary System")
 
@@ -22,8 +37,40 @@ app.add_middleware(
 # 创建数据库表
 @app.on_event("startup")
 async def startup_event():
-    """应用启动时创建数据库表"""
+    """应用启动时创建数据库表并启动任务工作线程"""
     Base.metadata.create_all(bind=engine)
+    scheduler.start()  # 启动固定大小的工作线程池
+    start_purger()  # 启动过期任务清理线程
+    start_reaper(scheduler.task_ids)  # 为本进程的任务记录心跳，并把已退出进程遗留的未结束任务标记为失败
+    start_spool_sweeper()  # 删除已退出进程遗留的上传暂存文件
+    start_code_purger()  # 启动过期验证码清理线程
+    init_oss()  # 创建共享的OSS客户端与连接池
+    start_checkpoint_sweeper()  # 启动过期断点续传记录清理线程
+    artifact_uploader.start()  # 启动总结产物后台上传线程
+    email_outbox.start()  # 启动发信线程
+    _register_gauges()  # 注册队列深度等仪表
+
+def _register_gauges():
+    """注册在抓取 /metrics 时实时取值的仪表"""
+    metrics.register_gauge("task_queue_depth", lambda: scheduler.stats()["queue_depth"], "排队中的总结任务数")
+    metrics.register_gauge("task_active_workers", lambda: scheduler.stats()["active_workers"], "正在执行任务的工作线程数")
+    metrics.register_gauge("task_stage_active", lambda: {name: s["active"] for name, s in scheduler.stats()["stages"].items()},
+                           "各阶段正在执行的任务数", label="stage")
+    metrics.register_gauge("asr_pending_jobs", pending_jobs, "等待转写结果的任务数")
+    metrics.register_gauge("artifact_upload_pending", artifact_uploader.pending, "等待上传的总结产物数")
+    metrics.register_gauge("email_outbox_pending", email_outbox.pending, "等待发送的邮件数")
+    metrics.register_gauge("db_pool_connections", pool_status, "数据库连接池连接数（checked_out 接近 池大小+溢出上限 时请求会排队）", label="state")
+
+@app.on_event("shutdown")
+def shutdown_event():
+    """关闭前等待后台上传队列中的总结产物上传完成、待发送邮件发送完成；两者合计最多等待 SHUTDOWN_DRAIN_SECONDS，
+    到期仍未处理完的条目随进程退出被丢弃并记录日志（SMTP/OSS 卡住时不能阻止进程退出）"""
+    deadline = time.monotonic() + SHUTDOWN_DRAIN_SECONDS
+    for name, outbox in (("artifact_upload", artifact_uploader), ("email", email_outbox)):
+        dropped = outbox.join(timeout=max(0.0, deadline - time.monotonic()))
+        if dropped:
+            metrics.inc(f"{name}_dropped", dropped)
+            log_event("shutdown_drain_timeout", logging.WARNING, queue=name, dropped=dropped, timeout=SHUTDOWN_DRAIN_SECONDS)
 
 # 注册子路由
 app.include_router(auth.router, prefix="/api/auth", tags=["Auth"])
@@ -33,3 +80,10 @@ app.include_router(user.router, prefix="/api/user", tags=["User"])
 @app.get("/")
 def read_root():
     return {"msg": "Smart Video Summary API is running"}
+
+@app.get("/metrics")
+def read_metrics(format: str = "prometheus"):
+    """进程内运行指标：默认 Prometheus 文本格式（计数器、阶段耗时直方图、队列仪表）；format=json 时返回计数器字典"""
+    if format == "json":
+        return metrics.snapshot()
+    return PlainTextResponse(metrics.render_prometheus(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,28 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean  # 导入列类型
+from sqlalchemy.dialects.mysql import LONGTEXT  # 导入MySQL长文本类型（转写/总结可能超过64KB）
+from sqlalchemy.sql import func  # 导入SQL函数工具
+from app.core.database import Base  # 导入基础模型类
+
+LargeText = Text().with_variant(LONGTEXT(), "mysql")  # MySQL下使用LONGTEXT，其它数据库使用Text
+
+
+class SummaryTask(Base):  # 定义总结任务模型类
+    """总结任务状态表（多进程共享任务状态）"""
+    __tablename__ = "summary_tasks"  # 指定表名
+
+    id = Column(String(32), primary_key=True, comment="任务ID")  # uuid4 hex
+    status = Column(String(20), nullable=False, default="queued", index=True, comment="任务状态")  # queued/running/done/error/cancelled
+    progress = Column(Integer, nullable=False, default=0, comment="进度百分比")  # 0-100
+    stage = Column(String(20), nullable=False, default="queued", comment="当前阶段")  # 阶段名称
+    error = Column(Text, nullable=True, comment="错误信息")  # 失败原因
+    cancelled = Column(Boolean, nullable=False, default=False, comment="是否已取消")  # 取消标记
+    transcript = Column(LargeText, nullable=True, comment="转写文本")  # 识别结果
+    summary = Column(LargeText, nullable=True, comment="总结文本")  # 总结结果
+    partial_summary = Column(LargeText, nullable=True, comment="生成中的总结文本")  # 流式总结过程中定期写入，任务结束时清空
+    summary_url = Column(String(512), nullable=True, comment="总结产物URL")  # 后台上传到OSS后写入
+    version = Column(Integer, nullable=False, default=0, server_default="0", comment="版本号")  # 每次更新加1，用于ETag
+    batch_id = Column(String(32), nullable=True, index=True, comment="批次ID")  # 批量提交时所属批次
+    batch_index = Column(Integer, nullable=True, comment="批次内序号")  # 批次内提交顺序
+    created_at = Column(DateTime(timezone=False), server_default=func.now(), comment="创建时间")  # 创建时间
+    updated_at = Column(DateTime(timezone=False), server_default=func.now(), onupdate=func.now(), comment="更新时间")  # 更新时间
+    finished_at = Column(DateTime(timezone=False), nullable=True, index=True, comment="结束时间")  # 进入终态的时间，用于TTL清理
@@ -19,6 +19,7 @@ class User(Base):
     member_type = Column(String(10), default="normal", nullable=False, comment="会员类型")  # 直接用String类型，避免枚举转换问题
     created_at = Column(DateTime(timezone=False), server_default=func.now(), comment="创建时间")
     updated_at = Column(DateTime(timezone=False), server_default=func.now(), onupdate=func.now(), comment="更新时间")
+    profile_version = Column(Integer, nullable=False, default=0, server_default="0", comment="资料版本号")  # 用户或资料每次修改加1，各进程据此判断缓存的快照是否过期
     
     def __repr__(self):
         return f"<User {self.username}>"
@@ -1,9 +1,13 @@
-from sqlalchemy import Column, Integer, String, DateTime, Boolean  # 导入列类型
+from sqlalchemy import Column, Integer, String, DateTime, Boolean, Index  # 导入列类型与索引
 from sqlalchemy.sql import func  # 导入SQL函数工具
 from app.core.database import Base  # 导入基础模型类
 
 class VerificationCode(Base):  # 定义验证码模型类
     __tablename__ = "verification_codes"  # 指定表名
+    __table_args__ = (
+        Index("ix_verification_codes_lookup", "email", "code", "used", "id"),  # 注册/重置密码按 邮箱+验证码+未使用 查找最新一条
+        Index("ix_verification_codes_expires_at", "expires_at"),  # 定期清理过期验证码
+    )
 
     id = Column(Integer, primary_key=True, index=True, comment="主键ID")  # 自增主键
     email = Column(String(100), nullable=False, index=True, comment="邮箱")  # 绑定的邮箱
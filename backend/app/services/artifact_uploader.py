@@ -0,0 +1,88 @@
+import queue  # 导入线程安全队列
+import threading  # 导入线程库
+import time  # 导入时间库
+from typing import Callable, Optional  # 导入类型注解
+from app.core import metrics  # 导入指标模块
+from app.core.config import ARTIFACT_UPLOAD_WORKERS, ARTIFACT_UPLOAD_QUEUE_LIMIT, ARTIFACT_UPLOAD_RETRIES  # 导入上传配置
+from app.services.oss_service import upload_bytes_and_get_url  # 导入OSS上传
+
+
+class ArtifactUploader:  # 产物后台上传队列（write-behind）
+    """
+    产物后台上传器
+    - submit 立即返回，上传在后台线程中完成，不占用任务工作线程
+    - 成功后调用 on_done(url)（如写入任务的 summary_url）；失败按指数退避重试
+    - 队列满时丢弃产物并计数（产物只是备份，结果已保存在任务存储中）
+    """
+
+    def __init__(self, workers: int, queue_limit: int, retries: int):
+        self.workers = max(1, workers)  # 上传线程数
+        self.retries = max(0, retries)  # 重试次数
+        self._queue = queue.Queue(maxsize=max(1, queue_limit))  # 待上传队列
+        self._threads = []  # 上传线程列表
+        self._lock = threading.Lock()
+
+    def start(self) -> None:  # 启动上传线程（可重复调用）
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._worker_loop, name=f"artifact-uploader-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def submit(self, data: bytes, filename: str, content_type: str, folder: Optional[str] = None, on_done: Optional[Callable[[str], None]] = None) -> bool:
+        """加入上传队列，队列已满返回False"""
+        self.start()  # 确保上传线程已启动
+        try:
+            self._queue.put_nowait((data, filename, content_type, folder, on_done))
+        except queue.Full:
+            metrics.inc("artifact_upload_dropped")
+            print(f"[artifact] 上传队列已满，丢弃产物 {filename}")
+            return False
+        return True
+
+    def pending(self) -> int:  # 待上传数量
+        return self._queue.qsize()
+
+    def join(self, timeout: Optional[float] = None) -> int:  # 等待队列中的产物全部处理完（用于关闭前刷新）
+        """最多等待 timeout 秒，返回仍未处理完的产物数（0表示全部完成）"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return self._queue.unfinished_tasks
+                self._queue.all_tasks_done.wait(remaining)
+        return 0
+
+    def _worker_loop(self) -> None:
+        while True:
+            item = self._queue.get()
+            try:
+                self._upload(*item)
+            finally:
+                self._queue.task_done()
+
+    def _upload(self, data: bytes, filename: str, content_type: str, folder: Optional[str], on_done) -> None:
+        for attempt in range(self.retries + 1):
+            try:
+                with metrics.span("artifact_upload", filename=filename, bytes=len(data)):
+                    url = upload_bytes_and_get_url(data, filename, content_type, folder=folder)
+                break
+            except Exception as e:
+                if attempt >= self.retries:
+                    metrics.inc("artifact_upload_failed")
+                    print(f"[artifact] 产物上传失败 {filename}: {e}")
+                    return
+                time.sleep(min(2 ** attempt, 10))  # 退避后重试
+        metrics.inc("artifact_upload_done")
+        if on_done is not None:
+            try:
+                on_done(url)
+            except Exception as e:
+                print(f"[artifact] 上传完成回调失败 {filename}: {e}")
+
+
+# 全局产物上传器实例
+artifact_uploader = ArtifactUploader(ARTIFACT_UPLOAD_WORKERS, ARTIFACT_UPLOAD_QUEUE_LIMIT, ARTIFACT_UPLOAD_RETRIES)
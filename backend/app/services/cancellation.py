@@ -0,0 +1,137 @@
+import threading  # 导入线程库
+import time  # 导入时间库
+from concurrent.futures import Future  # 导入Future工具
+from typing import Callable, Dict, Optional  # 导入类型注解
+from app.core.config import CANCEL_POLL_INTERVAL  # 导入取消检查间隔
+
+
+class TaskCancelled(Exception):  # 任务已被取消
+    pass
+
+
+class CancelToken:  # 协作式取消令牌
+    """
+    协作式取消令牌（每个运行中的任务一个）
+    - cancel() 立即置位并执行已注册的回调（结束ffmpeg进程、取消转写Future等）
+    - is_cancelled() 还会按 CANCEL_POLL_INTERVAL 调用 check_remote，感知其它worker进程写入的取消标记
+    - wait_future / run_cancellable 在阻塞等待期间持续检查取消
+    """
+
+    def __init__(self, task_id: str, check_remote: Optional[Callable[[], bool]] = None):
+        self.task_id = task_id  # 任务ID
+        self.cancelled_at = None  # 收到取消的时间（monotonic）
+        self._event = threading.Event()  # 取消事件
+        self._check_remote = check_remote  # 远端取消标记检查函数
+        self._last_remote = 0.0  # 上次检查远端标记的时间
+        self._callbacks = []  # 取消回调
+        self._lock = threading.Lock()
+
+    def cancel(self) -> None:  # 触发取消
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.cancelled_at = time.monotonic()
+            self._event.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for fn in callbacks:
+            try:
+                fn()
+            except Exception as e:
+                print(f"[cancel] 取消回调执行失败 task_id={self.task_id}, err={e}")
+
+    def on_cancel(self, fn: Callable[[], None]) -> Callable[[], None]:  # 注册取消回调，返回注销函数
+        with self._lock:
+            if not self._event.is_set():
+                self._callbacks.append(fn)
+                return lambda: self._remove_callback(fn)
+        fn()  # 已取消则立即执行
+        return lambda: None
+
+    def _remove_callback(self, fn) -> None:
+        with self._lock:
+            if fn in self._callbacks:
+                self._callbacks.remove(fn)
+
+    def is_cancelled(self) -> bool:  # 是否已取消（含远端标记）
+        if self._event.is_set():
+            return True
+        now = time.monotonic()
+        if self._check_remote and now - self._last_remote >= CANCEL_POLL_INTERVAL:
+            self._last_remote = now
+            try:
+                if self._check_remote():
+                    self.cancel()
+            except Exception as e:
+                print(f"[cancel] 检查取消标记失败 task_id={self.task_id}, err={e}")
+        return self._event.is_set()
+
+    def raise_if_cancelled(self) -> None:  # 已取消则抛出 TaskCancelled
+        if self.is_cancelled():
+            raise TaskCancelled(self.task_id)
+
+    def wait_future(self, future: Future, poll: float = 0.5):  # 等待Future结果，取消时取消Future并抛出TaskCancelled
+        wakeup = threading.Event()  # Future完成或收到取消时唤醒
+        future.add_done_callback(lambda _: wakeup.set())
+
+        def on_cancel():
+            future.cancel()
+            wakeup.set()
+
+        unregister = self.on_cancel(on_cancel)
+        try:
+            while True:
+                wakeup.wait(poll)
+                if future.done() and not future.cancelled():
+                    return future.result()
+                self.raise_if_cancelled()
+                if future.cancelled():  # Future被外部取消
+                    raise TaskCancelled(self.task_id)
+        finally:
+            unregister()
+
+
+def run_cancellable(token: Optional[CancelToken], fn: Callable, *args, **kwargs):  # 在独立线程中执行阻塞调用，可被取消
+    """
+    在独立守护线程中执行无法中断的阻塞调用（如大模型HTTP请求），当前线程只等待结果；
+    取消时立即抛出 TaskCancelled 释放当前工作线程，后台调用结束后结果被丢弃
+    """
+    if token is None:
+        return fn(*args, **kwargs)
+    future = Future()
+
+    def runner():
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=runner, name=f"cancellable-{token.task_id[:8]}", daemon=True).start()
+    return token.wait_future(future)
+
+
+# 当前进程中运行的任务令牌
+_tokens: Dict[str, CancelToken] = {}
+_tokens_lock = threading.Lock()
+
+
+def register(task_id: str, check_remote: Optional[Callable[[], bool]] = None) -> CancelToken:  # 为运行中的任务创建令牌
+    token = CancelToken(task_id, check_remote)
+    with _tokens_lock:
+        _tokens[task_id] = token
+    return token
+
+
+def unregister(task_id: str) -> None:  # 任务结束后移除令牌
+    with _tokens_lock:
+        _tokens.pop(task_id, None)
+
+
+def cancel(task_id: str) -> bool:  # 取消本进程中运行的任务，找到并触发返回True
+    with _tokens_lock:
+        token = _tokens.get(task_id)
+    if token is None:
+        return False
+    token.cancel()
+    return True
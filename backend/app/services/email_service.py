@@ -1,8 +1,12 @@
+import queue  # 导入线程安全队列
 import smtplib  # 导入SMTP库
 import ssl  # 导入SSL库
+import threading  # 导入线程库
+import time  # 导入时间库
 from email.mime.text import MIMEText  # 导入纯文本邮件类
 from email.mime.multipart import MIMEMultipart  # 导入多部分邮件类
 from typing import Optional  # 导入可选类型
+from app.core import metrics  # 导入指标模块
 from app.core.config import (
     SMTP_HOST,
     SMTP_PORT,
@@ -11,10 +15,15 @@ from app.core.config import (
     SMTP_FROM,
     SMTP_USE_SSL,
     SMTP_STARTTLS,
+    SMTP_TIMEOUT,
+    SMTP_IDLE_TIMEOUT,
+    EMAIL_WORKERS,
+    EMAIL_QUEUE_LIMIT,
+    EMAIL_RETRIES,
 )  # 导入SMTP配置
 
 
-def send_email(to_email: str, subject: str, html_content: str, text_content: Optional[str] = None) -> None:  # 定义发送邮件函数
+def _build_message(to_email: str, subject: str, html_content: str, text_content: Optional[str] = None) -> str:  # 构造MIME邮件
     message = MIMEMultipart("alternative")  # 创建多格式邮件容器
     message["Subject"] = subject  # 设置邮件主题
     message["From"] = SMTP_FROM  # 设置发件人
@@ -26,27 +35,166 @@ def send_email(to_email: str, subject: str, html_content: str, text_content: Opt
 
     part2 = MIMEText(html_content, "html", "utf-8")  # 创建HTML部分
     message.attach(part2)  # 附加HTML部分
+    return message.as_string()
 
+
+def _connect() -> smtplib.SMTP:  # 建立并登录SMTP连接
+    if SMTP_USE_SSL:  # 如果配置使用SSL直连
+        context = ssl.create_default_context()  # 创建默认SSL上下文
+        server = smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT, context=context, timeout=SMTP_TIMEOUT)  # 使用SSL方式连接SMTP服务器
+    else:  # 非SSL直连
+        server = smtplib.SMTP(SMTP_HOST, SMTP_PORT, timeout=SMTP_TIMEOUT)  # 非SSL明文连接
+        server.ehlo()  # 打招呼
+        if SMTP_STARTTLS:  # 如果启用STARTTLS
+            context = ssl.create_default_context()  # 创建SSL上下文
+            server.starttls(context=context)  # 升级到TLS
+            server.ehlo()  # 升级后再次打招呼
+    try:
+        if SMTP_USER and SMTP_PASSWORD:  # 未配置账号密码时（如本地测试SMTP）跳过登录
+            server.login(SMTP_USER, SMTP_PASSWORD)  # 登录SMTP服务器
+    except Exception:
+        server.close()
+        raise
+    return server
+
+
+def _close(server) -> None:  # 关闭连接（忽略错误），返回None便于调用方清空引用
+    if server is not None:
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+    return None
+
+
+def _friendly_error(e: Exception) -> Exception:  # 转换为更友好的异常
+    if isinstance(e, smtplib.SMTPAuthenticationError):  # 认证错误
+        return Exception(f"SMTP认证失败：{e.smtp_error.decode('utf-8', 'ignore') if hasattr(e, 'smtp_error') else str(e)}")
+    if isinstance(e, smtplib.SMTPConnectError):  # 连接失败
+        return Exception(f"SMTP连接失败：{str(e)}")
+    if isinstance(e, smtplib.SMTPException):  # 其他SMTP异常
+        return Exception(f"SMTP异常：{str(e)}")
+    return Exception(f"发送邮件失败：{str(e)}")  # 其他未知异常
+
+
+def _is_transient(e: smtplib.SMTPException) -> bool:  # 4xx 响应为临时错误（灰名单、限流、邮箱暂满等），可以重试；5xx 为永久错误
+    if isinstance(e, smtplib.SMTPRecipientsRefused):
+        codes = [code for code, _ in e.recipients.values()]
+    else:
+        codes = [getattr(e, "smtp_code", 0)]
+    return bool(codes) and all(400 <= code < 500 for code in codes)
+
+
+def send_email(to_email: str, subject: str, html_content: str, text_content: Optional[str] = None) -> None:  # 定义发送邮件函数（同步，单独建立连接）
+    message = _build_message(to_email, subject, html_content, text_content)
     try:  # 捕获整体发送异常
-        if SMTP_USE_SSL:  # 如果配置使用SSL直连
-            context = ssl.create_default_context()  # 创建默认SSL上下文
-            with smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT, context=context) as server:  # 使用SSL方式连接SMTP服务器
-                server.login(SMTP_USER, SMTP_PASSWORD)  # 登录SMTP服务器
-                server.sendmail(SMTP_FROM, to_email, message.as_string())  # 发送邮件
-        else:  # 非SSL直连
-            with smtplib.SMTP(SMTP_HOST, SMTP_PORT) as server:  # 非SSL明文连接
-                server.ehlo()  # 打招呼
-                if SMTP_STARTTLS:  # 如果启用STARTTLS
-                    context = ssl.create_default_context()  # 创建SSL上下文
-                    server.starttls(context=context)  # 升级到TLS
-                    server.ehlo()  # 升级后再次打招呼
-                server.login(SMTP_USER, SMTP_PASSWORD)  # 登录
-                server.sendmail(SMTP_FROM, to_email, message.as_string())  # 发送
-    except smtplib.SMTPAuthenticationError as e:  # 认证错误
-        raise Exception(f"SMTP认证失败：{e.smtp_error.decode('utf-8', 'ignore') if hasattr(e, 'smtp_error') else str(e)}")  # 抛出更友好的异常
-    except smtplib.SMTPConnectError as e:  # 连接失败
-        raise Exception(f"SMTP连接失败：{str(e)}")  # 抛出异常
-    except smtplib.SMTPException as e:  # 其他SMTP异常
-        raise Exception(f"SMTP异常：{str(e)}")  # 抛出异常
-    except Exception as e:  # 其他未知异常
-        raise Exception(f"发送邮件失败：{str(e)}")  # 抛出异常
+        server = _connect()
+        try:
+            server.sendmail(SMTP_FROM, to_email, message)  # 发送邮件
+        finally:
+            _close(server)
+    except Exception as e:
+        raise _friendly_error(e)  # 抛出更友好的异常
+
+
+class EmailOutbox:  # 后台发信队列
+    """
+    邮件发件箱
+    - submit 立即返回，MIME构造与发送都在后台线程中完成，接口不再等待TLS握手与登录
+    - 每个发信线程保持一条已登录的SMTP连接，连续发送时复用；空闲超过 SMTP_IDLE_TIMEOUT 后主动关闭
+    - 连接被服务器断开或发送失败时关闭连接，重新连接后重试
+    - 服务器拒绝时按响应码区分：4xx 临时错误保留连接退避重试，5xx 永久错误（如收件人不存在）不重试
+    - 单封邮件处理出错（包括构造MIME失败）只记录并丢弃该邮件，发信线程继续工作
+    """
+
+    def __init__(self, workers: int, queue_limit: int, retries: int, idle_timeout: float):
+        self.workers = max(1, workers)  # 发信线程数
+        self.retries = max(0, retries)  # 重试次数
+        self.idle_timeout = idle_timeout  # 连接空闲关闭时间
+        self._queue = queue.Queue(maxsize=max(1, queue_limit))  # 待发送队列
+        self._threads = []  # 发信线程列表
+        self._lock = threading.Lock()
+
+    def start(self) -> None:  # 启动发信线程（可重复调用）
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._worker_loop, name=f"email-outbox-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def submit(self, to_email: str, subject: str, html_content: str, text_content: Optional[str] = None) -> bool:
+        """加入发送队列，队列已满返回False"""
+        self.start()  # 确保发信线程已启动
+        try:
+            self._queue.put_nowait((to_email, subject, html_content, text_content))
+        except queue.Full:
+            metrics.inc("email_dropped")
+            print(f"[email] 发送队列已满，丢弃邮件 to={to_email}")
+            return False
+        return True
+
+    def pending(self) -> int:  # 待发送数量
+        return self._queue.qsize()
+
+    def join(self, timeout: Optional[float] = None) -> int:  # 等待队列中的邮件全部处理完（用于关闭前刷新）
+        """最多等待 timeout 秒，返回仍未处理完的邮件数（0表示全部完成）"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._queue.all_tasks_done:
+            while self._queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return self._queue.unfinished_tasks
+                self._queue.all_tasks_done.wait(remaining)
+        return 0
+
+    def _worker_loop(self) -> None:
+        server = None  # 本线程持有的SMTP连接
+        while True:
+            try:
+                item = self._queue.get(timeout=self.idle_timeout if server is not None else None)
+            except queue.Empty:  # 空闲超时：关闭连接，下一封邮件到来时再连接
+                server = _close(server)
+                continue
+            try:
+                server = self._deliver(server, *item)
+            except Exception as e:  # 意外错误（如邮件内容无法编码）：丢弃这封邮件，不能让发信线程退出
+                metrics.inc("email_failed")
+                print(f"[email] 处理邮件失败，已丢弃 to={item[0]}: {e}")
+            finally:
+                self._queue.task_done()
+
+    def _deliver(self, server, to_email: str, subject: str, html_content: str, text_content: Optional[str]):
+        """发送一封邮件，返回可继续复用的连接（失败时为None）"""
+        message = _build_message(to_email, subject, html_content, text_content)
+        for attempt in range(self.retries + 1):
+            try:
+                if server is None:
+                    with metrics.span("smtp_connect"):
+                        server = _connect()
+                    if attempt:
+                        metrics.inc("email_reconnects")
+                started = time.monotonic()
+                server.sendmail(SMTP_FROM, to_email, message)
+                metrics.observe_stage("smtp_send", time.monotonic() - started)  # 只记录耗时，不逐封写日志
+                metrics.inc("email_sent")
+                return server
+            except (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPDataError) as e:  # 服务器拒绝：连接仍可用
+                if not _is_transient(e) or attempt >= self.retries:  # 永久错误不重试
+                    metrics.inc("email_failed")
+                    print(f"[email] 邮件被拒绝 to={to_email}: {_friendly_error(e)}")
+                    return server
+                time.sleep(min(2 ** attempt, 10))  # 临时错误：退避后在同一连接上重试
+            except Exception as e:  # 连接断开、超时等：丢弃连接后重连重试
+                server = _close(server)
+                if attempt >= self.retries:
+                    metrics.inc("email_failed")
+                    print(f"[email] 邮件发送失败 to={to_email}: {_friendly_error(e)}")
+                    return None
+                time.sleep(min(2 ** attempt, 10))  # 退避后重试
+        return server
+
+
+# 全局发件箱实例
+email_outbox = EmailOutbox(EMAIL_WORKERS, EMAIL_QUEUE_LIMIT, EMAIL_RETRIES, SMTP_IDLE_TIMEOUT)
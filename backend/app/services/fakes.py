@@ -0,0 +1,225 @@
+"""
+外部服务的本地模拟实现（OSS_BACKEND / ASR_BACKEND / LLM_BACKEND 设为 fake 时启用）
+- 接口与真实实现一致：FakeBucket 对应 oss2.Bucket，FakeAsrJobManager 对应 AsrJobManager，FakeGeneration 对应 dashscope.Generation
+- 耗时与失败概率由 FAKE_* 配置控制，用于离线端到端压测与基准测试
+"""
+import asyncio  # 导入异步库
+import io  # 导入内存流
+import random  # 导入随机数
+import threading  # 导入线程库
+import time  # 导入时间库
+import uuid  # 导入uuid
+from concurrent.futures import Future  # 导入Future
+from http import HTTPStatus  # 导入HTTP状态码
+from typing import Optional  # 导入类型注解
+import oss2  # 导入OSS SDK（只使用其异常与结果类型）
+from app.core import metrics  # 导入指标模块
+from app.core.config import (
+    FAKE_LATENCY_JITTER,
+    FAKE_ASR_LATENCY,
+    FAKE_ASR_REALTIME_FACTOR,
+    FAKE_ASR_FAILURE_RATE,
+    FAKE_LLM_LATENCY,
+    FAKE_LLM_TOKEN_DELAY,
+    FAKE_LLM_FAILURE_RATE,
+    FAKE_OSS_LATENCY,
+    FAKE_OSS_BANDWIDTH_MB,
+    FAKE_OSS_FAILURE_RATE,
+)
+
+
+def _jitter(seconds: float) -> float:  # 按 FAKE_LATENCY_JITTER 随机浮动
+    if seconds <= 0:
+        return 0.0
+    return max(0.0, seconds * (1 + random.uniform(-FAKE_LATENCY_JITTER, FAKE_LATENCY_JITTER)))
+
+
+def _should_fail(rate: float) -> bool:
+    return rate > 0 and random.random() < rate
+
+
+# ============== OSS ==============
+
+class _Result:  # 模拟SDK返回对象
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+class FakeBucket:
+    """模拟 oss2.Bucket：只记录对象大小，不保存内容；按带宽与固定延迟计算耗时"""
+
+    def __init__(self, bucket_name: str = "fake-bucket"):
+        self.bucket_name = bucket_name
+        self.objects = {}  # object_key -> 字节数
+        self._uploads = {}  # upload_id -> {part_number: (etag, 字节数)}
+        self._lock = threading.Lock()
+
+    def _request(self, size: int = 0) -> None:  # 模拟一次请求的耗时与失败
+        time.sleep(_jitter(FAKE_OSS_LATENCY + size / (FAKE_OSS_BANDWIDTH_MB * 1024 * 1024)))
+        if _should_fail(FAKE_OSS_FAILURE_RATE):
+            raise oss2.exceptions.ServerError(503, {}, "", {"Code": "ServiceUnavailable", "Message": "fake failure"})
+
+    @staticmethod
+    def _size(data) -> int:
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            return len(data)
+        if hasattr(data, "read"):
+            return len(data.read())
+        return len(bytes(data))
+
+    def put_object(self, key, data, headers=None):
+        size = self._size(data)
+        self._request(size)
+        with self._lock:
+            self.objects[key] = size
+        return _Result(etag=uuid.uuid4().hex)
+
+    def put_object_from_file(self, key, filename, headers=None):
+        with open(filename, "rb") as f:
+            return self.put_object(key, f, headers=headers)
+
+    def get_object(self, key, headers=None):  # 内容不保存，按记录的大小返回全零数据
+        with self._lock:
+            size = self.objects.get(key)
+        if size is None:
+            raise oss2.exceptions.NoSuchKey(404, {}, "", {"Code": "NoSuchKey", "Message": "fake"})
+        self._request(size)
+        return io.BytesIO(bytes(size))
+
+    def init_multipart_upload(self, key, headers=None):
+        self._request()
+        upload_id = uuid.uuid4().hex
+        with self._lock:
+            self._uploads[upload_id] = {}
+        return _Result(upload_id=upload_id)
+
+    def upload_part(self, key, upload_id, part_number, data):
+        size = self._size(data)
+        self._request(size)
+        etag = uuid.uuid4().hex
+        with self._lock:
+            if upload_id not in self._uploads:
+                raise oss2.exceptions.NoSuchUpload(404, {}, "", {"Code": "NoSuchUpload", "Message": "fake"})
+            self._uploads[upload_id][part_number] = (etag, size)
+        return _Result(etag=etag)
+
+    def list_parts(self, key, upload_id, marker="", max_parts=1000, headers=None):
+        with self._lock:
+            if upload_id not in self._uploads:
+                raise oss2.exceptions.NoSuchUpload(404, {}, "", {"Code": "NoSuchUpload", "Message": "fake"})
+            parts = sorted(self._uploads[upload_id].items())
+        start = int(marker or 0)
+        parts = [oss2.models.PartInfo(n, etag, size=size) for n, (etag, size) in parts if n > start]
+        return _Result(parts=parts, is_truncated=False, next_marker="")
+
+    def complete_multipart_upload(self, key, upload_id, parts, headers=None):
+        self._request()
+        with self._lock:
+            uploaded = self._uploads.pop(upload_id, {})
+            self.objects[key] = sum(size for _, size in uploaded.values())
+        return _Result(etag=uuid.uuid4().hex)
+
+    def abort_multipart_upload(self, key, upload_id, headers=None):
+        with self._lock:
+            self._uploads.pop(upload_id, None)
+
+    def batch_delete_objects(self, keys, headers=None):
+        self._request()
+        with self._lock:
+            for key in keys:
+                self.objects.pop(key, None)
+        return _Result(deleted_keys=list(keys))
+
+
+# ============== 语音转写 ==============
+
+SENTENCE_SECONDS = 5  # 模拟结果中每句话覆盖的音频时长
+
+
+class FakeAsrJobManager:
+    """模拟 AsrJobManager：submit 返回 Future，耗时 = FAKE_ASR_LATENCY + 音频时长 × FAKE_ASR_REALTIME_FACTOR"""
+
+    def __init__(self):
+        self._loop = asyncio.new_event_loop()
+        self._pending = 0
+        self._lock = threading.Lock()
+        threading.Thread(target=self._loop.run_forever, name="fake-asr", daemon=True).start()
+
+    @property
+    def pending(self) -> int:
+        with self._lock:
+            return self._pending
+
+    def submit(self, fileLink, duration: Optional[float] = None) -> Future:
+        return asyncio.run_coroutine_threadsafe(self._track(fileLink, duration or 60), self._loop)
+
+    def transcribe(self, fileLink, duration: Optional[float] = None):
+        return self.submit(fileLink, duration).result()
+
+    async def _track(self, fileLink, duration: float):
+        with self._lock:
+            self._pending += 1
+        try:
+            started = time.monotonic()
+            await asyncio.sleep(_jitter(FAKE_ASR_LATENCY + duration * FAKE_ASR_REALTIME_FACTOR))
+            metrics.observe_stage("asr_wait", time.monotonic() - started)
+            if _should_fail(FAKE_ASR_FAILURE_RATE):
+                return {"StatusText": "FILE_DOWNLOAD_FAILED", "TaskId": uuid.uuid4().hex}
+            count = max(1, int(duration // SENTENCE_SECONDS))
+            sentences = [
+                {
+                    "Text": f"这是来自{fileLink}的第{i + 1}句模拟转写文本。" if i == 0 else f"这是第{i + 1}句模拟转写文本，用于测试分块总结。",
+                    "BeginTime": i * SENTENCE_SECONDS * 1000,
+                    "EndTime": (i + 1) * SENTENCE_SECONDS * 1000,
+                    "ChannelId": 0,
+                }
+                for i in range(count)
+            ]
+            return {"StatusText": "SUCCESS", "TaskId": uuid.uuid4().hex, "Result": {"Sentences": sentences}}
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+
+# ============== 大模型 ==============
+
+class _FakeResponse:  # 模拟 dashscope GenerationResponse
+    def __init__(self, status_code, text: str = "", code: str = "", message: str = ""):
+        self.status_code = status_code
+        self.code = code
+        self.message = message
+        self.output = {"text": text}
+
+    def __repr__(self):
+        return f"FakeResponse(status_code={self.status_code}, code={self.code}, message={self.message})"
+
+
+class FakeGeneration:
+    """模拟 dashscope.Generation：根据输入长度生成固定格式的笔记，支持 stream + incremental_output"""
+
+    @staticmethod
+    def _render(messages) -> str:
+        prompt = messages[-1]["content"] if messages else ""
+        lines = ["# 模拟学习笔记", "", f"- 输入长度：{len(prompt)} 字"]
+        lines += [f"- 要点 {i + 1}：模拟总结内容。" for i in range(min(20, 1 + len(prompt) // 2000))]
+        return "\n".join(lines)
+
+    @classmethod
+    def call(cls, model=None, api_key=None, messages=None, stream=False, incremental_output=False, **kwargs):
+        if stream:
+            return cls._stream(messages)
+        time.sleep(_jitter(FAKE_LLM_LATENCY))
+        if _should_fail(FAKE_LLM_FAILURE_RATE):
+            return _FakeResponse(HTTPStatus.INTERNAL_SERVER_ERROR, code="InternalError", message="fake failure")
+        return _FakeResponse(HTTPStatus.OK, cls._render(messages))
+
+    @classmethod
+    def _stream(cls, messages):
+        time.sleep(_jitter(FAKE_LLM_LATENCY))
+        if _should_fail(FAKE_LLM_FAILURE_RATE):
+            yield _FakeResponse(HTTPStatus.INTERNAL_SERVER_ERROR, code="InternalError", message="fake failure")
+            return
+        text = cls._render(messages)
+        for offset in range(0, len(text), 8):  # 每次输出8个字符
+            time.sleep(FAKE_LLM_TOKEN_DELAY)
+            yield _FakeResponse(HTTPStatus.OK, text[offset:offset + 8])
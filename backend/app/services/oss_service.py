@@ -1,39 +1,373 @@
 import os  # 导入os库
 import time  # 导入time库用于构造唯一文件名
+import json  # 导入json库，用于读写断点续传记录
+import hashlib  # 导入哈希库，用于生成断点记录文件名
+import uuid  # 导入uuid，避免并发上传时对象名冲突
+import threading  # 导入线程库，保护Bucket单例初始化
 import oss2  # 导入阿里云OSS SDK
-from typing import Tuple, Optional  # 导入类型注解
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED  # 导入线程池工具
+from typing import Callable, Iterable, Optional  # 导入类型注解
+from app.core import metrics  # 导入指标模块
+from app.core.log import log_event  # 导入结构化日志
 from app.core.config import (
     ALIYUN_AK_ID,
     ALIYUN_AK_SECRET,
     OSS_ENDPOINT,
     OSS_BUCKET,
     OSS_PUBLIC_DOMAIN,
+    OSS_MULTIPART_THRESHOLD,
+    OSS_PART_SIZE,
+    OSS_UPLOAD_THREADS,
+    OSS_PART_RETRIES,
+    OSS_CHECKPOINT_DIR,
+    OSS_CHECKPOINT_TTL,
+    OSS_CHECKPOINT_SWEEP_INTERVAL,
+    OSS_POOL_SIZE,
+    OSS_CONNECT_TIMEOUT,
+    OSS_BACKEND,
 )
 
+# 分片上传完成回调：on_part(分片号, 字节数, 耗时秒)
+PartCallback = Callable[[int, int, float], None]
 
-def get_bucket():  # 获取Bucket实例
+
+_bucket = None  # 进程内共享的Bucket实例
+_bucket_lock = threading.Lock()  # 初始化锁
+
+
+def create_bucket(pool_size: int = OSS_POOL_SIZE):  # 新建Bucket实例（带独立HTTP连接池）
+    if OSS_BACKEND == "fake":  # 本地模拟实现（离线压测）
+        from app.services.fakes import FakeBucket
+        return FakeBucket(OSS_BUCKET or "fake-bucket")
     if not (ALIYUN_AK_ID and ALIYUN_AK_SECRET and OSS_ENDPOINT and OSS_BUCKET):  # 校验必需配置
         raise ValueError("缺少OSS配置：请设置 OSS_ENDPOINT/OSS_BUCKET 与访问密钥")  # 抛出异常
     auth = oss2.Auth(ALIYUN_AK_ID, ALIYUN_AK_SECRET)  # 创建认证对象
-    bucket = oss2.Bucket(auth, OSS_ENDPOINT, OSS_BUCKET)  # 创建Bucket对象
-    return bucket  # 返回Bucket
+    session = oss2.Session(pool_size=pool_size)  # 创建可复用的HTTP会话（连接池，线程安全）
+    return oss2.Bucket(auth, OSS_ENDPOINT, OSS_BUCKET, session=session, connect_timeout=OSS_CONNECT_TIMEOUT)  # 创建Bucket对象（Endpoint可指向本地OSS兼容服务用于测试）
 
 
-def upload_bytes_and_get_url(data: bytes, filename: str, content_type: str, folder: Optional[str] = None) -> str:  # 上传字节并返回URL
-    bucket = get_bucket()  # 获取Bucket
-    # 生成唯一对象名，保留原扩展名
+def init_oss() -> bool:  # 启动时初始化共享Bucket，未配置OSS时返回False
+    try:
+        get_bucket()
+        return True
+    except ValueError as e:
+        print(f"[oss] 跳过OSS初始化：{e}")
+        return False
+
+
+def get_bucket():  # 获取进程内共享的Bucket实例（复用TCP/TLS连接，可跨工作线程使用）
+    global _bucket
+    if _bucket is None:
+        with _bucket_lock:
+            if _bucket is None:  # 双重检查，避免并发重复创建
+                _bucket = create_bucket()
+    return _bucket  # 返回Bucket
+
+
+def _make_object_key(filename: str, folder: Optional[str] = None) -> str:  # 生成唯一对象名，保留原扩展名
     name, ext = os.path.splitext(filename)  # 拆分文件名和扩展名
     base_dir = folder.strip('/') if folder else 'uploads'  # 选择目录（默认uploads）
-    object_key = f"{base_dir}/{int(time.time()*1000)}{ext}"  # 使用毫秒时间戳构造路径
+    return f"{base_dir}/{int(time.time()*1000)}_{uuid.uuid4().hex[:8]}{ext}"  # 毫秒时间戳+随机后缀构造路径
+
+
+def get_object_url(object_key: str) -> str:  # 生成公网可访问URL
+    if OSS_PUBLIC_DOMAIN:  # 若配置了公网域名
+        return f"{OSS_PUBLIC_DOMAIN.rstrip('/')}/{object_key}"  # 使用自定义域名拼接URL
+    if OSS_BACKEND == "fake":
+        return f"https://{OSS_BUCKET or 'fake-bucket'}.oss.invalid/{object_key}"  # 模拟实现的占位URL
+    endpoint_host = OSS_ENDPOINT.replace("http://", "").replace("https://", "").rstrip('/')  # 去除协议
+    return f"https://{OSS_BUCKET}.{endpoint_host}/{object_key}"  # 拼接默认公网URL
+
+
+def object_key_from_url(url: str) -> Optional[str]:  # 由 get_object_url 生成的URL反推对象名
+    prefix = get_object_url("")
+    if url and url.startswith(prefix):
+        return url[len(prefix):]
+    return None
+
+
+def open_object(object_key: str, bucket=None):  # 打开已有对象，返回可分块 read() 的流（对象不存在时抛出 oss2.exceptions.NoSuchKey）
+    return (bucket or get_bucket()).get_object(object_key)
+
+
+def delete_objects(object_keys: Iterable[str]) -> None:  # 批量删除对象（用于清理取消/失败任务留下的文件）
+    keys = [k for k in object_keys if k]
+    if not keys:
+        return
+    bucket = get_bucket()
+    for offset in range(0, len(keys), 1000):  # 单次批量删除最多1000个
+        bucket.batch_delete_objects(keys[offset:offset + 1000])
+
+
+def _record_part(part_number: int, size: int, seconds: float) -> None:  # 默认分片回调：只记录指标，不逐个分片输出日志
+    metrics.observe("oss_part_seconds", seconds)
+    metrics.inc("oss_part_bytes", size)
+
+
+def upload_bytes_and_get_url(data: bytes, filename: str, content_type: str, folder: Optional[str] = None) -> str:  # 上传字节并返回URL
+    bucket = get_bucket()  # 获取Bucket
+    object_key = _make_object_key(filename, folder)  # 生成对象名
 
     # 上传对象
     headers = {"Content-Type": content_type} if content_type else None  # 设置内容类型
     bucket.put_object(object_key, data, headers=headers)  # 直接上传字节数据
+    return get_object_url(object_key)  # 返回URL
 
-    # 生成公网可访问URL
-    if OSS_PUBLIC_DOMAIN:  # 若配置了公网域名
-        url = f"{OSS_PUBLIC_DOMAIN.rstrip('/')}/{object_key}"  # 使用自定义域名拼接URL
-    else:  # 否则使用默认规则
-        endpoint_host = OSS_ENDPOINT.replace("http://", "").replace("https://", "").rstrip('/')  # 去除协议
-        url = f"https://{OSS_BUCKET}.{endpoint_host}/{object_key}"  # 拼接默认公网URL
-    return url  # 返回URL
+
+def _upload_part_with_retry(bucket, object_key: str, upload_id: str, part_number: int, read_part: Callable[[], object], size: int, on_part: PartCallback) -> str:  # 上传单个分片（失败重试），返回ETag
+    last_error = None
+    for attempt in range(OSS_PART_RETRIES + 1):
+        started = time.monotonic()
+        try:
+            result = bucket.upload_part(object_key, upload_id, part_number, read_part())  # 每次重试重新读取分片数据
+            on_part(part_number, size, time.monotonic() - started)  # 汇报分片吞吐
+            return result.etag
+        except oss2.exceptions.OssError as e:  # 网络或服务端错误，退避后重试
+            last_error = e
+            time.sleep(min(2 ** attempt, 10))
+    raise RuntimeError(f"分片 {part_number} 上传失败：{last_error}")
+
+
+def upload_stream_and_get_url(stream: Iterable[bytes], filename: str, content_type: str, folder: Optional[str] = None, on_part: PartCallback = _record_part, bucket=None, cancel_token=None) -> str:  # 上传数据流并返回URL
+    """
+    上传长度未知的数据流（如ffmpeg转码输出），不在内存中拼接完整内容
+    - 数据量不超过 OSS_MULTIPART_THRESHOLD 时单次 put_object
+    - 超过后改为分片上传：线程池并行上传，在途分片数受线程数限制，内存占用约为 分片大小×线程数
+    - 单个分片失败只重试该分片
+    - 传入 cancel_token 时每个分片前检查取消，取消后放弃分片上传并抛出 TaskCancelled
+    """
+    bucket = bucket or get_bucket()  # 获取Bucket
+    object_key = _make_object_key(filename, folder)  # 生成对象名
+    headers = {"Content-Type": content_type} if content_type else None  # 设置内容类型
+    chunks = iter(stream)
+    buffer = bytearray()  # 当前分片缓冲
+    exhausted = False
+
+    def fill(limit: int) -> bytes:  # 从流中读满一个分片
+        nonlocal exhausted
+        while len(buffer) < limit and not exhausted:
+            chunk = next(chunks, None)
+            if chunk is None:
+                exhausted = True
+                break
+            buffer.extend(chunk)
+        part = bytes(buffer[:limit])
+        del buffer[:limit]
+        return part
+
+    first = fill(max(OSS_MULTIPART_THRESHOLD, OSS_PART_SIZE) + 1)  # 多读1字节以判断是否超过阈值
+    if exhausted and not buffer and len(first) <= OSS_MULTIPART_THRESHOLD:  # 小文件直接上传
+        bucket.put_object(object_key, first, headers=headers)
+        return get_object_url(object_key)
+
+    buffer[:0] = first  # 放回缓冲，按分片大小切分
+    upload_id = bucket.init_multipart_upload(object_key, headers=headers).upload_id  # 初始化分片上传
+    parts = {}  # 分片号 -> ETag
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, OSS_UPLOAD_THREADS)) as pool:
+            pending = {}  # future -> 分片号
+            part_number = 0
+            while True:
+                if cancel_token is not None:
+                    cancel_token.raise_if_cancelled()  # 分片之间检查取消
+                data = fill(OSS_PART_SIZE)
+                if not data:
+                    break
+                part_number += 1
+                future = pool.submit(_upload_part_with_retry, bucket, object_key, upload_id, part_number, lambda d=data: d, len(data), on_part)
+                pending[future] = part_number
+                if len(pending) >= OSS_UPLOAD_THREADS:  # 在途分片已满，等待任意一个完成
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for f in done:
+                        parts[pending.pop(f)] = f.result()
+            for f in list(pending):  # 等待剩余分片
+                parts[pending.pop(f)] = f.result()
+        part_infos = [oss2.models.PartInfo(n, parts[n]) for n in sorted(parts)]
+        bucket.complete_multipart_upload(object_key, upload_id, part_infos)  # 合并分片
+    except BaseException:
+        try:
+            bucket.abort_multipart_upload(object_key, upload_id)  # 流无法重放，失败时放弃本次分片上传
+        except Exception:
+            pass
+        raise
+    return get_object_url(object_key)
+
+
+def _checkpoint_path(bucket, resume_key: str, size: int) -> str:  # 断点记录文件路径（按 bucket+内容标识+大小 区分，与暂存文件路径无关）
+    key = f"{bucket.bucket_name}|{resume_key}|{size}"
+    return os.path.join(OSS_CHECKPOINT_DIR, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".json")
+
+
+def _lock_checkpoint(checkpoint: str) -> bool:  # 独占断点记录（跨进程）；相同内容正在被其它任务上传时返回False
+    os.makedirs(OSS_CHECKPOINT_DIR, exist_ok=True)
+    try:
+        os.close(os.open(checkpoint + ".lock", os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+    except FileExistsError:
+        return False
+    return True
+
+
+def _remove(path: str) -> None:  # 删除文件（忽略不存在等错误）
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _abort_upload(bucket, object_key: str, upload_id: str) -> None:  # 放弃分片上传，释放服务端已上传的分片（忽略错误）
+    try:
+        bucket.abort_multipart_upload(object_key, upload_id)
+    except Exception as e:
+        print(f"[oss] 放弃分片上传失败 {object_key}: {e}")
+
+
+def _load_checkpoint(bucket, checkpoint: str) -> Optional[dict]:  # 读取断点记录并与服务端已上传分片核对
+    try:
+        with open(checkpoint, "r", encoding="utf-8") as f:
+            record = json.load(f)
+        uploaded = {p.part_number: p.etag for p in oss2.PartIterator(bucket, record["object_key"], record["upload_id"])}  # 服务端已有分片
+    except (OSError, ValueError, KeyError, oss2.exceptions.NoSuchUpload):  # 记录损坏或上传已失效
+        return None
+    record["parts"] = {str(n): etag for n, etag in uploaded.items()}  # 以服务端实际已上传的分片为准
+    return record
+
+
+def _save_checkpoint(checkpoint: str, record: dict) -> None:  # 原子写入断点记录
+    os.makedirs(OSS_CHECKPOINT_DIR, exist_ok=True)
+    tmp = checkpoint + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(record, f)
+    os.replace(tmp, checkpoint)
+
+
+def upload_file_and_get_url(path: str, filename: str, content_type: str, folder: Optional[str] = None, on_part: PartCallback = _record_part, bucket=None, cancel_token=None, resume_key: Optional[str] = None) -> str:  # 上传本地文件并返回URL
+    """
+    上传本地文件，超过 OSS_MULTIPART_THRESHOLD 时并行分片上传
+    - 传入 resume_key（如内容SHA-256）时支持断点续传：断点记录保存在 OSS_CHECKPOINT_DIR，相同内容再次上传时跳过已完成的分片；
+      失败时保留记录与服务端分片等待续传，超过 OSS_CHECKPOINT_TTL 未续传的由 sweep_checkpoints 放弃并删除
+    - 未传 resume_key（源文件是临时文件，无法续传）或相同内容正在被其它任务上传时不记录断点，失败即放弃分片上传
+    - 上传完成后删除断点记录；传入 cancel_token 时取消后不再提交新分片，放弃分片上传并删除断点记录
+    """
+    bucket = bucket or get_bucket()  # 获取Bucket
+    headers = {"Content-Type": content_type} if content_type else None  # 设置内容类型
+    size = os.path.getsize(path)
+    if size <= OSS_MULTIPART_THRESHOLD:  # 小文件直接上传
+        object_key = _make_object_key(filename, folder)
+        bucket.put_object_from_file(object_key, path, headers=headers)
+        return get_object_url(object_key)
+
+    checkpoint = None  # 断点记录文件（仅在可续传时使用）
+    if resume_key:
+        checkpoint = _checkpoint_path(bucket, resume_key, size)
+        if not _lock_checkpoint(checkpoint):  # 相同内容正在上传：本次不续传也不写断点，避免两个任务共用一个分片上传
+            checkpoint = None
+    try:
+        return _upload_parts(bucket, path, size, filename, folder, headers, on_part, cancel_token, checkpoint)
+    finally:
+        if checkpoint is not None:
+            _remove(checkpoint + ".lock")
+
+
+def _upload_parts(bucket, path: str, size: int, filename: str, folder: Optional[str], headers, on_part: PartCallback, cancel_token, checkpoint: Optional[str]) -> str:  # 并行分片上传（checkpoint 为None时不续传）
+    record = _load_checkpoint(bucket, checkpoint) if checkpoint is not None else None
+    if record is None or record.get("part_size") != OSS_PART_SIZE:  # 无可用断点，新建分片上传
+        object_key = _make_object_key(filename, folder)
+        upload_id = bucket.init_multipart_upload(object_key, headers=headers).upload_id
+        record = {"object_key": object_key, "upload_id": upload_id, "part_size": OSS_PART_SIZE, "parts": {}}
+        if checkpoint is not None:
+            _save_checkpoint(checkpoint, record)
+    else:
+        log_event("oss_resume", object_key=record["object_key"], parts_done=len(record["parts"]))
+    object_key, upload_id = record["object_key"], record["upload_id"]
+
+    def read_range(offset: int, length: int) -> Callable[[], bytes]:  # 按偏移读取文件分片
+        def read() -> bytes:
+            with open(path, "rb") as f:
+                f.seek(offset)
+                return f.read(length)
+        return read
+
+    def upload_part(n: int, offset: int, length: int) -> str:
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()  # 取消后排队中的分片不再上传
+        return _upload_part_with_retry(bucket, object_key, upload_id, n, read_range(offset, length), length, on_part)
+
+    total_parts = (size + OSS_PART_SIZE - 1) // OSS_PART_SIZE
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, OSS_UPLOAD_THREADS)) as pool:
+            futures = {}
+            for n in range(1, total_parts + 1):
+                if str(n) in record["parts"]:  # 已上传的分片跳过
+                    continue
+                offset = (n - 1) * OSS_PART_SIZE
+                futures[pool.submit(upload_part, n, offset, min(OSS_PART_SIZE, size - offset))] = n
+            for f in futures:
+                record["parts"][str(futures[f])] = f.result()
+                if checkpoint is not None:
+                    _save_checkpoint(checkpoint, record)  # 每完成一个分片就更新断点
+        part_infos = [oss2.models.PartInfo(int(n), etag) for n, etag in sorted(record["parts"].items(), key=lambda x: int(x[0]))]
+        bucket.complete_multipart_upload(object_key, upload_id, part_infos)  # 合并分片
+    except Exception:
+        if checkpoint is None or (cancel_token is not None and cancel_token.is_cancelled()):  # 无法续传或已取消：放弃上传，不保留断点
+            _abort_upload(bucket, object_key, upload_id)
+            if checkpoint is not None:
+                _remove(checkpoint)
+        raise
+    if checkpoint is not None:
+        _remove(checkpoint)  # 上传完成，删除断点记录
+    return get_object_url(object_key)
+
+
+def sweep_checkpoints(ttl_seconds: float = OSS_CHECKPOINT_TTL, bucket=None) -> int:
+    """放弃超过 ttl 秒未续传的分片上传并删除断点记录（含崩溃进程遗留的锁文件与临时文件），返回清理的断点数"""
+    try:
+        names = os.listdir(OSS_CHECKPOINT_DIR)
+    except FileNotFoundError:
+        return 0
+    deadline = time.time() - ttl_seconds
+    count = 0
+    for name in names:
+        path = os.path.join(OSS_CHECKPOINT_DIR, name)
+        try:
+            if os.path.getmtime(path) >= deadline:
+                continue
+        except OSError:  # 已被其它进程删除
+            continue
+        if not name.endswith(".json"):  # 过期的锁文件（持有者已崩溃）与未完成的临时文件
+            _remove(path)
+            continue
+        if os.path.exists(path + ".lock"):  # 正在续传（锁文件未过期）
+            continue
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                record = json.load(f)
+            _abort_upload(bucket or get_bucket(), record["object_key"], record["upload_id"])
+        except (OSError, ValueError, KeyError):
+            pass
+        _remove(path)
+        count += 1
+    return count
+
+
+_sweeper_started = False  # 断点清理线程是否已启动
+_sweeper_lock = threading.Lock()
+
+
+def _sweep_loop() -> None:  # 定期清理过期断点
+    while True:
+        time.sleep(OSS_CHECKPOINT_SWEEP_INTERVAL)
+        try:
+            count = sweep_checkpoints()
+            if count:
+                print(f"[oss] 已放弃过期的断点续传 {count} 个")
+        except Exception as e:
+            print(f"[oss] 清理断点续传记录失败：{e}")
+
+
+def start_checkpoint_sweeper() -> None:  # 启动过期断点清理线程（可重复调用）
+    global _sweeper_started
+    with _sweeper_lock:
+        if _sweeper_started:
+            return
+        threading.Thread(target=_sweep_loop, name="oss-checkpoint-sweeper", daemon=True).start()
+        _sweeper_started = True
@@ -0,0 +1,49 @@
+import threading  # 导入线程库
+import time  # 导入时间库
+from collections import OrderedDict  # 导入有序字典，淘汰最久未访问的键
+from app.core.config import (
+    SEND_CODE_EMAIL_BURST,
+    SEND_CODE_EMAIL_INTERVAL,
+    SEND_CODE_IP_BURST,
+    SEND_CODE_IP_INTERVAL,
+    RATE_LIMIT_MAX_KEYS,
+)  # 导入限流配置
+
+
+class TokenBucketLimiter:  # 按键（邮箱、IP等）独立计数的进程内令牌桶
+    """
+    令牌桶限流器
+    - 每个键最多积累 burst 个令牌，每 interval 秒恢复一个；acquire 消耗一个令牌
+    - 超过 max_keys 个键时淘汰最久未访问的键（被淘汰的键视为令牌已满）
+    - 仅在单进程内生效，多进程部署时每个进程各自限流
+    """
+
+    def __init__(self, burst: int, interval: float, max_keys: int):
+        self.burst = max(1, burst)  # 桶容量
+        self.interval = max(0.0, interval)  # 恢复一个令牌的秒数
+        self.max_keys = max(1, max_keys)  # 最多跟踪的键数
+        self._buckets = OrderedDict()  # key -> (剩余令牌数, 上次更新时间)
+        self._lock = threading.Lock()
+
+    def acquire(self, key: str) -> float:
+        """尝试消耗一个令牌：成功返回0，否则返回需等待的秒数"""
+        if self.interval <= 0:  # 间隔为0表示不限流
+            return 0.0
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.pop(key, (float(self.burst), now))
+            tokens = min(float(self.burst), tokens + (now - updated) / self.interval)  # 按经过时间补充令牌
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0.0
+            else:
+                wait = (1 - tokens) * self.interval
+            self._buckets[key] = (tokens, now)  # 重新插入到末尾（最近访问）
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return wait
+
+
+# 发送验证码的限流器：按邮箱防止轰炸同一收件人，按IP防止单个客户端批量刷接口
+send_code_email_limiter = TokenBucketLimiter(SEND_CODE_EMAIL_BURST, SEND_CODE_EMAIL_INTERVAL, RATE_LIMIT_MAX_KEYS)
+send_code_ip_limiter = TokenBucketLimiter(SEND_CODE_IP_BURST, SEND_CODE_IP_INTERVAL, RATE_LIMIT_MAX_KEYS)
@@ -1,38 +1,54 @@
 # -*- coding: utf8 -*-
+import asyncio
 import json
-import os
+import logging
+import threading
 import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional
 from aliyunsdkcore.acs_exception.exceptions import ClientException
 from aliyunsdkcore.acs_exception.exceptions import ServerException
 from aliyunsdkcore.client import AcsClient
 from aliyunsdkcore.request import CommonRequest
-def fileTrans(akId, akSecret, appKey, fileLink) :
-    # 地域ID，固定值。
-    REGION_ID = "cn-shanghai"
-    PRODUCT = "nls-filetrans"
-    DOMAIN = "filetrans.cn-shanghai.aliyuncs.com"
-    API_VERSION = "2018-08-17"
-    POST_REQUEST_ACTION = "SubmitTask"
-    GET_REQUEST_ACTION = "GetTaskResult"
-    # 请求参数
-    KEY_APP_KEY = "appkey"
-    KEY_FILE_LINK = "file_link"
-    KEY_VERSION = "version"
-    KEY_ENABLE_WORDS = "enable_words"
-    # 是否开启智能分轨
-    KEY_AUTO_SPLIT = "auto_split"
-    # 响应参数
-    KEY_TASK = "Task"
-    KEY_TASK_ID = "TaskId"
-    KEY_STATUS_TEXT = "StatusText"
-    KEY_RESULT = "Result"
-    # 状态值
-    STATUS_SUCCESS = "SUCCESS"
-    STATUS_RUNNING = "RUNNING"
-    STATUS_QUEUEING = "QUEUEING"
-    # 创建AcsClient实例
-    client = AcsClient(akId, akSecret, REGION_ID)
-    # 提交录音文件识别请求
+from app.core.config import (
+    ASR_POLL_MIN_INTERVAL,
+    ASR_POLL_MAX_INTERVAL,
+    ASR_POLL_DURATION_RATIO,
+    ASR_POLL_BACKOFF,
+    ASR_HTTP_THREADS,
+    ASR_MAX_ERRORS,
+    ASR_BACKEND,
+)
+from app.core import metrics
+from app.core.log import log_event
+
+# 地域ID，固定值。
+REGION_ID = "cn-shanghai"
+PRODUCT = "nls-filetrans"
+DOMAIN = "filetrans.cn-shanghai.aliyuncs.com"
+API_VERSION = "2018-08-17"
+POST_REQUEST_ACTION = "SubmitTask"
+GET_REQUEST_ACTION = "GetTaskResult"
+# 请求参数
+KEY_APP_KEY = "appkey"
+KEY_FILE_LINK = "file_link"
+KEY_VERSION = "version"
+KEY_ENABLE_WORDS = "enable_words"
+# 是否开启智能分轨
+KEY_AUTO_SPLIT = "auto_split"
+# 响应参数
+KEY_TASK = "Task"
+KEY_TASK_ID = "TaskId"
+KEY_STATUS_TEXT = "StatusText"
+KEY_RESULT = "Result"
+# 状态值
+STATUS_SUCCESS = "SUCCESS"
+STATUS_RUNNING = "RUNNING"
+STATUS_QUEUEING = "QUEUEING"
+
+
+def submit_task(client, appKey, fileLink):
+    """提交录音文件识别请求，成功返回TaskId，失败返回None"""
     postRequest = CommonRequest()
     postRequest.set_domain(DOMAIN)
     postRequest.set_version(API_VERSION)
@@ -45,25 +61,22 @@ def fileTrans(akId, akSecret, appKey, fileLink) :
     # 开启智能分轨，如果开启智能分轨，task中设置KEY_AUTO_SPLIT为True。
     # task = {KEY_APP_KEY : appKey, KEY_FILE_LINK : fileLink, KEY_VERSION : "4.0", KEY_ENABLE_WORDS : False, KEY_AUTO_SPLIT : True}
     task = json.dumps(task)
-    print(task)
     postRequest.add_body_params(KEY_TASK, task)
-    taskId = ""
     try :
         postResponse = client.do_action_with_exception(postRequest)
         postResponse = json.loads(postResponse)
-        print (postResponse)
         statusText = postResponse[KEY_STATUS_TEXT]
         if statusText == STATUS_SUCCESS :
-            print ("录音文件识别请求成功响应！")
-            taskId = postResponse[KEY_TASK_ID]
-        else :
-            print ("录音文件识别请求失败！")
-            return
-    except ServerException as e:
-        print (e)
-    except ClientException as e:
-        print (e)
-    # 创建CommonRequest，设置任务ID。
+            log_event("asr_submitted", asr_task_id=postResponse[KEY_TASK_ID], file_link=fileLink)
+            return postResponse[KEY_TASK_ID]
+        log_event("asr_submit_failed", logging.WARNING, status=statusText, file_link=fileLink, response=postResponse)
+    except (ServerException, ClientException) as e:
+        log_event("asr_submit_error", logging.WARNING, file_link=fileLink, error=str(e))
+    return None
+
+
+def query_task(client, taskId):
+    """查询一次识别结果，返回响应字典（StatusText 为 RUNNING/QUEUEING 表示仍在处理）"""
     getRequest = CommonRequest()
     getRequest.set_domain(DOMAIN)
     getRequest.set_version(API_VERSION)
@@ -71,31 +84,126 @@ def fileTrans(akId, akSecret, appKey, fileLink) :
     getRequest.set_action_name(GET_REQUEST_ACTION)
     getRequest.set_method('GET')
     getRequest.add_query_param(KEY_TASK_ID, taskId)
-    # 提交录音文件识别结果查询请求
-    # 以轮询的方式进行识别结果的查询，直到服务端返回的状态描述符为"SUCCESS"、"SUCCESS_WITH_NO_VALID_FRAGMENT"，
-    # 或者为错误描述，则结束轮询。
-    statusText = ""
-    while True :
-        try :
-            getResponse = client.do_action_with_exception(getRequest)
-            getResponse = json.loads(getResponse)
-            print (getResponse)
-            statusText = getResponse[KEY_STATUS_TEXT]
-            if statusText == STATUS_RUNNING or statusText == STATUS_QUEUEING :
-                # 继续轮询
-                time.sleep(10)
-            else :
-                # 退出轮询
-                break
-        except ServerException as e:
-            print (e)
-        except ClientException as e:
-            print (e)
-    if statusText == STATUS_SUCCESS :
-        print ("录音文件识别成功！")
-    else :
-        print ("录音文件识别失败！")
+    getResponse = client.do_action_with_exception(getRequest)
+    getResponse = json.loads(getResponse)
+    log_event("asr_poll", logging.DEBUG, asr_task_id=taskId, status=getResponse.get(KEY_STATUS_TEXT))  # 不输出识别结果
     return getResponse
+
+
+def first_poll_delay(duration: Optional[float]) -> float:
+    """按音频时长估算首次轮询延迟：时长越长，服务端处理越久，越晚开始查询"""
+    if not duration:
+        return ASR_POLL_MIN_INTERVAL
+    return min(ASR_POLL_MAX_INTERVAL, max(ASR_POLL_MIN_INTERVAL, duration * ASR_POLL_DURATION_RATIO))
+
+
+class AsrJobManager:
+    """
+    录音文件识别任务管理器
+    - 复用同一个 AcsClient
+    - 所有待完成的 TaskId 在同一个 asyncio 事件循环中轮询（每个任务一个协程，而不是一个休眠线程）
+    - 轮询间隔按音频时长确定首次延迟，之后按 ASR_POLL_BACKOFF 递增，不超过 ASR_POLL_MAX_INTERVAL
+    - submit 返回 concurrent.futures.Future，结果为最终的查询响应字典
+    """
+
+    def __init__(self, akId, akSecret, appKey):
+        self.appKey = appKey
+        self.client = AcsClient(akId, akSecret, REGION_ID)  # 共享客户端
+        self._executor = ThreadPoolExecutor(max_workers=max(1, ASR_HTTP_THREADS), thread_name_prefix="asr-http")  # 执行阻塞HTTP请求
+        self._loop = asyncio.new_event_loop()  # 轮询事件循环
+        self._pending = 0  # 进行中的任务数
+        self._lock = threading.Lock()
+        threading.Thread(target=self._loop.run_forever, name="asr-poller", daemon=True).start()
+
+    @property
+    def pending(self) -> int:  # 进行中的转写任务数
+        with self._lock:
+            return self._pending
+
+    def submit(self, fileLink, duration: Optional[float] = None) -> Future:
+        """提交转写任务（线程安全），duration 为音频时长（秒，可选），用于决定轮询节奏"""
+        return asyncio.run_coroutine_threadsafe(self._track(fileLink, duration), self._loop)
+
+    def transcribe(self, fileLink, duration: Optional[float] = None):
+        """提交并阻塞等待结果"""
+        return self.submit(fileLink, duration).result()
+
+    async def _call(self, fn, *args):  # 在线程池中执行阻塞的SDK调用
+        return await self._loop.run_in_executor(self._executor, fn, *args)
+
+    async def _track(self, fileLink, duration):
+        with self._lock:
+            self._pending += 1
+        try:
+            started = time.monotonic()
+            taskId = await self._call(submit_task, self.client, self.appKey, fileLink)
+            metrics.observe_stage("asr_submit", time.monotonic() - started)
+            if not taskId:
+                return None
+            waiting = time.monotonic()
+            # 以轮询的方式进行识别结果的查询，直到服务端返回的状态描述符为"SUCCESS"、"SUCCESS_WITH_NO_VALID_FRAGMENT"，
+            # 或者为错误描述，则结束轮询。
+            delay = first_poll_delay(duration)
+            errors = 0
+            while True:
+                await asyncio.sleep(delay)
+                try:
+                    getResponse = await self._call(query_task, self.client, taskId)
+                    errors = 0
+                except (ServerException, ClientException) as e:
+                    log_event("asr_poll_error", logging.WARNING, asr_task_id=taskId, error=str(e))
+                    errors += 1
+                    if errors >= ASR_MAX_ERRORS:
+                        raise RuntimeError(f"查询识别结果连续失败：{e}")
+                    continue
+                statusText = getResponse[KEY_STATUS_TEXT]
+                if statusText != STATUS_RUNNING and statusText != STATUS_QUEUEING :
+                    break
+                delay = min(ASR_POLL_MAX_INTERVAL, max(ASR_POLL_MIN_INTERVAL, delay * ASR_POLL_BACKOFF))  # 退避
+            seconds = time.monotonic() - waiting
+            metrics.observe_stage("asr_wait", seconds)
+            sentences = (getResponse.get(KEY_RESULT) or {}).get("Sentences") or []
+            level = logging.INFO if statusText == STATUS_SUCCESS else logging.WARNING
+            log_event("asr_finished", level, asr_task_id=taskId, status=statusText, sentences=len(sentences), seconds=round(seconds, 1), duration=duration)
+            return getResponse
+        finally:
+            with self._lock:
+                self._pending -= 1
+
+
+_managers = {}  # (akId, appKey) -> AsrJobManager
+_managers_lock = threading.Lock()
+
+
+def get_manager(akId, akSecret, appKey) -> AsrJobManager:
+    """获取（或创建）与凭证对应的任务管理器，进程内共享；ASR_BACKEND=fake 时返回本地模拟实现（接口相同）"""
+    key = ("fake",) if ASR_BACKEND == "fake" else (akId, akSecret, appKey)
+    with _managers_lock:
+        manager = _managers.get(key)
+        if manager is None:
+            if ASR_BACKEND == "fake":
+                from app.services.fakes import FakeAsrJobManager
+                manager = FakeAsrJobManager()
+            else:
+                manager = AsrJobManager(akId, akSecret, appKey)
+            _managers[key] = manager
+        return manager
+
+
+def pending_jobs() -> int:
+    """本进程所有任务管理器中进行中的转写任务数"""
+    with _managers_lock:
+        managers = list(_managers.values())
+    return sum(m.pending for m in managers)
+
+
+def fileTrans(akId, akSecret, appKey, fileLink, duration=None, cancel_token=None) :
+    """提交录音文件识别并等待结果（兼容旧接口，轮询由共享的 AsrJobManager 完成）
+    传入 cancel_token 时，取消会立即停止该任务的轮询并抛出 TaskCancelled"""
+    future = get_manager(akId, akSecret, appKey).submit(fileLink, duration)
+    if cancel_token is None:
+        return future.result()
+    return cancel_token.wait_future(future)
 # accessKeyId = os.getenv('OSS_ACCESS_KEY_ID')
 # accessKeySecret = os.getenv('OSS_ACCESS_KEY_SECRET')
 # appKey = os.getenv('OSS_APP_KEY')
@@ -0,0 +1,94 @@
+import threading  # 导入线程库
+from collections import OrderedDict  # 导入有序字典，实现LRU
+from typing import Callable, Optional  # 导入类型注解
+from app.core import metrics  # 导入指标模块
+from app.core.config import RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_MAX_BYTES  # 导入缓存配置
+
+
+class LRUCache:  # 线程安全的LRU缓存，按条目数与总字节数双重限制
+    def __init__(self, max_entries: int, max_bytes: int, sizeof: Callable[[object], int]):
+        self.max_entries = max(1, max_entries)  # 条目数上限
+        self.max_bytes = max(1, max_bytes)  # 总字节数上限
+        self._sizeof = sizeof  # 计算条目大小的函数
+        self._items = OrderedDict()  # key -> (value, size)
+        self._bytes = 0  # 当前总字节数
+        self._lock = threading.Lock()
+
+    def get(self, key):  # 读取并刷新为最近使用，未命中返回None
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            self._items.move_to_end(key)
+            return item[0]
+
+    def put(self, key, value) -> None:  # 写入并按LRU淘汰超限条目
+        size = self._sizeof(value)
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            if size > self.max_bytes:  # 单条超过总上限，不缓存
+                return
+            self._items[key] = (value, size)
+            self._bytes += size
+            while len(self._items) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._items.popitem(last=False)  # 淘汰最久未使用的条目
+                self._bytes -= evicted_size
+
+    def pop(self, key) -> None:  # 删除条目（不存在时忽略）
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"entries": len(self._items), "bytes": self._bytes}
+
+
+LAYERS = ("summary", "transcript", "audio_url")  # 查找顺序：总结 -> 转写 -> 音频对象
+
+
+def _entry_size(entry: dict) -> int:  # 缓存条目大小（按UTF-8字节计）
+    return sum(len(v.encode("utf-8")) for v in entry.values() if isinstance(v, str))
+
+
+class ResultCache:  # 以上传内容SHA-256为键的分层结果缓存
+    """
+    内容寻址结果缓存
+    - 键为上传文件的SHA-256；值为各阶段产物：audio_url（OSS音频）、transcript（转写文本）、summary（总结）
+    - lookup 按 总结 -> 转写 -> 音频 的顺序判断命中层级并计数
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int):
+        self._lru = LRUCache(max_entries, max_bytes, _entry_size)
+
+    def lookup(self, digest: Optional[str], count: bool = True) -> dict:  # 查找缓存，返回已有阶段产物（未命中返回空dict）
+        entry = self._lru.get(digest) if digest else None
+        if entry:
+            for layer in LAYERS:
+                if entry.get(layer):
+                    if count:
+                        self.count_hit(layer)  # 按最深命中层计数
+                    return dict(entry)
+        if count:
+            metrics.inc("result_cache_misses")
+        return {}
+
+    def count_hit(self, layer: str) -> None:  # 记录某一层的命中
+        metrics.inc(f"result_cache_{layer}_hits")
+
+    def store(self, digest: Optional[str], **fields) -> None:  # 合并写入某个阶段的产物
+        if not digest:
+            return
+        entry = dict(self._lru.get(digest) or {})
+        entry.update({k: v for k, v in fields.items() if v})
+        self._lru.put(digest, entry)
+
+    def stats(self) -> dict:
+        return self._lru.stats()
+
+
+# 全局结果缓存实例
+result_cache = ResultCache(RESULT_CACHE_MAX_ENTRIES, RESULT_CACHE_MAX_BYTES)
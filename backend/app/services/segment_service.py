@@ -0,0 +1,152 @@
+import re  # 正则，用于解析ffmpeg输出
+from concurrent.futures import Future, ThreadPoolExecutor  # 导入线程池
+from typing import Callable, List, Optional, Tuple  # 导入类型注解
+import ffmpeg  # ffmpeg-python封装
+from app.services.cancellation import CancelToken  # 导入取消令牌（片段失败时中止其它片段）
+from app.core.config import (
+    ASR_SEGMENT_MAX_SECONDS,
+    ASR_SEGMENT_MIN_SECONDS,
+    ASR_SEGMENT_CONCURRENCY,
+    SILENCE_NOISE_DB,
+    SILENCE_MIN_SECONDS,
+)
+
+Segment = Tuple[float, float]  # (起始秒, 结束秒)
+
+_SILENCE_START = re.compile(r"silence_start:\s*(-?[\d.]+)")
+_SILENCE_END = re.compile(r"silence_end:\s*([\d.]+)")
+_SUCCESS_STATUSES = ("SUCCESS", "SUCCESS_WITH_NO_VALID_FRAGMENT")  # 片段转写成功（无有效语音的片段也算成功）
+
+
+def detect_silences(src_path: str, noise_db: float = SILENCE_NOISE_DB, min_silence: float = SILENCE_MIN_SECONDS, cancel_token=None) -> List[Segment]:
+    """
+    用 ffmpeg silencedetect 检测静音区间
+    :return: [(静音开始秒, 静音结束秒)]，按时间排序
+    """
+    process = (
+        ffmpeg
+        .input(src_path)
+        .output('-', format='null', af=f'silencedetect=noise={noise_db}dB:d={min_silence}', vn=None, sn=None)
+        .global_args('-nostats', '-hide_banner')
+        .run_async(pipe_stderr=True)
+    )
+    unregister = cancel_token.on_cancel(process.kill) if cancel_token is not None else None
+    silences, start, tail = [], None, []
+    try:
+        for raw in iter(process.stderr.readline, b""):
+            line = raw.decode("utf-8", "ignore")
+            m = _SILENCE_START.search(line)
+            if m:
+                start = max(0.0, float(m.group(1)))
+                continue
+            m = _SILENCE_END.search(line)
+            if m and start is not None:
+                silences.append((start, float(m.group(1))))
+                start = None
+                continue
+            tail = (tail + [line.rstrip()])[-5:]  # 保留最后几行用于报错
+        code = process.wait()
+    finally:
+        if unregister is not None:
+            unregister()
+        process.stderr.close()
+    if cancel_token is not None:
+        cancel_token.raise_if_cancelled()
+    if code != 0:
+        raise RuntimeError(f"静音检测失败：{'; '.join(tail) or f'exit code {code}'}")
+    return silences
+
+
+def plan_segments(duration: float, silences: List[Segment], max_len: float = ASR_SEGMENT_MAX_SECONDS, min_len: float = ASR_SEGMENT_MIN_SECONDS) -> List[Segment]:
+    """
+    按静音切分为长度不超过 max_len 的片段
+    - 在 [起点+min_len, 起点+max_len] 内选择最靠后的静音中点作为切点
+    - 该范围内没有静音时在 max_len 处硬切
+    - 最后剩余不足 min_len 时并入上一段（上一段最长为 max_len + min_len），避免产生极短的尾段
+    """
+    cuts = sorted((s + e) / 2 for s, e in silences)
+    segments, start = [], 0.0
+    while duration - start > max_len:
+        limit = start + max_len
+        candidates = [c for c in cuts if start + min_len <= c <= limit]
+        cut = candidates[-1] if candidates else limit
+        segments.append((start, cut))
+        start = cut
+    if segments and duration - start < min_len:  # 尾段过短：单独提交转写不划算，且句子容易被切断
+        segments[-1] = (segments[-1][0], duration)
+    else:
+        segments.append((start, duration))
+    return segments
+
+
+def merge_results(results: List[Tuple[float, dict]]) -> dict:
+    """
+    按片段顺序合并转写结果，句子时间戳（毫秒）加上片段起始偏移
+    :param results: [(片段起始秒, 转写响应字典)]
+    :return: 与单次转写相同结构的响应字典
+    """
+    sentences = []
+    for offset, resp in results:
+        if not resp or not isinstance(resp, dict):
+            raise RuntimeError("转写服务返回异常")
+        status = resp.get("StatusText")
+        if status not in _SUCCESS_STATUSES:
+            raise RuntimeError(f"片段转写失败：{status}")
+        offset_ms = int(round(offset * 1000))
+        for sentence in (resp.get("Result") or {}).get("Sentences") or []:
+            sentence = dict(sentence)
+            for key in ("BeginTime", "EndTime"):
+                if isinstance(sentence.get(key), (int, float)):
+                    sentence[key] += offset_ms
+            sentences.append(sentence)
+    return {"StatusText": "SUCCESS", "Result": {"Sentences": sentences}}
+
+
+def transcribe_segments(
+    segments: List[Segment],
+    prepare: Callable[[int, float, float, CancelToken], str],
+    submit: Callable[[str, float], Future],
+    cancel_token=None,
+    concurrency: int = ASR_SEGMENT_CONCURRENCY,
+    on_segment: Optional[Callable[[int, int], None]] = None,
+) -> dict:
+    """
+    并行转写各片段并合并结果
+    :param prepare: prepare(序号, 起始秒, 结束秒, 中止令牌) -> 片段音频URL（转码并上传；中止令牌取消时应结束ffmpeg并放弃上传）
+    :param submit: submit(音频URL, 时长秒) -> Future，结果为转写响应字典（如 AsrJobManager.submit）
+    :param on_segment: 每完成一个片段回调 (已完成数, 总数)
+    片段准备好即提交转写，转码上传与服务端转写流水线并行
+    任一片段失败或任务取消时：中止正在准备的片段、等待准备线程全部退出、取消全部已提交的转写后再抛出，
+    返回时 prepare 不会再上传新对象（调用方此时清理已上传的片段即可覆盖全部对象）
+    """
+    abort = CancelToken(cancel_token.task_id if cancel_token is not None else "segments")  # 中止令牌：任务取消或任一片段失败时触发
+    unlink = cancel_token.on_cancel(abort.cancel) if cancel_token is not None else (lambda: None)
+
+    def run(index: int, start: float, end: float) -> Future:
+        abort.raise_if_cancelled()  # 已中止：不再开始转码上传
+        link = prepare(index, start, end, abort)
+        abort.raise_if_cancelled()  # 已中止：不再提交转写（已上传的对象由调用方清理）
+        return submit(link, end - start)
+
+    pool = ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="asr-segment")
+    pending = []
+    try:
+        pending = [pool.submit(run, i, start, end) for i, (start, end) in enumerate(segments)]
+        results = []
+        for i, future in enumerate(pending):
+            asr_future = cancel_token.wait_future(future) if cancel_token is not None else future.result()
+            resp = cancel_token.wait_future(asr_future) if cancel_token is not None else asr_future.result()
+            results.append((segments[i][0], resp))
+            if on_segment is not None:
+                on_segment(i + 1, len(segments))
+    except BaseException:
+        abort.cancel()  # 结束正在运行的ffmpeg、放弃进行中的上传
+        pool.shutdown(wait=True, cancel_futures=True)  # 放弃尚未开始的片段，并等待准备中的片段退出
+        for future in pending:  # 停止全部已提交片段的转写轮询
+            if not future.cancelled() and future.exception() is None:
+                future.result().cancel()
+        raise
+    finally:
+        unlink()
+    pool.shutdown(wait=True)
+    return merge_results(results)
@@ -1,69 +1,251 @@
 # summarize_qwen.py
 import os
+import re
 from http import HTTPStatus
+from concurrent.futures import ThreadPoolExecutor
 from dashscope import Generation
 import datetime
-from app.services.oss_service import upload_bytes_and_get_url  # 导入OSS上传
+from app.services.artifact_uploader import artifact_uploader  # 导入产物后台上传
+from app.core.config import SUMMARY_MODEL, SUMMARY_CHUNK_TOKENS, SUMMARY_MAP_CONCURRENCY, LLM_BACKEND  # 导入总结配置
+from app.services.summary_cache import summary_cache, summary_key  # 导入总结结果缓存
+from app.core import metrics  # 导入指标模块
+from app.services.task_scheduler import scheduler  # 导入任务调度器（大模型调用的并发上限）
 
-def summarize_text(input_file=None):
+# 提示词版本：修改下方任一提示词或分块策略时递增，使总结缓存中的旧结果失效
+PROMPT_VERSION = "3"
+
+SYSTEM_PROMPT = "你是一位专业的学习笔记助手，帮助用户从转写文本中生成条理清晰、分层详细的学习笔记。"
+
+NOTES_PROMPT = "请根据以下转写文本生成学习笔记，要求：\
+1. 保持逻辑结构（背景、目标、内容、特色、总结等），\
+2. 每个要点下展开2~3句解释，避免只有简单标题，\
+3. 使用 Markdown 格式，分层清晰，\
+4. 尽量保留细节和举例。\
+\n\n原始转写文本：\n{transcript}"
+
+MAP_PROMPT = "以下是一段较长录音转写文本中的第 {index}/{total} 部分。请提炼这一部分的要点，要求：\
+1. 按出现顺序列出主要话题与结论，\
+2. 保留关键细节、数据和举例，\
+3. 使用 Markdown 列表，不要写开头和结尾的客套话。\
+\n\n转写片段：\n{transcript}"
+
+REDUCE_PROMPT = "以下是同一段录音按顺序分段提炼出的要点。请将它们整合为一份完整的学习笔记，要求：\
+1. 保持逻辑结构（背景、目标、内容、特色、总结等），合并重复内容，\
+2. 每个要点下展开2~3句解释，避免只有简单标题，\
+3. 使用 Markdown 格式，分层清晰，\
+4. 尽量保留细节和举例。\
+\n\n分段要点：\n{transcript}"
+
+MODERATION_MESSAGE = "内容审核未通过，无法生成总结，请尝试其他视频。"
+
+_SENTENCE_END = re.compile(r"(?<=[。！？!?；;.])")  # 无分句信息时按标点切分
+
+
+class SummaryFailed(Exception):  # 模型调用失败或内容审核未通过（result 为展示给用户的提示文本，可能为None）
+    def __init__(self, result):
+        super().__init__(result)
+        self.result = result
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估算token数（中文约1字1token，按字符数计，偏保守）"""
+    return len(text)
+
+
+def split_sentences(transcript: str) -> list:
+    """无识别分句时，按句末标点把文本切成句子"""
+    return [s for s in _SENTENCE_END.split(transcript) if s.strip()]
+
+
+def chunk_sentences(sentences: list, budget: int = None, sep: str = "") -> list:
     """
-    调用 Qwen 模型生成学习笔记总结，并将结果保存到OSS的data目录（markdown格式）
-    :param input_file: 转写文本文件路径
-    :return: 生成的总结文本
+    在句子边界上把转写切分为不超过 budget 的若干块
+    :param sentences: 句子文本列表（来自识别结果 Sentences[].Text）
+    :param sep: 块内各项之间的分隔符（合并分块要点时用空行分隔），计入预算
+    :return: 每块的文本列表；单句超出预算时按预算硬切为多段，每块都不超过 budget
     """
-    if input_file is None:
-        input_file = "data/output/result.txt"
+    budget = budget or SUMMARY_CHUNK_TOKENS
+    gap = estimate_tokens(sep)
+    chunks, current, size = [], [], 0
+    for sentence in sentences:
+        if estimate_tokens(sentence) > budget:  # 超长句（如识别结果缺少标点）：按字符硬切（estimate_tokens 按字符计）
+            pieces = [sentence[i:i + budget] for i in range(0, len(sentence), budget)]
+        else:
+            pieces = [sentence]
+        for piece in pieces:
+            tokens = estimate_tokens(piece)
+            if current and size + gap + tokens > budget:
+                chunks.append(sep.join(current))
+                current, size = [], 0
+            size += tokens + (gap if current else 0)
+            current.append(piece)
+    if current:
+        chunks.append(sep.join(current))
+    return chunks
+
+
+def _generation():
+    """大模型调用入口：LLM_BACKEND=fake 时使用本地模拟实现（接口与 dashscope.Generation 相同）"""
+    if LLM_BACKEND == "fake":
+        from app.services.fakes import FakeGeneration
+        return FakeGeneration
+    return Generation
+
+
+def _call_qwen(prompt: str, api_key: str, on_token=None, cancel_token=None) -> str:
+    """调用 Qwen 模型，成功返回文本，失败抛出 SummaryFailed；传入 on_token 时使用增量流式输出并逐段回调
+    每次调用各占一个大模型阶段空位（STAGE_LIMIT_LLM 限制的是同时进行的模型请求数，分块并行的请求也逐个计入）；
+    空位由实际发起请求的线程持有，任务取消后被放弃的请求结束时才释放"""
+    with scheduler.stage("llm", cancel_token):
+        with metrics.span("llm_call", prompt_chars=len(prompt), stream=on_token is not None):
+            return _call_qwen_once(prompt, api_key, on_token, cancel_token)
+
+
+def _call_qwen_once(prompt: str, api_key: str, on_token=None, cancel_token=None) -> str:
+    messages = [
+        {"role": "system", "content": SYSTEM_PROMPT},
+        {"role": "user", "content": prompt},
+    ]
+    if on_token is None:
+        response = _generation().call(
+            model=SUMMARY_MODEL,   # 可换成 qwen-max / qwen-turbo
+            api_key=api_key,
+            messages=messages,
+        )
+        if response.status_code == HTTPStatus.OK:
+            return response.output["text"]
+        _raise_failed(response)
+    # 流式：每个响应只包含新增的文本片段
+    parts = []
+    for response in _generation().call(
+        model=SUMMARY_MODEL,
+        api_key=api_key,
+        messages=messages,
+        stream=True,
+        incremental_output=True,
+    ):
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()  # 每个流式响应都检查取消，尽快结束被放弃的调用
+        if response.status_code != HTTPStatus.OK:
+            _raise_failed(response)
+        delta = response.output["text"] or ""
+        if delta:
+            parts.append(delta)
+            on_token(delta)
+    return "".join(parts)
 
-    # 读取转写结果
-    with open(input_file, "r", encoding="utf-8") as f:
-        transcript = f.read()
 
-    if not transcript.strip():
+def _raise_failed(response):
+    print("请求失败:", response)
+    # 若内容不合规，返回友好提示而非None
+    if response.code == "DataInspectionFailed":
+        raise SummaryFailed(MODERATION_MESSAGE)
+    raise SummaryFailed(None)
+
+
+def _map(chunks: list, api_key: str, cancel_token=None) -> list:
+    """并行提炼各块要点（并发数受 SUMMARY_MAP_CONCURRENCY 限制），结果保持原顺序"""
+    total = len(chunks)
+
+    def summarize_chunk(item):
+        if cancel_token is not None:
+            cancel_token.raise_if_cancelled()  # 已取消则不再发起尚未开始的分块请求
+        return _call_qwen(MAP_PROMPT.format(index=item[0] + 1, total=total, transcript=item[1]), api_key, cancel_token=cancel_token)
+
+    with ThreadPoolExecutor(max_workers=max(1, SUMMARY_MAP_CONCURRENCY)) as pool:
+        return list(pool.map(summarize_chunk, enumerate(chunks)))
+
+
+def _map_reduce(chunks: list, api_key: str, on_token=None, cancel_token=None) -> str:
+    """分块并行提炼要点（map），再整合为最终笔记（reduce）；要点合计仍超出预算时先分组压缩
+    无法继续压缩时（每组只剩一份要点）按预算截断各份要点，整合请求不超过 SUMMARY_CHUNK_TOKENS"""
+    partials = _map(chunks, api_key, cancel_token)
+    while True:
+        groups = chunk_sentences(partials, sep="\n\n")
+        if len(groups) <= 1 or len(groups) >= len(partials):  # 已在预算内，或无法继续压缩
+            break
+        partials = _map(groups, api_key, cancel_token)
+    if len(groups) > 1:  # 单份要点已接近预算：平均分配预算，保留每份的开头
+        share = max(1, (SUMMARY_CHUNK_TOKENS - estimate_tokens("\n\n") * (len(partials) - 1)) // len(partials))
+        partials = [p[:share] for p in partials]  # estimate_tokens 按字符计
+    return _call_qwen(REDUCE_PROMPT.format(transcript="\n\n".join(partials)), api_key, on_token, cancel_token)  # 只有最终整合步骤流式输出
+
+
+def summarize_transcript(transcript: str, sentences=None, on_token=None, cancel_token=None):
+    """
+    调用 Qwen 模型为转写文本生成学习笔记总结（不读写文件、不上传）
+    转写超过 SUMMARY_CHUNK_TOKENS 时按句子边界分块，并行总结各块后再整合（map-reduce）
+    相同转写（同模型、同提示词版本）命中总结缓存时直接返回，不再调用模型
+    :param transcript: 转写文本
+    :param sentences: 识别结果的句子文本列表（可选，用于按句子边界分块）
+    :param on_token: 流式回调（可选），最终笔记生成时逐段传入新增文本
+    :param cancel_token: 取消令牌（可选），流式读取与分块请求之间检查，取消时抛出 TaskCancelled
+    :return: 生成的总结文本
+    :raises SummaryFailed: 调用失败（result 为None）或内容审核未通过（result 为提示文本）；此类结果不是总结，调用方不应缓存或保存
+    """
+    if not transcript or not transcript.strip():
         raise ValueError("转写结果为空，无法总结")
 
+    # 相同转写文本已有总结时直接返回（重试、重复提交、不同视频音频相同）
+    cache_key = summary_key(transcript, SUMMARY_MODEL, PROMPT_VERSION)
+    cached = summary_cache.get(cache_key)
+    if cached is not None:
+        if on_token is not None:
+            on_token(cached)  # 流式订阅者一次性收到完整文本
+        return cached
+
     # 从环境变量读取 API Key
-    api_key = os.getenv("DASHSCOPE_API_KEY")
+    api_key = os.getenv("DASHSCOPE_API_KEY") or ("fake" if LLM_BACKEND == "fake" else None)
     if not api_key:
         raise ValueError("缺少环境变量 DASHSCOPE_API_KEY")
 
-    # 调用 Qwen 模型
-    response = Generation.call(
-        model="qwen-plus",   # 可换成 qwen-max / qwen-turbo
-        api_key=api_key,
-        messages=[
-            {
-                "role": "system",
-                "content": "你是一位专业的学习笔记助手，帮助用户从转写文本中生成条理清晰、分层详细的学习笔记。"
-            },
-            {
-                "role": "user",
-                "content": f"请根据以下转写文本生成学习笔记，要求：\
-1. 保持逻辑结构（背景、目标、内容、特色、总结等），\
-2. 每个要点下展开2~3句解释，避免只有简单标题，\
-3. 使用 Markdown 格式，分层清晰，\
-4. 尽量保留细节和举例。\
-\n\n原始转写文本：\n{transcript}"
-            }
-        ]
+    # 调用 Qwen 模型（长文本走 map-reduce）；失败/审核未通过时抛出 SummaryFailed，不写入总结缓存
+    if estimate_tokens(transcript) <= SUMMARY_CHUNK_TOKENS:
+        summary = _call_qwen(NOTES_PROMPT.format(transcript=transcript), api_key, on_token, cancel_token)
+    else:
+        chunks = chunk_sentences(sentences or split_sentences(transcript))
+        print(f"转写文本较长，分为 {len(chunks)} 块并行总结")
+        summary = _map_reduce(chunks, api_key, on_token, cancel_token)
+    summary_cache.put(cache_key, summary)
+    return summary
+
+
+def save_summary_artifact(summary: str, on_done=None) -> bool:
+    """
+    将总结以markdown格式加入后台上传队列（OSS的data目录），不阻塞调用方
+    :param on_done: 上传成功后的回调，参数为OSS URL
+    :return: 是否已加入队列
+    """
+    timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")  # 生成时间戳
+    oss_filename = f"summary_{timestamp}.md"  # 使用.md后缀
+    return artifact_uploader.submit(
+        summary.encode('utf-8'),  # 转为字节
+        oss_filename,
+        'text/markdown',  # content-type
+        folder='data',  # 保存到OSS的data文件夹
+        on_done=on_done,
     )
 
-    # 处理结果
-    if response.status_code == HTTPStatus.OK:
-        summary = response.output["text"]
-        # 上传到OSS的data目录（markdown格式）
-        timestamp = datetime.datetime.now().strftime("%Y-%m-%d_%H-%M-%S")  # 生成时间戳
-        oss_filename = f"summary_{timestamp}.md"  # 使用.md后缀
-        url = upload_bytes_and_get_url(
-            summary.encode('utf-8'),  # 转为字节
-            oss_filename,
-            'text/markdown',  # content-type
-            folder='data'  # 保存到OSS的data文件夹
-        )
-        print(f"\n=== 总结已保存到 OSS: {url} ===")
-        return summary
-    else:
-        print("请求失败:", response)
-        # 若内容不合规，返回友好提示而非None
-        if response.code == "DataInspectionFailed":
-            return "内容审核未通过，无法生成总结，请尝试其他视频。"
-        return None
+
+def summarize_text(input_file=None, sentences=None, on_token=None):
+    """
+    读取转写文件并生成学习笔记总结（兼容旧接口），总结在后台上传到OSS的data目录（markdown格式）
+    :param input_file: 转写文本文件路径
+    :param sentences: 识别结果的句子文本列表（可选，用于按句子边界分块）
+    :param on_token: 流式回调（可选），最终笔记生成时逐段传入新增文本
+    :return: 生成的总结文本
+    """
+    if input_file is None:
+        input_file = "data/output/result.txt"
+
+    # 读取转写结果
+    with open(input_file, "r", encoding="utf-8") as f:
+        transcript = f.read()
+
+    try:
+        summary = summarize_transcript(transcript, sentences=sentences, on_token=on_token)
+    except SummaryFailed as e:
+        return e.result  # 失败返回None，审核未通过返回提示文本（均不上传）
+    if summary:
+        save_summary_artifact(summary, on_done=lambda url: print(f"\n=== 总结已保存到 OSS: {url} ==="))
+    return summary
@@ -0,0 +1,152 @@
+import hashlib  # 导入哈希库
+import os  # 文件操作
+import re  # 正则，用于规范化空白
+import threading  # 导入线程库
+import unicodedata  # Unicode规范化
+from typing import Optional  # 导入类型注解
+from app.core import metrics  # 导入指标模块
+from app.core.config import (
+    SUMMARY_CACHE_MAX_ENTRIES,
+    SUMMARY_CACHE_MAX_BYTES,
+    SUMMARY_CACHE_DIR,
+    SUMMARY_CACHE_DISK_MAX_BYTES,
+)
+from app.services.result_cache import LRUCache  # 复用LRU实现
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_transcript(transcript: str) -> str:
+    """规范化转写文本（NFKC + 合并空白），使仅有空白/全半角差异的文本得到相同的键"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", transcript)).strip()
+
+
+def summary_key(transcript: str, model: str, prompt_version: str) -> str:
+    """缓存键：sha256(规范化转写 + 模型名 + 提示词版本)"""
+    h = hashlib.sha256()
+    for part in (model, prompt_version, normalize_transcript(transcript)):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+class _DiskTier:  # 磁盘层：每个总结一个文件，超出总大小时按最近访问时间淘汰
+    def __init__(self, directory: str, max_bytes: int):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._bytes = sum(size for _, _, size in self._files())  # 当前占用（启动时扫描）
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.md")
+
+    def _files(self) -> list:  # [(访问时间, 路径, 大小)]
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(".md"):
+                st = entry.stat()
+                files.append((max(st.st_atime, st.st_mtime), entry.path, st.st_size))
+        return files
+
+    def get(self, key: str) -> Optional[str]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                value = f.read()
+        except FileNotFoundError:
+            return None
+        try:
+            os.utime(path)  # 刷新访问时间（部分文件系统不更新atime）
+        except OSError:
+            pass
+        return value
+
+    def put(self, key: str, value: str) -> None:
+        data = value.encode("utf-8")
+        if len(data) > self.max_bytes:
+            return
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)  # 原子替换，避免读到半个文件
+        with self._lock:
+            self._bytes += len(data)
+            if self._bytes > self.max_bytes:
+                self._evict_locked()
+
+    def _evict_locked(self) -> None:  # 重新扫描目录（可能有其它进程写入），删除最久未访问的文件至上限的90%
+        files = sorted(self._files())
+        total = sum(size for _, _, size in files)
+        target = self.max_bytes * 0.9
+        for _, path, size in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self._bytes = total
+
+
+class SummaryCache:
+    """
+    总结结果缓存
+    - 键为 规范化转写 + 模型名 + 提示词版本 的SHA-256；提示词修改后递增版本即可使旧结果失效
+    - 内存LRU层 + 磁盘层（多worker进程共享、重启后仍有效），磁盘命中会回填内存层
+    - 指标：summary_cache_memory_hits / summary_cache_disk_hits / summary_cache_misses
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, disk_dir: Optional[str], disk_max_bytes: int):
+        self._memory = LRUCache(max_entries, max_bytes, lambda v: len(v.encode("utf-8")))
+        self._disk = None
+        if disk_dir:
+            try:
+                self._disk = _DiskTier(disk_dir, disk_max_bytes)
+            except OSError as e:
+                print(f"[summary_cache] 磁盘缓存不可用，仅使用内存缓存: {e}")
+
+    def get(self, key: str) -> Optional[str]:  # 查找总结，未命中返回None
+        value = self._memory.get(key)
+        if value is not None:
+            metrics.inc("summary_cache_memory_hits")
+            return value
+        if self._disk is not None:
+            try:
+                value = self._disk.get(key)
+            except OSError as e:
+                print(f"[summary_cache] 读取磁盘缓存失败: {e}")
+                value = None
+            if value is not None:
+                metrics.inc("summary_cache_disk_hits")
+                self._memory.put(key, value)
+                return value
+        metrics.inc("summary_cache_misses")
+        return None
+
+    def put(self, key: str, value: str) -> None:  # 写入两层缓存
+        if not value:
+            return
+        self._memory.put(key, value)
+        if self._disk is not None:
+            try:
+                self._disk.put(key, value)
+            except OSError as e:
+                print(f"[summary_cache] 写入磁盘缓存失败: {e}")
+
+    def stats(self) -> dict:
+        stats = {"memory": self._memory.stats()}
+        if self._disk is not None:
+            stats["disk_bytes"] = self._disk._bytes
+        return stats
+
+
+# 全局总结缓存实例
+summary_cache = SummaryCache(
+    SUMMARY_CACHE_MAX_ENTRIES,
+    SUMMARY_CACHE_MAX_BYTES,
+    None if SUMMARY_CACHE_DIR.lower() == "off" else SUMMARY_CACHE_DIR,
+    SUMMARY_CACHE_DISK_MAX_BYTES,
+)
@@ -0,0 +1,109 @@
+import asyncio  # 导入asyncio（订阅者在事件循环中等待，不占用线程）
+import threading  # 导入线程库
+import time  # 导入时间库
+from typing import AsyncIterator, List, Optional, Tuple  # 导入类型注解
+from app.core.config import EVENT_RETENTION_SECONDS  # 导入事件保留时长
+
+# 单条事件：(序号, 事件名, 数据)
+Event = Tuple[int, str, object]
+
+
+class _Channel:  # 单个任务的事件通道（追加式日志，支持断线续传）
+    def __init__(self):
+        self.events: List[Event] = []  # 已发布事件
+        self.closed_at: Optional[float] = None  # 关闭时间（任务结束）
+        self.lock = threading.Lock()
+        self.waiters = set()  # 等待中的订阅者：(事件循环, asyncio.Event)
+
+    def wake_locked(self) -> None:  # 唤醒全部订阅者（调用方持有锁；发布方在工作线程中，需切换到订阅者所在的事件循环）
+        for loop, event in self.waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:  # 事件循环已关闭
+                pass
+
+
+class TaskEventHub:
+    """
+    进程内任务事件中心
+    - open/close 只由运行任务的代码调用；publish 只向已打开的通道追加事件并唤醒订阅者
+    - close 标记任务结束，EVENT_RETENTION_SECONDS 后回收
+    - subscribe 是异步生成器：从 last_id 之后开始逐条返回事件，超时无事件时返回 None（用于心跳）；
+      等待期间不占用线程，大量空闲的SSE连接不会耗尽线程池
+    - 只覆盖在本进程运行的任务；其它进程的任务由调用方回退到任务存储
+    """
+
+    def __init__(self):
+        self._channels = {}  # task_id -> _Channel
+        self._lock = threading.Lock()
+
+    def _channel(self, task_id: str, create: bool) -> Optional[_Channel]:
+        with self._lock:
+            self._purge_locked()
+            channel = self._channels.get(task_id)
+            if channel is None and create:
+                channel = _Channel()
+                self._channels[task_id] = channel
+            return channel
+
+    def _purge_locked(self) -> None:  # 回收已结束且超过保留期的通道（调用方持有锁）
+        deadline = time.monotonic() - EVENT_RETENTION_SECONDS
+        expired = [tid for tid, ch in self._channels.items() if ch.closed_at is not None and ch.closed_at < deadline]
+        for tid in expired:
+            del self._channels[tid]
+
+    def open(self, task_id: str) -> None:  # 任务开始运行时创建通道
+        self._channel(task_id, create=True)
+
+    def has_channel(self, task_id: str) -> bool:  # 任务是否在本进程有事件通道
+        return self._channel(task_id, create=False) is not None
+
+    def publish(self, task_id: str, event: str, data) -> None:  # 发布事件（只投递到运行任务的代码已打开的通道）
+        channel = self._channel(task_id, create=False)
+        if channel is None:  # 任务不在本进程运行（或已回收）：不创建通道，避免无人关闭
+            return
+        with channel.lock:
+            channel.events.append((len(channel.events) + 1, event, data))
+            channel.wake_locked()
+
+    def close(self, task_id: str) -> None:  # 任务结束，通知订阅者
+        channel = self._channel(task_id, create=False)
+        if channel is None:
+            return
+        with channel.lock:
+            channel.closed_at = time.monotonic()
+            channel.wake_locked()
+
+    async def subscribe(self, task_id: str, last_id: int = 0, timeout: float = 15.0) -> AsyncIterator[Optional[Event]]:
+        """按序返回 last_id 之后的事件；timeout 秒内无新事件时返回 None；通道关闭且事件取尽后结束"""
+        channel = self._channel(task_id, create=False)
+        if channel is None:
+            return
+        waiter = (asyncio.get_running_loop(), asyncio.Event())
+        with channel.lock:
+            channel.waiters.add(waiter)
+        try:
+            while True:
+                with channel.lock:
+                    pending = channel.events[last_id:]
+                    closed = channel.closed_at is not None
+                    if not pending:
+                        waiter[1].clear()  # 在锁内清除：之后的发布一定会再次唤醒
+                if not pending:
+                    if closed:
+                        return
+                    try:
+                        await asyncio.wait_for(waiter[1].wait(), timeout)
+                    except asyncio.TimeoutError:
+                        yield None  # 超时无事件
+                    continue
+                for item in pending:
+                    last_id = item[0]
+                    yield item
+        finally:
+            with channel.lock:
+                channel.waiters.discard(waiter)
+
+
+# 全局事件中心实例
+task_events = TaskEventHub()
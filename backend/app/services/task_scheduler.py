@@ -0,0 +1,196 @@
+import threading  # 导入线程库
+import time  # 导入时间库，用于统计等待与耗时
+from collections import OrderedDict, deque  # 导入有序字典（轮转各通道）与双端队列（通道内FIFO）
+from contextlib import contextmanager  # 导入上下文管理器工具
+from typing import Callable, Dict, List, Optional  # 导入类型注解
+from app.core.config import (
+    TASK_WORKERS,
+    TASK_QUEUE_LIMIT,
+    STAGE_LIMIT_TRANSCODE,
+    STAGE_LIMIT_ASR,
+    STAGE_LIMIT_LLM,
+)  # 导入调度配置
+from app.core import metrics  # 导入指标模块
+
+
+class QueueFullError(Exception):  # 队列已满异常（用于背压）
+    def __init__(self, depth: int, eta_seconds: float):
+        super().__init__(f"任务队列已满（当前排队 {depth} 个）")
+        self.depth = depth  # 当前排队数量
+        self.eta_seconds = eta_seconds  # 预计可重新提交的等待秒数
+
+
+DEFAULT_LANE = "single"  # 单个提交共用的通道
+BATCH_LANE = "batch"  # 所有批量提交共用的通道（不按批次区分，避免大量小批次插队、通道数无限增长）
+
+
+class TaskScheduler:  # 固定大小的工作线程池 + 按通道轮转的队列
+    """
+    总结任务调度器
+    - 任务按通道（lane）排队：单个提交与批量提交各用一个通道；通道内FIFO，通道之间轮转取任务，
+      大批次不会让后提交的单个任务一直排在后面
+    - 固定数量的工作线程，线程数不随流量增长
+    - stage(name) 为各阶段（转码/转写等待/大模型调用）提供独立的并发上限
+    - 队列超过上限时 submit 抛出 QueueFullError，由接口层转换为429
+    """
+
+    def __init__(self, workers: int, queue_limit: int, stage_limits: Dict[str, int]):
+        self.workers = max(1, workers)  # 工作线程数（至少1个）
+        self.queue_limit = max(1, queue_limit)  # 排队上限
+        self._lanes = OrderedDict()  # 通道名 -> 任务队列，元素为 (task_id, fn, args, 入队时间)；顺序即轮转顺序
+        self._depth = 0  # 各通道排队任务总数
+        self._cond = threading.Condition()  # 队列条件变量
+        self._stage_limits = dict(stage_limits)  # 各阶段并发上限
+        self._stage_sems = {name: threading.BoundedSemaphore(max(1, n)) for name, n in stage_limits.items()}  # 各阶段信号量
+        self._stage_active = {name: 0 for name in stage_limits}  # 各阶段当前占用数
+        self._active = 0  # 正在执行的任务数
+        self._running = set()  # 正在执行的任务ID
+        self._recent_waits = deque(maxlen=50)  # 最近任务的排队等待时间（秒）
+        self._recent_runs = deque(maxlen=50)  # 最近任务的执行耗时（秒）
+        self._threads = []  # 工作线程列表
+        self._lock = threading.Lock()  # 启动与统计用锁
+
+    def start(self) -> None:  # 启动工作线程（可重复调用）
+        with self._lock:
+            if self._threads:  # 已启动则跳过
+                return
+            for i in range(self.workers):
+                t = threading.Thread(target=self._worker_loop, name=f"summary-worker-{i}", daemon=True)  # 创建守护线程
+                t.start()  # 启动线程
+                self._threads.append(t)
+
+    def submit(self, task_id: str, fn: Callable, *args, lane: str = DEFAULT_LANE) -> int:  # 提交任务，返回排队位置（从1开始）
+        return self.submit_many([(task_id, fn, args)], lane=lane)[0]
+
+    def submit_many(self, entries: List[tuple], lane: str = DEFAULT_LANE) -> List[int]:
+        """原子地提交一组 (task_id, fn, args) 到同一通道：队列容纳不下时全部拒绝（抛出 QueueFullError），返回各任务的排队位置"""
+        self.start()  # 确保线程池已启动
+        with self._cond:
+            depth = self._depth  # 当前排队数量
+            if depth + len(entries) > self.queue_limit:  # 超过上限，拒绝提交
+                raise QueueFullError(depth, self._estimate_wait(depth + len(entries)))
+            queue = self._lanes.get(lane)
+            if queue is None:  # 新通道排在轮转顺序末尾
+                queue = self._lanes[lane] = deque()
+            now = time.monotonic()
+            first = len(queue)
+            for task_id, fn, args in entries:
+                queue.append((task_id, fn, tuple(args), now))  # 入队
+            self._depth += len(entries)
+            self._cond.notify(len(entries))  # 唤醒空闲线程
+            return [self._position(lane, first + i) for i in range(len(entries))]
+
+    def _position(self, lane: str, index: int) -> int:  # 通道 lane 中第 index 个任务按轮转顺序的出队位置（调用方需持有锁）
+        # 每一轮按通道顺序各取一个：排在它前面的是各通道的前 index 个，加上本轮中位于它之前的通道各一个
+        position, before = 0, True
+        for name, queue in self._lanes.items():
+            if name == lane:
+                position += index + 1
+                before = False
+            else:
+                position += min(len(queue), index + 1 if before else index)
+        return position
+
+    def _pop(self) -> tuple:  # 从轮转顺序中的第一个通道取出队首任务，并将该通道移到末尾（调用方需持有锁）
+        lane, queue = next(iter(self._lanes.items()))
+        item = queue.popleft()
+        del self._lanes[lane]
+        if queue:
+            self._lanes[lane] = queue
+        self._depth -= 1
+        return item
+
+    def position(self, task_id: str) -> Optional[int]:  # 查询任务在队列中的位置，不在队列返回None
+        with self._cond:
+            for lane, queue in self._lanes.items():
+                for idx, item in enumerate(queue):
+                    if item[0] == task_id:
+                        return self._position(lane, idx)
+        return None
+
+    def task_ids(self) -> List[str]:  # 本调度器中排队与执行中的全部任务ID（用于任务心跳）
+        with self._cond:
+            return [item[0] for queue in self._lanes.values() for item in queue] + list(self._running)
+
+    def estimate_wait(self, position: int) -> float:  # 估算排在第position位的任务还需等待的秒数
+        with self._cond:
+            return self._estimate_wait(position)
+
+    def _estimate_wait(self, position: int) -> float:  # 同上（调用方需持有锁）
+        if not self._recent_runs:  # 尚无历史数据时无法估算
+            return 0.0
+        avg_run = sum(self._recent_runs) / len(self._recent_runs)  # 平均执行耗时
+        return round(avg_run * position / self.workers, 1)  # 按工作线程数摊分
+
+    @contextmanager
+    def stage(self, name: str, cancel_token=None):  # 阶段并发控制：with scheduler.stage("asr"): ...
+        sem = self._stage_sems.get(name)
+        if sem is None:  # 未配置上限的阶段不做限制
+            yield
+            return
+        while not sem.acquire(timeout=0.5):  # 等待阶段空位，期间响应取消
+            if cancel_token is not None:
+                cancel_token.raise_if_cancelled()
+        with self._lock:
+            self._stage_active[name] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._stage_active[name] -= 1
+            sem.release()  # 释放阶段空位
+
+    def stats(self) -> dict:  # 调度器统计信息
+        with self._cond:
+            depth = self._depth
+            oldest = min((queue[0][3] for queue in self._lanes.values()), default=None)
+            oldest_wait = time.monotonic() - oldest if oldest is not None else 0.0  # 最早入队任务已等待时间
+            avg_wait = sum(self._recent_waits) / len(self._recent_waits) if self._recent_waits else 0.0  # 平均排队时间
+            with self._lock:
+                stages = {name: {"active": self._stage_active[name], "limit": self._stage_limits[name]} for name in self._stage_limits}
+            return {
+                "queue_depth": depth,
+                "queue_limit": self.queue_limit,
+                "lanes": len(self._lanes),  # 有任务排队的通道数
+                "workers": self.workers,
+                "active_workers": self._active,
+                "avg_wait_seconds": round(avg_wait, 1),
+                "oldest_wait_seconds": round(oldest_wait, 1),
+                "stages": stages,
+            }
+
+    def _worker_loop(self) -> None:  # 工作线程主循环
+        while True:
+            with self._cond:
+                while not self._depth:  # 队列为空时等待
+                    self._cond.wait()
+                task_id, fn, args, enqueued_at = self._pop()  # 按通道轮转取出任务
+                waited = time.monotonic() - enqueued_at
+                self._recent_waits.append(waited)  # 记录排队时间
+                self._active += 1
+                self._running.add(task_id)
+            metrics.observe_stage("queue_wait", waited)
+            started = time.monotonic()
+            try:
+                fn(task_id, *args)  # 执行任务（任务内部自行处理异常与状态）
+            except Exception as e:
+                print(f"[scheduler] 任务执行异常 task_id={task_id}, err={e}")
+            finally:
+                elapsed = time.monotonic() - started
+                metrics.observe_stage("task_total", elapsed)
+                with self._cond:
+                    self._active -= 1
+                    self._running.discard(task_id)
+                    self._recent_runs.append(elapsed)  # 记录执行耗时
+
+
+# 全局调度器实例
+scheduler = TaskScheduler(
+    workers=TASK_WORKERS,
+    queue_limit=TASK_QUEUE_LIMIT,
+    stage_limits={
+        "transcode": STAGE_LIMIT_TRANSCODE,
+        "asr": STAGE_LIMIT_ASR,
+        "llm": STAGE_LIMIT_LLM,
+    },
+)
@@ -0,0 +1,361 @@
+import threading  # 导入线程库
+import time  # 导入时间库
+from datetime import datetime, timedelta  # 导入时间工具
+from typing import Callable, Iterable, Optional  # 导入类型注解
+from sqlalchemy.orm import defer  # 导入延迟加载选项（不读取大字段）
+from app.core.config import TASK_STORE_BACKEND, TASK_RESULT_TTL, TASK_PURGE_INTERVAL, TASK_STALE_SECONDS, TASK_HEARTBEAT_INTERVAL  # 导入配置
+from app.core.database import SessionLocal  # 导入会话工厂
+from app.models.task import SummaryTask  # 导入任务模型
+
+TERMINAL_STATUSES = ("done", "error", "cancelled")  # 终态集合
+TASK_FIELDS = ("status", "progress", "stage", "error", "cancelled", "summary_url", "transcript", "summary", "version", "batch_id")  # 对外暴露的任务字段
+RESULT_FIELDS = ("transcript", "summary")  # 大字段（结果）
+STALE_ERROR = "任务中断：处理该任务的服务进程已退出，请重新提交"  # reap_stale 写入的错误信息
+
+
+class TaskStore:  # 任务状态存储接口
+    """
+    任务状态存储接口
+    - create/get/update 以 dict 形式读写任务字段（见 TASK_FIELDS）
+    - get(include_results=False) 不读取转写/总结大字段
+    - 每次 update 使 version 加1；get_version 只读取版本号，用于条件请求（ETag）
+    - list_batch 按提交顺序返回同一批次的任务（不含大字段，附带 task_id）
+    - save_partial/get_partial 读写生成中的总结文本（不增加 version，不对外暴露）；进入终态时清空
+    - purge_expired 删除结束超过 ttl 秒的任务
+    - touch 为本进程排队/运行中的任务记录心跳（不增加 version）；reap_stale 把超过 stale 秒无更新也无心跳的未结束任务
+      （所在进程已退出）标记为失败，之后按 purge_expired 正常清理
+    """
+
+    def create(self, task_id: str, **fields) -> None:
+        raise NotImplementedError
+
+    def get(self, task_id: str, include_results: bool = True) -> Optional[dict]:
+        raise NotImplementedError
+
+    def update(self, task_id: str, **fields) -> None:
+        raise NotImplementedError
+
+    def get_version(self, task_id: str) -> Optional[int]:  # 任务不存在返回None
+        raise NotImplementedError
+
+    def list_batch(self, batch_id: str) -> list:
+        raise NotImplementedError
+
+    def save_partial(self, task_id: str, text: str) -> None:
+        raise NotImplementedError
+
+    def get_partial(self, task_id: str) -> Optional[str]:
+        raise NotImplementedError
+
+    def delete(self, task_id: str) -> None:
+        raise NotImplementedError
+
+    def purge_expired(self, ttl_seconds: int) -> int:
+        raise NotImplementedError
+
+    def touch(self, task_ids: Iterable[str]) -> None:
+        raise NotImplementedError
+
+    def reap_stale(self, stale_seconds: int) -> int:
+        raise NotImplementedError
+
+    def is_cancelled(self, task_id: str) -> bool:  # 检查取消标记
+        data = self.get(task_id, include_results=False)
+        return bool(data and data.get("cancelled"))
+
+
+class MemoryTaskStore(TaskStore):  # 进程内存储（仅适用于单worker部署）
+    def __init__(self):
+        self._tasks = {}  # task_id -> 任务字段
+        self._finished = {}  # task_id -> 进入终态的时间戳
+        self._touched = {}  # task_id -> 最近一次更新或心跳的时间戳
+        self._lock = threading.Lock()
+
+    def create(self, task_id: str, **fields) -> None:
+        data = {"status": "queued", "progress": 0, "stage": "queued", "error": None, "transcript": None, "summary": None, "summary_url": None, "cancelled": False, "version": 0, "batch_id": None}
+        data.update(fields)
+        with self._lock:
+            self._tasks[task_id] = data
+            self._touched[task_id] = time.time()
+            if data["status"] in TERMINAL_STATUSES:  # 创建即结束（如命中结果缓存）同样参与过期清理
+                self._finished[task_id] = time.time()
+
+    def get(self, task_id: str, include_results: bool = True) -> Optional[dict]:
+        with self._lock:
+            data = self._tasks.get(task_id)
+            if data is None:
+                return None
+            data = dict(data)  # 返回副本，避免外部修改
+        data.pop("partial_summary", None)
+        if not include_results:
+            for key in RESULT_FIELDS:
+                data.pop(key, None)
+        return data
+
+    def update(self, task_id: str, **fields) -> None:
+        with self._lock:
+            data = self._tasks.get(task_id)
+            if data is None:
+                return
+            data.update(fields)
+            data["version"] += 1
+            self._touched[task_id] = time.time()
+            if fields.get("status") in TERMINAL_STATUSES:
+                self._finished[task_id] = time.time()  # 记录结束时间
+                data.pop("partial_summary", None)
+
+    def save_partial(self, task_id: str, text: str) -> None:
+        with self._lock:
+            data = self._tasks.get(task_id)
+            if data is not None and data["status"] not in TERMINAL_STATUSES:
+                data["partial_summary"] = text
+
+    def get_partial(self, task_id: str) -> Optional[str]:
+        with self._lock:
+            data = self._tasks.get(task_id)
+            return data.get("partial_summary") if data is not None else None
+
+    def get_version(self, task_id: str) -> Optional[int]:
+        with self._lock:
+            data = self._tasks.get(task_id)
+            return data["version"] if data is not None else None
+
+    def list_batch(self, batch_id: str) -> list:
+        fields = [f for f in TASK_FIELDS if f not in RESULT_FIELDS]
+        with self._lock:
+            tasks = [(tid, data) for tid, data in self._tasks.items() if data.get("batch_id") == batch_id]
+            tasks.sort(key=lambda item: item[1].get("batch_index") or 0)
+            return [dict({f: data.get(f) for f in fields}, task_id=tid) for tid, data in tasks]
+
+    def delete(self, task_id: str) -> None:
+        with self._lock:
+            self._tasks.pop(task_id, None)
+            self._finished.pop(task_id, None)
+            self._touched.pop(task_id, None)
+
+    def purge_expired(self, ttl_seconds: int) -> int:
+        deadline = time.time() - ttl_seconds
+        with self._lock:
+            expired = [tid for tid, ts in self._finished.items() if ts < deadline]
+            for tid in expired:
+                self._tasks.pop(tid, None)
+                self._finished.pop(tid, None)
+                self._touched.pop(tid, None)
+        return len(expired)
+
+    def touch(self, task_ids: Iterable[str]) -> None:
+        now = time.time()
+        with self._lock:
+            for tid in task_ids:
+                if tid in self._tasks:
+                    self._touched[tid] = now
+
+    def reap_stale(self, stale_seconds: int) -> int:
+        deadline = time.time() - stale_seconds
+        with self._lock:
+            stale = [tid for tid, data in self._tasks.items()
+                     if data["status"] not in TERMINAL_STATUSES and self._touched.get(tid, 0) < deadline]
+        for tid in stale:
+            self.update(tid, status="error", stage="failed", error=STALE_ERROR)
+        return len(stale)
+
+
+class DatabaseTaskStore(TaskStore):  # 数据库存储（多worker进程共享，结果不常驻内存）
+    def create(self, task_id: str, **fields) -> None:
+        if fields.get("status") in TERMINAL_STATUSES:  # 创建即结束（如命中结果缓存）同样参与过期清理
+            fields.setdefault("finished_at", datetime.utcnow())
+        fields.setdefault("updated_at", datetime.utcnow())  # 与 reap_stale 的截止时间同为UTC（数据库 now() 可能是本地时间）
+        db = SessionLocal()
+        try:
+            db.add(SummaryTask(id=task_id, **fields))
+            db.commit()
+        finally:
+            db.close()
+
+    def get(self, task_id: str, include_results: bool = True) -> Optional[dict]:
+        db = SessionLocal()
+        try:
+            query = db.query(SummaryTask).options(defer(SummaryTask.partial_summary))  # 生成中的文本只由 get_partial 读取
+            if not include_results:  # 不加载大字段
+                query = query.options(defer(SummaryTask.transcript), defer(SummaryTask.summary))
+            row = query.filter(SummaryTask.id == task_id).first()
+            if row is None:
+                return None
+            fields = TASK_FIELDS if include_results else [f for f in TASK_FIELDS if f not in RESULT_FIELDS]
+            return {name: getattr(row, name) for name in fields}
+        finally:
+            db.close()
+
+    def update(self, task_id: str, **fields) -> None:
+        if fields.get("status") in TERMINAL_STATUSES:
+            fields["finished_at"] = datetime.utcnow()  # 记录结束时间
+            fields["partial_summary"] = None  # 已有最终结果，清空生成中的文本
+        fields["version"] = SummaryTask.version + 1  # 版本号在数据库中自增，多进程更新也不会丢失
+        fields["updated_at"] = datetime.utcnow()
+        db = SessionLocal()
+        try:
+            db.query(SummaryTask).filter(SummaryTask.id == task_id).update(fields, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def get_version(self, task_id: str) -> Optional[int]:
+        db = SessionLocal()
+        try:
+            row = db.query(SummaryTask.version).filter(SummaryTask.id == task_id).first()  # 只按主键读取版本号
+            return row.version if row is not None else None
+        finally:
+            db.close()
+
+    def list_batch(self, batch_id: str) -> list:
+        fields = [f for f in TASK_FIELDS if f not in RESULT_FIELDS]
+        db = SessionLocal()
+        try:
+            rows = (
+                db.query(SummaryTask.id, *[getattr(SummaryTask, f) for f in fields])  # 只查询小字段
+                .filter(SummaryTask.batch_id == batch_id)
+                .order_by(SummaryTask.batch_index)
+                .all()
+            )
+            return [dict({f: getattr(row, f) for f in fields}, task_id=row.id) for row in rows]
+        finally:
+            db.close()
+
+    def save_partial(self, task_id: str, text: str) -> None:  # 不修改 version：订阅者直接读取，不应使 /status 的ETag失效
+        db = SessionLocal()
+        try:
+            (
+                db.query(SummaryTask)
+                .filter(SummaryTask.id == task_id)
+                .filter(SummaryTask.finished_at == None)  # 已结束的任务不再写入
+                .update({"partial_summary": text}, synchronize_session=False)
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def get_partial(self, task_id: str) -> Optional[str]:
+        db = SessionLocal()
+        try:
+            row = db.query(SummaryTask.partial_summary).filter(SummaryTask.id == task_id).first()
+            return row.partial_summary if row is not None else None
+        finally:
+            db.close()
+
+    def delete(self, task_id: str) -> None:
+        db = SessionLocal()
+        try:
+            db.query(SummaryTask).filter(SummaryTask.id == task_id).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    def purge_expired(self, ttl_seconds: int) -> int:
+        deadline = datetime.utcnow() - timedelta(seconds=ttl_seconds)
+        db = SessionLocal()
+        try:
+            count = (
+                db.query(SummaryTask)
+                .filter(SummaryTask.finished_at != None)
+                .filter(SummaryTask.finished_at < deadline)
+                .delete(synchronize_session=False)
+            )
+            db.commit()
+            return count
+        finally:
+            db.close()
+
+    def touch(self, task_ids: Iterable[str]) -> None:  # 只更新 updated_at，不修改 version
+        task_ids = list(task_ids)
+        if not task_ids:
+            return
+        db = SessionLocal()
+        try:
+            (
+                db.query(SummaryTask)
+                .filter(SummaryTask.id.in_(task_ids))
+                .filter(SummaryTask.finished_at == None)
+                .update({"updated_at": datetime.utcnow()}, synchronize_session=False)
+            )
+            db.commit()
+        finally:
+            db.close()
+
+    def reap_stale(self, stale_seconds: int) -> int:
+        now = datetime.utcnow()
+        db = SessionLocal()
+        try:
+            count = (
+                db.query(SummaryTask)
+                .filter(SummaryTask.finished_at == None)
+                .filter(SummaryTask.status.notin_(TERMINAL_STATUSES))
+                .filter(SummaryTask.updated_at < now - timedelta(seconds=stale_seconds))
+                .update({
+                    "status": "error", "stage": "failed", "error": STALE_ERROR, "finished_at": now, "updated_at": now,
+                    "partial_summary": None, "version": SummaryTask.version + 1,
+                }, synchronize_session=False)
+            )
+            db.commit()
+            return count
+        finally:
+            db.close()
+
+
+def _create_store() -> TaskStore:  # 按配置选择存储后端
+    if TASK_STORE_BACKEND == "memory":
+        return MemoryTaskStore()
+    if TASK_STORE_BACKEND == "database":
+        return DatabaseTaskStore()
+    raise ValueError(f"未知的任务存储后端：{TASK_STORE_BACKEND}")
+
+
+# 全局任务存储实例
+task_store = _create_store()
+
+_purger_started = False  # 清理线程是否已启动
+_purger_lock = threading.Lock()
+
+
+def _purge_loop() -> None:  # 定期清理过期任务
+    while True:
+        time.sleep(TASK_PURGE_INTERVAL)
+        try:
+            count = task_store.purge_expired(TASK_RESULT_TTL)
+            if count:
+                print(f"[task_store] 已清理过期任务 {count} 个")
+        except Exception as e:
+            print(f"[task_store] 清理过期任务失败：{e}")
+
+
+def start_purger() -> None:  # 启动过期任务清理线程（可重复调用）
+    global _purger_started
+    with _purger_lock:
+        if _purger_started:
+            return
+        threading.Thread(target=_purge_loop, name="task-store-purger", daemon=True).start()
+        _purger_started = True
+
+
+_reaper_started = False  # 心跳与回收线程是否已启动
+
+
+def _reap_loop(local_tasks: Callable[[], Iterable[str]]) -> None:  # 为本进程的任务记录心跳，并回收其它已退出进程遗留的任务
+    while True:
+        try:
+            task_store.touch(local_tasks())
+            count = task_store.reap_stale(TASK_STALE_SECONDS)
+            if count:
+                print(f"[task_store] 已将 {count} 个中断的任务标记为失败")
+        except Exception as e:
+            print(f"[task_store] 回收中断任务失败：{e}")
+        time.sleep(TASK_HEARTBEAT_INTERVAL)
+
+
+def start_reaper(local_tasks: Callable[[], Iterable[str]]) -> None:  # 启动心跳与回收线程（启动时立即回收一次；可重复调用）
+    """:param local_tasks: 返回本进程排队中与运行中的任务ID（如 scheduler.task_ids）"""
+    global _reaper_started
+    with _purger_lock:
+        if _reaper_started:
+            return
+        threading.Thread(target=_reap_loop, args=(local_tasks,), name="task-store-reaper", daemon=True).start()
+        _reaper_started = True
@@ -1,6 +1,11 @@
 import tempfile  # 临时文件工具
 import os  # 文件操作
+import threading  # 线程库，用于管道读写
+import time  # 时间库，统计等待ffmpeg输出的耗时
 import ffmpeg  # ffmpeg-python封装
+from typing import NamedTuple, Optional  # 导入类型注解
+from app.core import metrics  # 导入指标模块
+from app.core.config import FFMPEG_THREADS, TRANSCODE_CHUNK_SIZE, TRANSCODE_PROFILE, TRANSCODE_COPY_MAX_BITRATE  # 导入转码配置
 
 VIDEO_EXTS = {".mp4", ".mov", ".avi", ".mkv", ".webm"}  # 常见视频扩展名
 AUDIO_EXTS = {".mp3", ".wav", ".flac", ".m4a", ".aac", ".ogg"}  # 常见音频扩展名
@@ -11,31 +16,291 @@ def is_video_filename(filename: str) -> bool:  # 判断是否为视频文件
     return ext in VIDEO_EXTS  # 返回是否属于视频扩展
 
 
-def to_mp3_bytes(file_bytes: bytes, src_filename: str) -> bytes:  # 将任意音视频转为mp3字节
-    # 将输入字节写入临时源文件
-    with tempfile.NamedTemporaryFile(delete=False) as f_src:  # 创建临时源文件
+class TranscodeStream:  # ffmpeg标准输出的只读文件对象
+    """
+    ffmpeg 转码输出流
+    - read(size) / 迭代 直接读取 ffmpeg stdout，不落盘、不整体驻留内存
+    - 读到结尾时校验退出码，失败抛出 RuntimeError（附带 ffmpeg 错误输出）
+    - close() 会结束仍在运行的 ffmpeg 进程
+    """
+
+    def __init__(self, process, stdin_bytes: Optional[bytes] = None, chunk_size: int = TRANSCODE_CHUNK_SIZE, cancel_token=None):
+        self._proc = process  # ffmpeg子进程
+        self._cancel_token = cancel_token  # 取消令牌（取消时立即结束ffmpeg进程）
+        self._unregister = cancel_token.on_cancel(self.kill) if cancel_token is not None else None
+        self._chunk_size = chunk_size  # 迭代读取块大小
+        self._stderr = []  # ffmpeg错误输出
+        self._finished = False  # 是否已读到结尾
+        self.bytes_read = 0  # 已输出字节数
+        self.read_seconds = 0.0  # 等待ffmpeg输出的累计耗时（即转码耗时，其余为下游消费耗时）
+        # 持续读取stderr，避免管道写满导致ffmpeg阻塞
+        self._stderr_thread = threading.Thread(target=self._drain_stderr, daemon=True)
+        self._stderr_thread.start()
+        # 以标准输入方式喂入源数据
+        self._feeder = None
+        if stdin_bytes is not None:
+            self._feeder = threading.Thread(target=self._feed_stdin, args=(stdin_bytes,), daemon=True)
+            self._feeder.start()
+
+    def _drain_stderr(self) -> None:
+        for line in iter(self._proc.stderr.readline, b""):
+            if len(self._stderr) < 50:  # 只保留前若干行
+                self._stderr.append(line.decode("utf-8", "ignore").rstrip())
+
+    def _feed_stdin(self, data: bytes) -> None:
+        try:
+            view = memoryview(data)
+            for offset in range(0, len(view), self._chunk_size):
+                self._proc.stdin.write(view[offset:offset + self._chunk_size])
+        except (BrokenPipeError, ValueError):  # ffmpeg提前退出或流已关闭
+            pass
+        finally:
+            try:
+                self._proc.stdin.close()
+            except Exception:
+                pass
+
+    def read(self, size: int = -1) -> bytes:  # 读取转码后的字节
+        if self._finished:
+            return b""
+        started = time.monotonic()
+        data = self._proc.stdout.read(size if size and size > 0 else -1)
+        self.read_seconds += time.monotonic() - started
+        if not data or size is None or size < 0:
+            self._finish()
+        self.bytes_read += len(data)
+        return data
+
+    def _finish(self) -> None:  # 读到结尾：等待进程退出并校验结果
+        self._finished = True
+        code = self._proc.wait()
+        self._stderr_thread.join(timeout=1)
+        if self._cancel_token is not None:
+            self._cancel_token.raise_if_cancelled()  # 进程因取消被结束
+        if code != 0:
+            detail = "; ".join(self._stderr[-5:]) or f"exit code {code}"
+            raise RuntimeError(f"ffmpeg转码失败：{detail}")
+
+    def __iter__(self):  # 按块迭代，供OSS上传直接消费
+        while True:
+            if self._cancel_token is not None:
+                self._cancel_token.raise_if_cancelled()  # 每块检查取消（含跨进程标记）
+            chunk = self.read(self._chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+    def kill(self) -> None:  # 结束ffmpeg进程（可在其它线程调用，读取方随后读到结尾）
+        if self._proc.poll() is None:
+            self._proc.kill()
+
+    def close(self) -> None:  # 结束ffmpeg进程并释放管道
+        if self._unregister is not None:
+            self._unregister()
+            self._unregister = None
+        if self._proc.poll() is None:
+            self._proc.kill()
+            self._proc.wait()
+        for pipe in (self._proc.stdout, self._proc.stderr, self._proc.stdin):
+            try:
+                if pipe:
+                    pipe.close()
+            except Exception:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+# 编码配置：均为16000Hz mp3（阿里云录音文件识别推荐采样率）
+PROFILES = {
+    "standard": dict(acodec='libmp3lame', ar='16000', audio_bitrate='128k'),  # 原有配置，保留声道
+    "speech": dict(acodec='libmp3lame', ar='16000', ac=1, audio_bitrate='48k'),  # 单声道语音
+    "compact": dict(acodec='libmp3lame', ar='16000', ac=1, audio_bitrate='24k'),  # 单声道低码率，体积最小
+}
+PROFILE_BITRATES = {"standard": 128000, "speech": 48000, "compact": 24000}  # 各配置码率（bps），用于由字节数估算时长
+
+ASR_CODECS = {"mp3", "aac", "flac", "pcm_s16le", "vorbis", "amr_nb", "wmav2"}  # 识别服务可直接读取的音频编码
+ASR_SAMPLE_RATES = {8000, 16000}  # 识别服务支持的采样率
+# 复制音轨时的输出封装：编码 -> (ffmpeg格式, 扩展名, Content-Type)
+COPY_FORMATS = {
+    "mp3": ("mp3", ".mp3", "audio/mpeg"),
+    "aac": ("adts", ".aac", "audio/aac"),
+    "flac": ("flac", ".flac", "audio/flac"),
+}
+CONTENT_TYPES = {".mp3": "audio/mpeg", ".wav": "audio/wav", ".flac": "audio/flac", ".m4a": "audio/mp4", ".aac": "audio/aac", ".ogg": "audio/ogg"}
+
+
+class MediaInfo(NamedTuple):  # ffprobe探测结果（只保留规划所需字段）
+    duration: Optional[float]  # 时长（秒）
+    has_video: bool  # 是否包含视频流（封面图除外）
+    audio_codec: Optional[str]  # 第一个音频流编码
+    sample_rate: Optional[int]  # 采样率
+    bit_rate: Optional[int]  # 音频码率（bps）
+    audio_streams: int  # 音频流数量
+
+
+class TranscodePlan(NamedTuple):  # 转码方案
+    action: str  # passthrough（原文件直传）/ copy（复制音轨）/ encode（重新编码）
+    profile: Optional[str]  # encode 使用的配置
+    container: Optional[str]  # ffmpeg输出格式（passthrough 为None）
+    ext: str  # 输出扩展名
+    content_type: str  # 输出Content-Type
+    duration: Optional[float]  # 源时长（秒）
+    reason: str  # 选择原因（日志）
+
+
+def _to_float(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_int(value) -> Optional[int]:
+    number = _to_float(value)
+    return int(number) if number is not None else None
+
+
+def probe_media(src_path: str) -> Optional[MediaInfo]:
+    """用 ffprobe 探测源文件，失败（含未安装 ffprobe）返回None，由 plan_transcode 回退为完整编码"""
+    try:
+        info = ffmpeg.probe(src_path)
+    except ffmpeg.Error:
+        return None
+    except OSError as e:  # ffprobe 不在 PATH 中等
+        print(f"[transcode] ffprobe 不可用，按完整编码处理：{e}")
+        return None
+    streams = info.get("streams") or []
+    audio = [st for st in streams if st.get("codec_type") == "audio"]
+    video = [st for st in streams if st.get("codec_type") == "video" and not (st.get("disposition") or {}).get("attached_pic")]
+    first = audio[0] if audio else {}
+    fmt = info.get("format") or {}
+    return MediaInfo(
+        duration=_to_float(fmt.get("duration")) or None,
+        has_video=bool(video),
+        audio_codec=first.get("codec_name"),
+        sample_rate=_to_int(first.get("sample_rate")),
+        bit_rate=_to_int(first.get("bit_rate")) or (None if video else _to_int(fmt.get("bit_rate"))),
+        audio_streams=len(audio),
+    )
+
+
+def plan_transcode(media: Optional[MediaInfo], filename: str, profile: str = TRANSCODE_PROFILE) -> TranscodePlan:
+    """
+    选择代价最小的处理方式
+    - passthrough：音频文件本身编码、采样率、码率均符合识别要求，直接上传原文件
+    - copy：视频（或不支持的封装）中的音轨符合要求，只复制音轨、不重新编码
+    - encode：其它情况按 profile 重新编码为mp3
+    """
+    if profile not in PROFILES:
+        raise ValueError(f"未知的转码配置：{profile}")
+    encode = TranscodePlan("encode", profile, "mp3", ".mp3", "audio/mpeg", media.duration if media else None, "")
+    if media is None:
+        return encode._replace(reason="探测失败")
+    if media.audio_streams == 0:
+        raise RuntimeError("文件中没有音频流")
+    compliant = (
+        media.audio_codec in ASR_CODECS
+        and media.sample_rate in ASR_SAMPLE_RATES
+        and media.bit_rate is not None
+        and media.bit_rate <= TRANSCODE_COPY_MAX_BITRATE
+    )
+    if not compliant:
+        return encode._replace(reason=f"音频不符合要求（{media.audio_codec}, {media.sample_rate}Hz, {media.bit_rate}bps）")
+    ext = os.path.splitext(filename or "")[1].lower()
+    if not media.has_video and media.audio_streams == 1 and ext in AUDIO_EXTS and ext in CONTENT_TYPES:
+        return TranscodePlan("passthrough", None, None, ext, CONTENT_TYPES[ext], media.duration, "源音频已符合要求")
+    if media.audio_codec in COPY_FORMATS:
+        container, copy_ext, content_type = COPY_FORMATS[media.audio_codec]
+        return TranscodePlan("copy", None, container, copy_ext, content_type, media.duration, "复制音轨")
+    return encode._replace(reason=f"音轨编码 {media.audio_codec} 无法单独封装")
+
+
+def estimate_duration(plan: TranscodePlan, encoded_bytes: int) -> Optional[float]:
+    """源时长未知时，由重新编码后的字节数按配置码率估算"""
+    if plan.duration:
+        return plan.duration
+    if plan.action == "encode" and encoded_bytes:
+        return encoded_bytes * 8 / PROFILE_BITRATES[plan.profile]
+    return None
+
+
+def report_plan(plan: TranscodePlan, source_bytes: int, encoded_bytes: int, seconds: float) -> None:
+    """记录各方案的输出字节数与耗时（/metrics：transcode_<action>_count / _bytes / _source_bytes / _seconds）"""
+    name = plan.action if plan.action != "encode" else f"encode_{plan.profile}"
+    metrics.inc(f"transcode_{name}_count")
+    metrics.inc(f"transcode_{name}_bytes", encoded_bytes)
+    metrics.inc(f"transcode_{name}_source_bytes", source_bytes)
+    metrics.inc(f"transcode_{name}_seconds", seconds)
+    ratio = encoded_bytes / source_bytes if source_bytes else 0
+    print(f"[transcode] {name}: {source_bytes / 1e6:.1f}MB -> {encoded_bytes / 1e6:.1f}MB ({ratio:.0%}), {seconds:.1f}s, {plan.reason}")
+
+
+def _open_ffmpeg_stream(src_path: Optional[str], file_bytes: Optional[bytes], output_kwargs: dict, threads: int, cancel_token, start: Optional[float], duration: Optional[float]) -> TranscodeStream:
+    if (src_path is None) == (file_bytes is None):
+        raise ValueError("src_path 与 file_bytes 必须且只能提供一个")
+    output_kwargs = dict(output_kwargs)
+    if threads and threads > 0:
+        output_kwargs["threads"] = threads  # 限制ffmpeg线程数
+    input_kwargs = {}
+    if start:
+        input_kwargs["ss"] = start  # 输入端定位，快速跳转
+    if duration:
+        input_kwargs["t"] = duration
+    process = (
+        ffmpeg
+        .input(src_path if src_path is not None else 'pipe:', **input_kwargs)
+        .output('pipe:', **output_kwargs)
+        .global_args('-loglevel', 'error')
+        .run_async(pipe_stdin=file_bytes is not None, pipe_stdout=True, pipe_stderr=True)
+    )  # 启动转码进程
+    return TranscodeStream(process, stdin_bytes=file_bytes, cancel_token=cancel_token)
+
+
+def open_mp3_stream(src_path: Optional[str] = None, file_bytes: Optional[bytes] = None, threads: int = FFMPEG_THREADS, cancel_token=None, start: Optional[float] = None, duration: Optional[float] = None, profile: str = TRANSCODE_PROFILE) -> TranscodeStream:  # 启动ffmpeg并返回mp3输出流
+    """
+    转码为mp3（16000Hz，码率见 PROFILES，默认使用 TRANSCODE_PROFILE），输出经管道流式返回
+    :param src_path: 源文件路径（推荐，容器格式可随机读取）
+    :param file_bytes: 源文件字节，经stdin喂给ffmpeg（部分mp4/mov需随机读取，可能失败）
+    :param threads: ffmpeg线程数，0表示自动
+    :param cancel_token: 取消令牌，取消时结束ffmpeg进程并抛出 TaskCancelled
+    :param start: 起始秒数（可选，只转码其中一段）
+    :param duration: 转码时长秒数（可选）
+    :param profile: 编码配置（standard / speech / compact）
+    """
+    output_kwargs = dict(format='mp3', vn=None, **PROFILES[profile])
+    return _open_ffmpeg_stream(src_path, file_bytes, output_kwargs, threads, cancel_token, start, duration)
+
+
+def open_plan_stream(src_path: str, plan: TranscodePlan, threads: int = FFMPEG_THREADS, cancel_token=None) -> TranscodeStream:
+    """按转码方案启动ffmpeg：copy 只复制音轨，encode 按配置重新编码（passthrough 无需ffmpeg）"""
+    if plan.action == "copy":
+        output_kwargs = dict(format=plan.container, acodec='copy', vn=None, sn=None, dn=None)
+        return _open_ffmpeg_stream(src_path, None, output_kwargs, threads, cancel_token, None, None)
+    if plan.action == "encode":
+        return open_mp3_stream(src_path=src_path, threads=threads, cancel_token=cancel_token, profile=plan.profile)
+    raise ValueError(f"方案 {plan.action} 不需要转码")
+
+
+def file_to_mp3_bytes(src_path: str, profile: str = TRANSCODE_PROFILE) -> bytes:  # 将磁盘上的音视频文件转为mp3字节（源文件由调用方管理）
+    with open_mp3_stream(src_path=src_path, profile=profile) as stream:
+        return stream.read()  # 一次性读取全部输出
+
+
+def to_mp3_bytes(file_bytes: bytes, src_filename: str, profile: str = TRANSCODE_PROFILE) -> bytes:  # 将任意音视频字节转为mp3字节
+    # 将输入字节写入临时源文件（mp4等容器需随机读取，不能直接走stdin）
+    ext = os.path.splitext(src_filename or "")[1].lower()  # 保留扩展名，便于ffmpeg识别格式
+    with tempfile.NamedTemporaryFile(delete=False, suffix=ext) as f_src:  # 创建临时源文件
         f_src.write(file_bytes)  # 写入字节
         src_path = f_src.name  # 记录路径
-    # 目标mp3临时文件
-    dst_fd, dst_path = tempfile.mkstemp(suffix=".mp3")  # 创建目标文件
-    os.close(dst_fd)  # 关闭多余fd
     try:
-        # 使用ffmpeg转为mp3，采样率16000Hz（阿里云推荐），码率128k
-        (
-            ffmpeg
-            .input(src_path)
-            .output(dst_path, acodec='libmp3lame', ar='16000', audio_bitrate='128k', vn=None)
-            .overwrite_output()
-            .run(quiet=True)
-        )  # 执行转码
-        with open(dst_path, 'rb') as f:  # 读取转码结果
-            return f.read()  # 返回字节
+        return file_to_mp3_bytes(src_path, profile)  # 按路径转码
     finally:
         try:
             os.remove(src_path)  # 删除源文件
         except Exception:
             pass
-        try:
-            os.remove(dst_path)  # 删除目标文件
-        except Exception:
-            pass
@@ -0,0 +1,245 @@
+import os  # 导入os库
+import tempfile  # 临时文件工具
+import hashlib  # 哈希库，边写盘边计算内容摘要
+import threading  # 导入线程库
+import time  # 导入时间库
+from typing import AsyncIterator, BinaryIO, Dict, List, NamedTuple, Optional, Tuple  # 导入类型注解
+from python_multipart.multipart import MultipartParser, parse_options_header  # 导入流式multipart解析器
+from starlette.concurrency import run_in_threadpool  # 导入线程池执行工具（写盘不阻塞事件循环）
+from app.core.config import UPLOAD_MAX_BYTES, UPLOAD_CHUNK_SIZE, UPLOAD_SPOOL_DIR, TASK_STALE_SECONDS, TASK_HEARTBEAT_INTERVAL  # 导入上传配置
+
+MAX_FIELD_BYTES = 64 * 1024  # 普通表单字段（如OSS对象名）的大小上限
+MAX_FIELDS = 1000  # 普通表单字段数量上限
+SPOOL_PREFIX = "summary-upload-"  # 暂存文件名前缀（清理时只处理本服务创建的文件）
+
+_live = set()  # 本进程仍在使用的暂存文件（定期刷新修改时间，不会被清理）
+_live_lock = threading.Lock()
+
+
+class UploadTooLargeError(Exception):  # 上传文件超过大小上限
+    def __init__(self, max_bytes: int):
+        super().__init__(f"上传文件超过大小上限（{max_bytes // (1024 * 1024)}MB）")
+        self.max_bytes = max_bytes  # 大小上限
+
+
+class SpooledFile(NamedTuple):  # 已写入暂存文件的上传
+    path: str  # 暂存文件路径
+    size: int  # 文件字节数
+    digest: str  # 内容SHA-256十六进制摘要
+    filename: str  # 原始文件名
+
+
+class _SpoolWriter:  # 单个暂存文件：边写入边计算SHA-256，超过上限立即失败
+    def __init__(self, filename: Optional[str], max_bytes: int):
+        ext = os.path.splitext(filename or "")[1].lower()  # 保留扩展名，便于ffmpeg识别格式
+        fd, self.path = tempfile.mkstemp(suffix=ext, prefix=SPOOL_PREFIX, dir=UPLOAD_SPOOL_DIR)  # 创建暂存文件
+        with _live_lock:
+            _live.add(self.path)
+        self.filename = filename or ""
+        self.size = 0  # 已写入字节数
+        self._max_bytes = max_bytes
+        self._digest = hashlib.sha256()  # 流式计算内容摘要（用于结果缓存）
+        self._out = os.fdopen(fd, "wb")
+
+    def write(self, chunk: bytes) -> None:
+        self.size += len(chunk)
+        if self.size > self._max_bytes:  # 边写边校验大小上限
+            raise UploadTooLargeError(self._max_bytes)
+        self._out.write(chunk)  # 写入暂存文件
+        self._digest.update(chunk)  # 更新摘要
+
+    def finish(self) -> SpooledFile:
+        self._out.close()
+        return SpooledFile(self.path, self.size, self._digest.hexdigest(), self.filename)
+
+    def discard(self) -> None:  # 失败时关闭并删除暂存文件
+        self._out.close()
+        remove_spooled(self.path)
+
+
+def spool_upload(src: BinaryIO, filename: Optional[str] = None, max_bytes: int = UPLOAD_MAX_BYTES, chunk_size: int = UPLOAD_CHUNK_SIZE) -> Tuple[str, int, str]:  # 分块写入暂存文件
+    """
+    将数据流按固定大小分块写入磁盘暂存文件，内存占用与文件大小无关
+    :param src: 可分块 read() 的数据流（如OSS对象）
+    :param filename: 原始文件名，仅用于保留扩展名
+    :return: (暂存文件路径, 文件字节数, 内容SHA-256十六进制摘要)；超过 max_bytes 时删除暂存文件并抛出 UploadTooLargeError
+    """
+    writer = _SpoolWriter(filename, max_bytes)
+    try:
+        while True:
+            chunk = src.read(chunk_size)  # 读取一块
+            if not chunk:  # 读取完毕
+                break
+            writer.write(chunk)
+    except BaseException:
+        writer.discard()  # 失败时清理暂存文件
+        raise
+    spooled = writer.finish()
+    return spooled.path, spooled.size, spooled.digest
+
+
+async def spool_multipart(content_type: str, body: AsyncIterator[bytes], file_field: str, max_files: int, max_bytes: int = UPLOAD_MAX_BYTES, chunk_size: int = UPLOAD_CHUNK_SIZE) -> Tuple[List[SpooledFile], Dict[str, List[str]]]:
+    """
+    边接收请求体边解析 multipart/form-data
+    - 文件部分直接写入暂存文件（不经过框架的临时文件，不重复落盘），写盘在线程池中执行，每次最多 chunk_size 字节
+    - 单个文件超过 max_bytes 时立即停止接收并抛出 UploadTooLargeError，不读取剩余请求体
+    - 只接受 file_field 字段中的文件；请求格式错误或文件数超过 max_files 时抛出 ValueError；任何失败都会删除已写入的暂存文件
+    :return: (上传文件列表, {普通字段名: [值]})
+    """
+    kind, options = parse_options_header(content_type or "")
+    boundary = options.get(b"boundary")
+    if kind != b"multipart/form-data" or not boundary:
+        raise ValueError("请使用 multipart/form-data 上传")
+    files: List[SpooledFile] = []
+    fields: Dict[str, List[str]] = {}
+    state = {"header": b"", "value": b"", "disposition": b"", "name": "", "writer": None, "data": bytearray(), "count": 0}
+    buffered = []  # 本轮解析出的文件数据：(writer, bytes)；None 表示当前文件结束
+    writers = []  # 已创建的暂存文件（失败时删除）
+
+    def on_part_begin():
+        state["disposition"], state["writer"], state["data"] = b"", None, bytearray()
+
+    def on_header_field(data, start, end):
+        state["header"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        state["value"] += data[start:end]
+
+    def on_header_end():
+        if state["header"].lower() == b"content-disposition":
+            state["disposition"] = state["value"]
+        state["header"], state["value"] = b"", b""
+
+    def on_headers_finished():
+        _, params = parse_options_header(state["disposition"])
+        if b"name" not in params:
+            raise ValueError("表单字段缺少 name")
+        state["name"] = params[b"name"].decode("utf-8", "replace")
+        if b"filename" in params:
+            if state["name"] != file_field:
+                raise ValueError(f"文件须通过 {file_field} 字段上传")
+            if len(writers) >= max_files:
+                raise ValueError(f"最多上传 {max_files} 个文件")
+            state["writer"] = _SpoolWriter(params[b"filename"].decode("utf-8", "replace"), max_bytes)
+            writers.append(state["writer"])
+        else:
+            state["count"] += 1
+            if state["count"] > MAX_FIELDS:
+                raise ValueError("表单字段过多")
+
+    def on_part_data(data, start, end):
+        if state["writer"] is not None:
+            buffered.append((state["writer"], data[start:end]))
+        elif len(state["data"]) + end - start > MAX_FIELD_BYTES:
+            raise ValueError(f"表单字段 {state['name']} 过长")
+        else:
+            state["data"] += data[start:end]
+
+    def on_part_end():
+        if state["writer"] is not None:
+            buffered.append((state["writer"], None))
+        else:
+            fields.setdefault(state["name"], []).append(state["data"].decode("utf-8", "replace"))
+
+    parser = MultipartParser(boundary, {
+        "on_part_begin": on_part_begin,
+        "on_part_data": on_part_data,
+        "on_part_end": on_part_end,
+        "on_header_field": on_header_field,
+        "on_header_value": on_header_value,
+        "on_header_end": on_header_end,
+        "on_headers_finished": on_headers_finished,
+    })
+    pending = {}  # writer -> 待写入的数据（凑满 chunk_size 再写盘）
+
+    async def flush(writer, final: bool) -> None:
+        data = pending.pop(writer, b"")
+        if data:
+            await run_in_threadpool(writer.write, bytes(data))
+        if final:
+            files.append(await run_in_threadpool(writer.finish))
+
+    try:
+        async for chunk in body:
+            parser.write(chunk)
+            for writer, data in buffered:
+                if data is None:  # 文件结束
+                    await flush(writer, final=True)
+                    continue
+                pending.setdefault(writer, bytearray()).extend(data)
+                if len(pending[writer]) >= chunk_size or len(pending[writer]) + writer.size > max_bytes:
+                    await flush(writer, final=False)
+            buffered.clear()
+        parser.finalize()
+    except BaseException:
+        for writer in writers:
+            await run_in_threadpool(writer.discard)
+        raise
+    if len(files) != len(writers):  # 请求体在文件中途结束
+        for writer in writers:
+            await run_in_threadpool(writer.discard)
+        raise ValueError("上传内容不完整")
+    return files, fields
+
+
+def remove_spooled(path: Optional[str]) -> None:  # 删除暂存文件（忽略异常）
+    if not path:
+        return
+    with _live_lock:
+        _live.discard(path)
+    try:
+        os.remove(path)
+    except Exception:
+        pass
+
+
+def sweep_spooled(max_age: int = TASK_STALE_SECONDS) -> int:
+    """
+    刷新本进程暂存文件的修改时间，并删除超过 max_age 秒未刷新的暂存文件（所在进程已退出、任务已被回收），返回删除数量
+    多个进程共用暂存目录时，各进程都定期调用即可：仍在使用的文件总会被其所属进程刷新
+    """
+    now = time.time()
+    with _live_lock:
+        live = set(_live)
+    for path in live:
+        try:
+            os.utime(path, (now, now))
+        except OSError:  # 已被其它途径删除
+            with _live_lock:
+                _live.discard(path)
+    spool_dir = UPLOAD_SPOOL_DIR or tempfile.gettempdir()
+    removed = 0
+    for entry in os.scandir(spool_dir):
+        if not entry.name.startswith(SPOOL_PREFIX) or entry.path in live:
+            continue
+        try:
+            if entry.is_file() and entry.stat().st_mtime < now - max_age:
+                os.remove(entry.path)
+                removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+_sweeper_started = False  # 清理线程是否已启动
+_sweeper_lock = threading.Lock()
+
+
+def _sweep_loop() -> None:  # 定期清理已退出进程遗留的暂存文件
+    while True:
+        try:
+            count = sweep_spooled()
+            if count:
+                print(f"[upload] 已删除遗留的暂存文件 {count} 个")
+        except Exception as e:
+            print(f"[upload] 清理暂存文件失败：{e}")
+        time.sleep(TASK_HEARTBEAT_INTERVAL)
+
+
+def start_spool_sweeper() -> None:  # 启动暂存文件清理线程（启动时立即清理一次；可重复调用）
+    global _sweeper_started
+    with _sweeper_lock:
+        if _sweeper_started:
+            return
+        threading.Thread(target=_sweep_loop, name="upload-spool-sweeper", daemon=True).start()
+        _sweeper_started = True
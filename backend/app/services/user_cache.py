@@ -0,0 +1,99 @@
+"""
+已登录用户缓存
+- 令牌缓存：JWT字符串 -> 解码后的 (user_id, email)，有效期不超过令牌本身的过期时间
+- 用户缓存：user_id -> 用户+资料快照（UserSnapshot，与数据库会话无关，可跨请求共享）
+- 两者都按 USER_CACHE_TTL 过期；用户快照命中时按主键读取 users.profile_version 校验，
+  资料被修改时调用 invalidate 增加版本号，所有worker进程缓存的旧快照随即失效（不修改版本号的途径，如直接改库，最多延迟一个TTL生效）
+"""
+import time  # 导入时间库
+from datetime import date  # 导入日期类型
+from typing import NamedTuple, Optional  # 导入类型注解
+from sqlalchemy.orm import Session  # 导入会话
+from app.core import metrics  # 导入指标模块
+from app.core.http_cache import make_etag  # 导入ETag计算
+from app.core.config import USER_CACHE_TTL, USER_CACHE_MAX_ENTRIES  # 导入缓存配置
+from app.models.user import User  # 导入用户模型
+from app.models.profile import UserProfile  # 导入资料模型
+from app.services.result_cache import LRUCache  # 复用LRU实现
+
+
+class UserSnapshot(NamedTuple):  # 用户+资料的只读快照
+    id: int
+    username: str
+    email: str
+    member_type: str
+    avatar_url: Optional[str]
+    gender: Optional[str]
+    birth_date: Optional[date]
+    version: int  # 读取时的 users.profile_version
+    etag: str  # 由以上字段计算，资料变化时随之变化
+
+
+def _count(value) -> int:  # 按条目计数（LRUCache 的字节上限即条目上限）
+    return 1
+
+
+class UserCache:
+    def __init__(self, ttl: float, max_entries: int):
+        self.ttl = ttl
+        self._tokens = LRUCache(max_entries, max_entries, _count)  # token -> ((user_id, email), 过期时间)
+        self._users = LRUCache(max_entries, max_entries, _count)  # user_id -> (UserSnapshot, 过期时间)
+
+    @staticmethod
+    def _get(lru: LRUCache, key):  # 读取未过期的值
+        item = lru.get(key)
+        if item is None or item[1] <= time.monotonic():
+            return None
+        return item[0]
+
+    def get_token(self, token: str) -> Optional[tuple]:  # 返回缓存的 (user_id, email)
+        return self._get(self._tokens, token) if self.ttl > 0 else None
+
+    def put_token(self, token: str, user_id: Optional[int], email: str, exp: Optional[float] = None) -> None:
+        if self.ttl <= 0:
+            return
+        expires = time.monotonic() + self.ttl
+        if exp is not None:  # 不超过令牌自身的过期时间（exp 为Unix时间戳）
+            expires = min(expires, time.monotonic() + exp - time.time())
+        self._tokens.put(token, ((user_id, email), expires))
+
+    def get_user(self, db: Session, user_id: Optional[int], email: str) -> Optional[UserSnapshot]:
+        """读取用户快照：命中时只按主键读取版本号校验，未命中或已过期时用一次连接查询同时加载用户与资料"""
+        snapshot = self._get(self._users, user_id) if (self.ttl > 0 and user_id is not None) else None
+        if snapshot is not None:
+            row = db.query(User.profile_version).filter(User.id == user_id).first()
+            if row is not None and row.profile_version == snapshot.version:
+                metrics.inc("user_cache_hits")
+                return snapshot
+            self._users.pop(user_id)  # 其它进程已修改资料（或用户已删除）
+            metrics.inc("user_cache_stale")
+        metrics.inc("user_cache_misses")
+        query = db.query(User, UserProfile).outerjoin(UserProfile, UserProfile.user_id == User.id)
+        row = query.filter(User.id == user_id if user_id is not None else User.email == email).first()
+        if row is None:
+            return None
+        user, profile = row
+        fields = dict(
+            id=user.id,
+            username=user.username,
+            email=user.email,
+            member_type=user.member_type,
+            avatar_url=profile.avatar_url if profile else None,
+            gender=profile.gender if profile else None,
+            birth_date=profile.birth_date if profile else None,
+        )
+        snapshot = UserSnapshot(version=user.profile_version or 0, etag=make_etag("user", fields), **fields)
+        if self.ttl > 0:
+            self._users.put(user.id, (snapshot, time.monotonic() + self.ttl))
+        return snapshot
+
+    def invalidate(self, db: Session, user_id: int) -> None:  # 在修改用户或资料的事务中、提交前调用
+        db.query(User).filter(User.id == user_id).update({"profile_version": User.profile_version + 1}, synchronize_session=False)
+        self._users.pop(user_id)
+
+    def stats(self) -> dict:
+        return {"tokens": self._tokens.stats()["entries"], "users": self._users.stats()["entries"]}
+
+
+# 全局用户缓存实例
+user_cache = UserCache(USER_CACHE_TTL, USER_CACHE_MAX_ENTRIES)
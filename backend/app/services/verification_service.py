@@ -0,0 +1,57 @@
+import threading  # 导入线程库
+import time  # 导入时间库
+from datetime import datetime  # 导入时间工具
+from app.core.database import SessionLocal  # 导入会话工厂
+from app.core.config import VERIFICATION_PURGE_INTERVAL, VERIFICATION_PURGE_BATCH  # 导入清理配置
+from app.models.verification_code import VerificationCode  # 导入验证码模型
+
+
+def purge_expired_codes(batch_size: int = VERIFICATION_PURGE_BATCH) -> int:
+    """
+    分批删除已过期的验证码（已使用的验证码在5分钟有效期结束后同样被清理），返回删除行数
+    每批先按 expires_at 索引取出主键再按主键删除，单个事务只锁少量行
+    """
+    total = 0
+    while True:
+        db = SessionLocal()
+        try:
+            ids = [
+                row.id
+                for row in db.query(VerificationCode.id)
+                .filter(VerificationCode.expires_at < datetime.utcnow())
+                .limit(batch_size)
+                .all()
+            ]
+            if not ids:
+                return total
+            db.query(VerificationCode).filter(VerificationCode.id.in_(ids)).delete(synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+        total += len(ids)
+        if len(ids) < batch_size:
+            return total
+
+
+_purger_started = False  # 清理线程是否已启动
+_purger_lock = threading.Lock()
+
+
+def _purge_loop() -> None:  # 定期清理过期验证码
+    while True:
+        time.sleep(VERIFICATION_PURGE_INTERVAL)
+        try:
+            count = purge_expired_codes()
+            if count:
+                print(f"[verification] 已清理过期验证码 {count} 条")
+        except Exception as e:
+            print(f"[verification] 清理过期验证码失败：{e}")
+
+
+def start_code_purger() -> None:  # 启动过期验证码清理线程（可重复调用）
+    global _purger_started
+    with _purger_lock:
+        if _purger_started:
+            return
+        threading.Thread(target=_purge_loop, name="verification-purger", daemon=True).start()
+        _purger_started = True
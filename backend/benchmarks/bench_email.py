@@ -0,0 +1,112 @@
+"""
+发信吞吐基准：本地SMTP替身（线程式最小SMTP服务，只接收不投递）
+对比 逐封同步发送（每封新建连接）与 后台发件箱（长连接复用）的吞吐和提交延迟
+--connect-latency 模拟每次建立连接时的TLS握手与登录耗时
+用法（在 backend 目录下）：
+    python -m benchmarks.bench_email [--messages 200] [--workers 2] [--connect-latency 0.2] [--json out.json] [--baseline base.json]
+"""
+import argparse  # 导入命令行解析
+import os  # 导入os
+import socketserver  # 导入socket服务框架
+import threading  # 导入线程库
+import time  # 导入time计时
+from benchmarks.common import summarize, peak_rss_mb, print_report, add_common_args, finish
+
+
+class _SmtpSink(socketserver.StreamRequestHandler):  # 最小SMTP服务：应答命令，丢弃邮件内容
+    connect_latency = 0.0
+
+    def _reply(self, line: str) -> None:
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        time.sleep(self.connect_latency)  # 模拟TLS握手与登录
+        self.server.connections += 1
+        self._reply("220 bench-sink ESMTP")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line[:4].upper()
+            if command in (b"EHLO", b"HELO"):
+                self._reply("250 bench-sink")
+            elif command == b"DATA":
+                self._reply("354 end with <CRLF>.<CRLF>")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                self.server.messages += 1
+                self._reply("250 OK")
+            elif command == b"QUIT":
+                self._reply("221 bye")
+                return
+            else:  # MAIL / RCPT / RSET / NOOP
+                self._reply("250 OK")
+
+
+class _SinkServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+    connections = 0  # 已建立的连接数
+    messages = 0  # 已接收的邮件数
+
+
+def _start_sink(latency: float) -> _SinkServer:
+    _SmtpSink.connect_latency = latency
+    server = _SinkServer(("127.0.0.1", 0), _SmtpSink)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _timed(fn, count: int) -> tuple:  # 顺序调用 fn(i)，返回 (每次调用延迟列表, 总耗时)
+    latencies = []
+    started = time.perf_counter()
+    for i in range(count):
+        t0 = time.perf_counter()
+        fn(i)
+        latencies.append(time.perf_counter() - t0)
+    return latencies, time.perf_counter() - started
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="发信吞吐基准")
+    parser.add_argument("--messages", type=int, default=200, help="发送邮件数")
+    parser.add_argument("--workers", type=int, default=2, help="发件箱发信线程数")
+    parser.add_argument("--connect-latency", type=float, default=0.2, help="模拟建立连接的耗时（秒）")
+    add_common_args(parser)
+    args = parser.parse_args()
+
+    sink = _start_sink(args.connect_latency)
+    os.environ.update({  # 指向本地替身（必须在导入 app 之前）
+        "SMTP_HOST": "127.0.0.1",
+        "SMTP_PORT": str(sink.server_address[1]),
+        "SMTP_USE_SSL": "false",
+        "SMTP_STARTTLS": "false",
+        "SMTP_PASSWORD": "",
+        "EMAIL_WORKERS": str(args.workers),
+        "EMAIL_QUEUE_LIMIT": str(args.messages),
+    })
+    from app.services.email_service import send_email, email_outbox  # 导入发信服务
+
+    html = "<p>本次验证码为：<strong>123456</strong></p>"
+    stages = {}
+
+    latencies, wall = _timed(lambda i: send_email(f"user{i}@bench.local", "验证码", html), args.messages)
+    stages["send_inline"] = summarize(latencies, wall)
+    inline_connections = sink.connections
+
+    email_outbox.start()
+    started = time.perf_counter()
+    latencies, _ = _timed(lambda i: email_outbox.submit(f"user{i}@bench.local", "验证码", html), args.messages)
+    email_outbox.join()  # 等待全部送达
+    wall = time.perf_counter() - started
+    stages["outbox_submit"] = summarize(latencies)
+    stages["outbox_drain"] = summarize([wall], 1)
+    stages["outbox_drain"]["throughput"] = args.messages / wall
+    outbox_connections = sink.connections - inline_connections
+
+    report = {"stages": stages, "peak_rss_mb": peak_rss_mb(), "messages_received": sink.messages,
+              "connections": {"send_inline": inline_connections, "outbox": outbox_connections}}
+    print_report(f"发信基准（{args.messages} 封，建连耗时 {args.connect_latency}s，发件箱 {args.workers} 线程）", stages)
+    print(f"SMTP连接数：同步发送 {inline_connections}，发件箱 {outbox_connections}；替身共收到 {sink.messages} 封")
+    sink.shutdown()
+    finish(args, report)
@@ -0,0 +1,39 @@
+"""
+OSS客户端复用微基准
+对比"每次上传新建Bucket"（旧实现）与"复用共享Bucket+连接池"的单次上传延迟
+用法（在 backend 目录下）：python -m benchmarks.bench_oss_client [次数] [对象大小字节]
+需要可用的 OSS 配置（OSS_ENDPOINT/OSS_BUCKET 与访问密钥），Endpoint 可指向本地 OSS 兼容服务
+"""
+import sys  # 导入sys读取命令行参数
+import time  # 导入time计时
+import statistics  # 导入统计工具
+from app.services.oss_service import create_bucket, get_bucket  # 导入Bucket工厂
+
+
+def _run(label: str, bucket_factory, rounds: int, payload: bytes) -> list:  # 执行若干次上传并返回耗时（毫秒）
+    timings = []
+    for i in range(rounds):
+        started = time.perf_counter()
+        bucket = bucket_factory()
+        bucket.put_object(f"bench/oss_client_{label}_{i}.bin", payload)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def _report(label: str, timings: list) -> None:  # 打印统计结果
+    ordered = sorted(timings)
+    p95 = ordered[max(0, int(len(ordered) * 0.95) - 1)]
+    print(f"{label:<12} 平均 {statistics.mean(timings):8.1f} ms  中位数 {statistics.median(timings):8.1f} ms  p95 {p95:8.1f} ms")
+
+
+if __name__ == "__main__":
+    rounds = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    size = int(sys.argv[2]) if len(sys.argv) > 2 else 16 * 1024
+    payload = b"x" * size
+    get_bucket().put_object("bench/warmup.bin", payload)  # 预热共享连接
+    fresh = _run("fresh", lambda: create_bucket(pool_size=1), rounds, payload)  # 每次新建（新握手）
+    shared = _run("shared", get_bucket, rounds, payload)  # 复用共享Bucket
+    print(f"上传 {rounds} 次，每次 {size} 字节")
+    _report("新建Bucket", fresh)
+    _report("共享Bucket", shared)
+    print(f"单次上传平均节省 {statistics.mean(fresh) - statistics.mean(shared):.1f} ms")
@@ -0,0 +1,143 @@
+"""
+流水线各阶段微基准（使用本地模拟后端，无需阿里云/DashScope凭证）
+阶段：上传落盘、转码（需本机ffmpeg）、OSS上传、语音转写、大模型总结、调度器派发
+用法（在 backend 目录下）：
+    python -m benchmarks.bench_stages [--iterations 20] [--concurrency 4] [--size-mb 8] [--json out.json] [--baseline base.json]
+模拟耗时与失败率通过 FAKE_* 环境变量调整（见 app/core/config.py）
+"""
+from benchmarks.common import use_fakes, summarize, peak_rss_mb, print_report, add_common_args, finish
+
+use_fakes()  # 必须在导入 app 之前
+
+import argparse  # 导入命令行解析
+import io  # 导入内存流
+import os  # 导入os
+import shutil  # 导入shutil，检测ffmpeg
+import subprocess  # 导入子进程，生成测试音频
+import tempfile  # 导入临时文件
+import threading  # 导入线程库
+import time  # 导入time计时
+from concurrent.futures import ThreadPoolExecutor  # 导入线程池
+from app.services.upload_service import spool_upload, remove_spooled  # 导入上传落盘
+from app.services.oss_service import upload_stream_and_get_url  # 导入OSS上传
+from app.services.recognize_service import get_manager  # 导入转写任务管理器
+from app.services.summarize_service import summarize_transcript, SummaryFailed  # 导入总结
+from app.services.task_scheduler import TaskScheduler  # 导入调度器
+from app.services.transcode_service import probe_media, plan_transcode, open_plan_stream  # 导入转码规划
+
+
+def _run(fn, iterations: int, concurrency: int) -> dict:  # 并发执行 iterations 次 fn(i)，返回延迟统计
+    latencies = []
+    lock = threading.Lock()
+
+    def one(i):
+        started = time.perf_counter()
+        fn(i)
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(iterations)))
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def bench_spool(payload: bytes, args) -> dict:
+    def run(i):
+        path, _, _ = spool_upload(io.BytesIO(payload), "bench.mp4")
+        remove_spooled(path)
+    return _run(run, args.iterations, args.concurrency)
+
+
+def bench_oss(payload: bytes, args) -> dict:
+    chunk = 256 * 1024
+
+    def run(i):
+        chunks = (payload[o:o + chunk] for o in range(0, len(payload), chunk))
+        upload_stream_and_get_url(chunks, "bench.mp3", "audio/mpeg", folder="bench", on_part=lambda *a: None)
+    return _run(run, args.iterations, args.concurrency)
+
+
+def bench_transcode(args) -> dict:
+    if not shutil.which("ffmpeg"):
+        print("未找到ffmpeg，跳过转码阶段")
+        return None
+    src = os.path.join(tempfile.gettempdir(), f"bench_tone_{args.audio_seconds}.wav")
+    if not os.path.exists(src):  # 生成测试音频（44.1kHz 正弦波，需重新编码）
+        subprocess.run(["ffmpeg", "-y", "-loglevel", "error", "-f", "lavfi", "-i", f"sine=frequency=440:duration={args.audio_seconds}", "-ar", "44100", src], check=True)
+
+    def run(i):
+        plan = plan_transcode(probe_media(src), "bench.wav")
+        with open_plan_stream(src, plan) as stream:
+            for _ in stream:
+                pass
+    return _run(run, args.iterations, args.concurrency)
+
+
+def bench_asr(args) -> dict:
+    manager = get_manager("", "", "")
+
+    def run(i):
+        manager.submit(f"https://bench/{i}.mp3", args.audio_seconds).result()
+    return _run(run, args.iterations, args.concurrency)
+
+
+def bench_llm(args) -> dict:
+    sentence = "这是一句用于基准测试的模拟转写文本。"
+
+    def run(i):
+        transcript = f"第{i}次：" + sentence * (args.transcript_chars // len(sentence))  # 每次内容不同，避免命中总结缓存
+        try:
+            summarize_transcript(transcript)
+        except SummaryFailed:  # 模拟失败（FAKE_LLM_FAILURE_RATE）同样计入耗时
+            pass
+    return _run(run, args.iterations, args.concurrency)
+
+
+def bench_scheduler(args) -> dict:  # 提交到开始执行的派发延迟
+    count = args.iterations * 50
+    scheduler = TaskScheduler(workers=args.concurrency, queue_limit=count, stage_limits={})
+    latencies, done = [], threading.Semaphore(0)
+
+    def task(task_id, submitted):
+        latencies.append(time.perf_counter() - submitted)
+        done.release()
+
+    started = time.perf_counter()
+    for i in range(count):
+        scheduler.submit(f"bench-{i}", task, time.perf_counter())
+    for _ in range(count):
+        done.acquire()
+    return summarize(latencies, time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="流水线各阶段微基准")
+    parser.add_argument("--iterations", type=int, default=20, help="每个阶段执行次数")
+    parser.add_argument("--concurrency", type=int, default=4, help="并发数")
+    parser.add_argument("--size-mb", type=float, default=8, help="上传/OSS阶段的数据大小（MB）")
+    parser.add_argument("--audio-seconds", type=int, default=60, help="转码/转写阶段的音频时长（秒）")
+    parser.add_argument("--transcript-chars", type=int, default=20000, help="总结阶段的转写文本长度（字）")
+    parser.add_argument("--stages", default="spool,transcode,oss,asr,llm,scheduler", help="要运行的阶段（逗号分隔）")
+    add_common_args(parser)
+    args = parser.parse_args()
+
+    payload = os.urandom(int(args.size_mb * 1024 * 1024))
+    runners = {
+        "spool": lambda: bench_spool(payload, args),
+        "transcode": lambda: bench_transcode(args),
+        "oss": lambda: bench_oss(payload, args),
+        "asr": lambda: bench_asr(args),
+        "llm": lambda: bench_llm(args),
+        "scheduler": lambda: bench_scheduler(args),
+    }
+    stages = {}
+    for name in args.stages.split(","):
+        result = runners[name.strip()]()
+        if result is not None:
+            stages[name.strip()] = result
+    report = {"stages": stages, "peak_rss_mb": peak_rss_mb()}
+    print_report(f"阶段微基准（并发 {args.concurrency}，每阶段 {args.iterations} 次）", stages)
+    print(f"峰值RSS：{report['peak_rss_mb']:.1f} MB")
+    finish(args, report)
@@ -0,0 +1,42 @@
+"""
+转码方案对比
+对同一个音视频文件输出规划结果，并分别测量 复制音轨 与 各编码配置 的输出字节数和耗时
+用法（在 backend 目录下）：python -m benchmarks.bench_transcode <文件路径>
+需要本机安装 ffmpeg/ffprobe，不访问 OSS
+"""
+import os  # 导入文件操作
+import sys  # 导入sys读取命令行参数
+import time  # 导入time计时
+from app.services.transcode_service import PROFILES, COPY_FORMATS, probe_media, plan_transcode, open_plan_stream  # 导入转码规划
+
+
+def _measure(src_path: str, plan) -> tuple:  # 执行一次转码，返回 (输出字节数, 耗时秒)
+    started = time.perf_counter()
+    size = 0
+    with open_plan_stream(src_path, plan) as stream:
+        for chunk in stream:
+            size += len(chunk)
+    return size, time.perf_counter() - started
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("用法：python -m benchmarks.bench_transcode <文件路径>")
+        sys.exit(1)
+    src_path = sys.argv[1]
+    source_bytes = os.path.getsize(src_path)
+    media = probe_media(src_path)
+    plan = plan_transcode(media, os.path.basename(src_path))
+    print(f"源文件 {source_bytes / 1e6:.2f} MB，探测结果：{media}")
+    print(f"规划结果：{plan.action}（{plan.reason}）")
+    options = []
+    if media is not None and media.audio_codec in COPY_FORMATS:
+        container, ext, content_type = COPY_FORMATS[media.audio_codec]
+        options.append(("copy", plan._replace(action="copy", profile=None, container=container, ext=ext, content_type=content_type)))
+    for profile in PROFILES:
+        options.append((f"encode_{profile}", plan._replace(action="encode", profile=profile, container="mp3", ext=".mp3", content_type="audio/mpeg")))
+    print(f"{'方案':<18}{'输出MB':>10}{'占源文件':>10}{'耗时s':>10}")
+    print(f"{'passthrough':<18}{source_bytes / 1e6:>10.2f}{1:>10.0%}{0:>10.2f}")
+    for name, option in options:
+        size, seconds = _measure(src_path, option)
+        print(f"{name:<18}{size / 1e6:>10.2f}{size / source_bytes:>10.0%}{seconds:>10.2f}")
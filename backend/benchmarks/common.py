@@ -0,0 +1,109 @@
+"""
+基准测试公共工具：使用本地模拟后端、延迟分位数统计、峰值内存、结果对比
+"""
+import json  # 导入json
+import os  # 导入os
+import resource  # 导入资源统计（峰值RSS）
+import sys  # 导入sys
+
+# 离线运行所需的环境变量（必须在导入 app 之前设置，已设置的值优先）
+FAKE_ENV = {
+    "OSS_BACKEND": "fake",
+    "ASR_BACKEND": "fake",
+    "LLM_BACKEND": "fake",
+    "TASK_STORE_BACKEND": "memory",
+    "SUMMARY_CACHE_DIR": "off",
+    "DATABASE_URL": "sqlite:///./benchmark.db",
+}
+
+
+def use_fakes() -> None:  # 启用本地模拟后端
+    for key, value in FAKE_ENV.items():
+        os.environ.setdefault(key, value)
+
+
+def percentile(values: list, p: float) -> float:  # 线性插值分位数
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * p / 100
+    lo, hi = int(k), min(int(k) + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (k - lo)
+
+
+def summarize(values: list, wall_seconds: float = None) -> dict:  # 延迟统计（秒）
+    result = {
+        "count": len(values),
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else 0.0,
+    }
+    if wall_seconds:
+        result["throughput"] = len(values) / wall_seconds  # 每秒完成数
+    return result
+
+
+def peak_rss_mb() -> float:  # 当前进程峰值RSS（MB，Linux下 ru_maxrss 单位为KB）
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+
+
+def process_peak_rss_mb(pid: int) -> float:  # 其它进程峰值RSS（读取 /proc，仅Linux）
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return 0.0
+
+
+def print_report(title: str, stages: dict) -> None:  # 打印各阶段统计表（毫秒）
+    print(f"\n== {title} ==")
+    print(f"{'阶段':<16}{'次数':>8}{'吞吐/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for name, s in stages.items():
+        throughput = f"{s['throughput']:.1f}" if "throughput" in s else "-"
+        print(f"{name:<16}{s['count']:>8}{throughput:>10}{s['p50'] * 1000:>10.1f}{s['p95'] * 1000:>10.1f}{s['p99'] * 1000:>10.1f}{s['max'] * 1000:>10.1f}")
+
+
+def write_json(path: str, report: dict) -> None:  # 保存结果（供CI对比）
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+def check_regression(report: dict, baseline_path: str, tolerance: float) -> list:
+    """
+    与基线结果对比：任一阶段 p95 超过基线 (1 + tolerance) 倍，或峰值RSS超过基线 (1 + tolerance) 倍时视为回退
+    :return: 回退描述列表（为空表示通过）
+    """
+    with open(baseline_path, encoding="utf-8") as f:
+        baseline = json.load(f)
+    problems = []
+    for name, stats in report.get("stages", {}).items():
+        base = baseline.get("stages", {}).get(name)
+        if base and base["p95"] > 0 and stats["p95"] > base["p95"] * (1 + tolerance):
+            problems.append(f"{name} p95 {stats['p95'] * 1000:.1f}ms > 基线 {base['p95'] * 1000:.1f}ms")
+    base_rss = baseline.get("peak_rss_mb")
+    if base_rss and report.get("peak_rss_mb", 0) > base_rss * (1 + tolerance):
+        problems.append(f"峰值RSS {report['peak_rss_mb']:.0f}MB > 基线 {base_rss:.0f}MB")
+    return problems
+
+
+def add_common_args(parser) -> None:  # 公共命令行参数
+    parser.add_argument("--json", help="将结果写入JSON文件")
+    parser.add_argument("--baseline", help="与基线JSON对比，出现回退时以非0退出（用于CI）")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="允许的回退比例（默认0.2）")
+
+
+def finish(args, report: dict) -> None:  # 输出JSON并按基线检查
+    if args.json:
+        write_json(args.json, report)
+    if args.baseline:
+        problems = check_regression(report, args.baseline, args.tolerance)
+        for p in problems:
+            print(f"[回退] {p}")
+        if problems:
+            sys.exit(1)
+        print("与基线对比通过")
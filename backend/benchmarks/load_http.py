@@ -0,0 +1,158 @@
+"""
+端到端HTTP压测：并发调用 /api/summary/start，轮询 /status 直到任务结束
+状态轮询携带 If-None-Match；统计吞吐、提交接口延迟、各阶段（排队/转码/识别/总结）与端到端延迟的 p50/p95/p99，以及服务端峰值RSS
+用法（在 backend 目录下）：
+    python -m benchmarks.load_http [--tasks 50] [--concurrency 10] [--url http://127.0.0.1:8000] [--json out.json] [--baseline base.json]
+未指定 --url 时以本地模拟后端启动一个 uvicorn 子进程（需本机ffmpeg/ffprobe）
+"""
+import argparse  # 导入命令行解析
+import json  # 导入json
+import os  # 导入os
+import shutil  # 导入shutil
+import subprocess  # 导入子进程
+import sys  # 导入sys
+import tempfile  # 导入临时文件
+import threading  # 导入线程库
+import time  # 导入time计时
+import urllib.error  # 导入HTTP错误类型
+import urllib.request  # 导入HTTP客户端
+import uuid  # 导入uuid
+from concurrent.futures import ThreadPoolExecutor  # 导入线程池
+from benchmarks.common import FAKE_ENV, summarize, peak_rss_mb, process_peak_rss_mb, print_report, add_common_args, finish
+
+TERMINAL = ("done", "error", "cancelled")
+STAGES = ("queued", "transcoding", "recognizing", "summarizing")
+
+
+def _request(method: str, url: str, body: bytes = None, headers: dict = None, timeout: float = 60) -> tuple:  # 返回 (状态码, 响应头, JSON)
+    req = urllib.request.Request(url, data=body, method=method, headers=headers or {})
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            return resp.status, resp.headers, json.loads(resp.read() or b"null")
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers, json.loads(e.read() or b"null")
+
+
+def _multipart(filename: str, data: bytes) -> tuple:  # 构造 multipart/form-data 请求体
+    boundary = uuid.uuid4().hex
+    head = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"{filename}\"\r\n"
+        "Content-Type: application/octet-stream\r\n\r\n"
+    ).encode()
+    body = head + data + f"\r\n--{boundary}--\r\n".encode()
+    return body, {"Content-Type": f"multipart/form-data; boundary={boundary}"}
+
+
+def _make_audio(seconds: int) -> bytes:  # 生成符合识别要求的测试音频（16kHz单声道mp3，走直传路径）
+    if not shutil.which("ffmpeg"):
+        raise SystemExit("需要本机安装 ffmpeg 以生成测试音频")
+    path = os.path.join(tempfile.gettempdir(), f"bench_speech_{seconds}.mp3")
+    if not os.path.exists(path):
+        subprocess.run(["ffmpeg", "-y", "-loglevel", "error", "-f", "lavfi", "-i", f"sine=frequency=440:duration={seconds}",
+                        "-ar", "16000", "-ac", "1", "-b:a", "48k", path], check=True)
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def _start_server(port: int) -> subprocess.Popen:  # 以模拟后端启动服务
+    env = dict(os.environ)
+    for key, value in FAKE_ENV.items():
+        env.setdefault(key, value)
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+                            env=env, stdout=subprocess.DEVNULL)
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            _request("GET", f"http://127.0.0.1:{port}/", timeout=1)
+            return proc
+        except (urllib.error.URLError, ConnectionError):
+            time.sleep(0.2)
+    proc.kill()
+    raise SystemExit("服务启动超时")
+
+
+def _run_task(base: str, audio: bytes, args, results: dict, lock: threading.Lock) -> None:  # 提交一个任务并跟踪到结束
+    body, headers = _multipart("bench.mp3", audio + (b"" if args.same_file else os.urandom(64)))  # 末尾追加随机字节，避免命中内容缓存
+    started = time.perf_counter()
+    while True:
+        status, resp_headers, data = _request("POST", f"{base}/api/summary/start", body, headers)
+        if status != 429:
+            break
+        with lock:
+            results["rejected"] += 1
+        time.sleep(float(resp_headers.get("Retry-After", "1")))
+    submitted = time.perf_counter()
+    if status != 200:
+        with lock:
+            results["errors"] += 1
+        return
+    task_id = data["task_id"]
+    seen = {"queued": submitted}  # 阶段 -> 首次观察到的时间
+    current = "queued"
+    state, etag = {}, None
+    while True:
+        status, resp_headers, body = _request("GET", f"{base}/api/summary/status?task_id={task_id}&compact=true",
+                                              headers={"If-None-Match": etag} if etag else None)
+        now = time.perf_counter()
+        if status == 304:  # 状态未变化
+            with lock:
+                results["not_modified"] += 1
+        else:
+            state, etag = body, resp_headers.get("ETag")
+        stage = state.get("stage") if state.get("status") not in TERMINAL else None
+        if stage and stage != current:
+            seen.setdefault(stage, now)
+            current = stage
+        if state.get("status") in TERMINAL:
+            break
+        time.sleep(args.poll)
+    ordered = sorted((t, s) for s, t in seen.items() if s in STAGES) + [(now, "end")]
+    with lock:
+        results["start"].append(submitted - started)
+        for (t0, s), (t1, _) in zip(ordered, ordered[1:]):
+            results["stages"].setdefault(s, []).append(t1 - t0)
+        if state.get("status") == "done":
+            results["e2e"].append(now - started)
+        else:
+            results["errors"] += 1
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="端到端HTTP压测")
+    parser.add_argument("--url", help="目标服务地址；不指定时以模拟后端启动本地服务")
+    parser.add_argument("--port", type=int, default=8765, help="本地服务端口")
+    parser.add_argument("--tasks", type=int, default=50, help="任务总数")
+    parser.add_argument("--concurrency", type=int, default=10, help="并发客户端数")
+    parser.add_argument("--audio-seconds", type=int, default=60, help="测试音频时长（秒）")
+    parser.add_argument("--poll", type=float, default=0.1, help="状态轮询间隔（秒）")
+    parser.add_argument("--same-file", action="store_true", help="所有任务上传相同内容（测试缓存命中路径）")
+    add_common_args(parser)
+    args = parser.parse_args()
+
+    server = None if args.url else _start_server(args.port)
+    base = (args.url or f"http://127.0.0.1:{args.port}").rstrip("/")
+    audio = _make_audio(args.audio_seconds)
+    results = {"start": [], "stages": {}, "e2e": [], "errors": 0, "rejected": 0, "not_modified": 0}
+    lock = threading.Lock()
+    try:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(lambda _: _run_task(base, audio, args, results, lock), range(args.tasks)))
+        wall = time.perf_counter() - started
+        server_rss = process_peak_rss_mb(server.pid) if server else 0.0
+    finally:
+        if server:
+            server.terminate()
+            server.wait()
+    stages = {"start_request": summarize(results["start"])}
+    for name in STAGES:
+        if name in results["stages"]:
+            stages[name] = summarize(results["stages"][name])
+    stages["end_to_end"] = summarize(results["e2e"], wall)
+    report = {"stages": stages, "errors": results["errors"], "rejected": results["rejected"], "not_modified": results["not_modified"], "wall_seconds": wall,
+              "peak_rss_mb": server_rss or None, "client_peak_rss_mb": peak_rss_mb()}
+    print_report(f"端到端压测（{args.tasks} 个任务，并发 {args.concurrency}）", stages)
+    print(f"总耗时 {wall:.1f}s，吞吐 {len(results['e2e']) / wall:.2f} 任务/s，失败 {results['errors']}，429重试 {results['rejected']}，304响应 {results['not_modified']}")
+    if server_rss:
+        print(f"服务端峰值RSS：{server_rss:.1f} MB")
+    finish(args, report)
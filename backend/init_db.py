@@ -6,6 +6,7 @@ from app.core.database import engine, Base
 from app.models.user import User  # 导入用户模型
 from app.models.verification_code import VerificationCode  # 导入验证码模型
 from app.models.profile import UserProfile  # 导入用户资料模型
+from app.models.task import SummaryTask  # 导入总结任务模型
 
 if __name__ == "__main__":
     print("开始创建数据库表...")
@@ -0,0 +1,40 @@
+"""
+数据库迁移脚本：为summary_tasks表添加summary_url字段
+"""
+from sqlalchemy import text  # 导入text用于执行原生SQL
+from app.core.database import engine  # 导入数据库引擎
+
+def migrate_database():
+    """执行数据库迁移，添加summary_url字段"""
+    with engine.connect() as conn:
+        # 检查summary_url列是否已存在
+        result = conn.execute(text("SHOW COLUMNS FROM summary_tasks LIKE 'summary_url'"))
+        exists = result.fetchone()
+
+        if not exists:
+            print("添加 summary_url 列...")
+            conn.execute(text("""
+                ALTER TABLE summary_tasks
+                ADD COLUMN summary_url VARCHAR(512) NULL COMMENT '总结产物URL'
+            """))
+            print("[OK] summary_url 列已添加")
+        else:
+            print("[OK] summary_url 列已存在")
+
+        # 提交事务
+        conn.commit()
+        print("\n迁移完成！")
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("开始数据库迁移...")
+    print("=" * 50)
+    try:
+        migrate_database()
+        print("\n" + "=" * 50)
+        print("迁移成功！")
+        print("=" * 50)
+    except Exception as e:
+        print(f"\n迁移失败：{e}")
+        import traceback
+        traceback.print_exc()
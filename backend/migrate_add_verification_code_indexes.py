@@ -0,0 +1,48 @@
+"""
+数据库迁移脚本：为verification_codes表添加查找与清理索引，并清理已过期的验证码
+"""
+from sqlalchemy import text  # 导入text用于执行原生SQL
+from app.core.database import engine  # 导入数据库引擎
+from app.services.verification_service import purge_expired_codes  # 导入过期验证码清理
+
+INDEXES = [
+    ("ix_verification_codes_expires_at", "expires_at"),  # 清理过期验证码
+    ("ix_verification_codes_lookup", "email, code, used, id"),  # 按 邮箱+验证码+未使用 查找最新一条
+]
+
+def migrate_database():
+    """执行数据库迁移，添加索引"""
+    with engine.connect() as conn:
+        for name, columns in INDEXES:
+            # 检查索引是否已存在
+            result = conn.execute(text(f"SHOW INDEX FROM verification_codes WHERE Key_name = '{name}'"))
+            exists = result.fetchone()
+
+            if not exists:
+                print(f"添加索引 {name} ({columns})...")
+                conn.execute(text(f"CREATE INDEX {name} ON verification_codes ({columns})"))
+                print(f"[OK] 索引 {name} 已添加")
+            else:
+                print(f"[OK] 索引 {name} 已存在")
+
+        # 提交事务
+        conn.commit()
+
+    # 分批删除历史遗留的过期验证码（之后由服务内的定期清理线程维护）
+    count = purge_expired_codes()
+    print(f"[OK] 已清理过期验证码 {count} 条")
+    print("\n迁移完成！")
+
+if __name__ == "__main__":
+    print("=" * 50)
+    print("开始数据库迁移...")
+    print("=" * 50)
+    try:
+        migrate_database()
+        print("\n" + "=" * 50)
+        print("迁移成功！")
+        print("=" * 50)
+    except Exception as e:
+        print(f"\n迁移失败：{e}")
+        import traceback
+        traceback.print_exc()
@@ -0,0 +1,17 @@
+import os  # 导入os
+import tempfile  # 导入临时目录
+
+# 测试使用本地模拟后端与临时SQLite数据库（必须在导入 app 之前设置）
+os.environ.update({
+    "OSS_BACKEND": "fake",
+    "ASR_BACKEND": "fake",
+    "LLM_BACKEND": "fake",
+    "TASK_STORE_BACKEND": "memory",
+    "SUMMARY_CACHE_DIR": "off",
+    "DATABASE_URL": "sqlite:///" + os.path.join(tempfile.mkdtemp(prefix="summary-tests-"), "test.db"),
+    "FAKE_LATENCY_JITTER": "0",
+    "FAKE_ASR_LATENCY": "0",
+    "FAKE_LLM_LATENCY": "0",
+    "FAKE_LLM_TOKEN_DELAY": "0",
+    "FAKE_OSS_LATENCY": "0",
+})
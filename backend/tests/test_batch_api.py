@@ -0,0 +1,19 @@
+from fastapi.testclient import TestClient
+
+from app.main import app
+
+client = TestClient(app)
+
+
+def test_batch_rejects_object_outside_prefix():
+    resp = client.post("/api/summary/batch", data={"object_keys": ["private/secret.mp4"]})
+    assert resp.status_code == 400
+
+
+def test_batch_rejects_parent_segments():
+    resp = client.post("/api/summary/batch", data={"object_keys": ["uploads/batch/../../private/secret.mp4"]})
+    assert resp.status_code == 400
+
+
+def test_batch_requires_items():
+    assert client.post("/api/summary/batch").status_code == 400
@@ -0,0 +1,178 @@
+import os
+import threading
+import time
+from http import HTTPStatus
+from types import SimpleNamespace
+
+import pytest
+
+from app.api import summary as summary_api
+from app.services import fakes, oss_service, summarize_service
+from app.services.cancellation import CancelToken, TaskCancelled, run_cancellable
+from app.services.fakes import FakeBucket
+from app.services.task_scheduler import TaskScheduler
+from app.services.transcode_service import plan_transcode
+
+CALL_SECONDS = 0.6  # 模拟的单次非流式调用耗时
+
+
+class _SlowGeneration:  # 非流式调用阻塞 CALL_SECONDS；流式调用持续输出直到调用方停止读取
+    produced = 0
+
+    @classmethod
+    def call(cls, **kwargs):
+        if not kwargs.get("stream"):
+            time.sleep(CALL_SECONDS)
+            return SimpleNamespace(status_code=HTTPStatus.OK, output={"text": "笔记"})
+        return cls._stream()
+
+    @classmethod
+    def _stream(cls):
+        for _ in range(1000):
+            time.sleep(0.02)
+            cls.produced += 1
+            yield SimpleNamespace(status_code=HTTPStatus.OK, output={"text": "字"})
+
+
+@pytest.fixture
+def llm_stage(monkeypatch):  # 大模型阶段上限为1的独立调度器
+    scheduler = TaskScheduler(workers=1, queue_limit=10, stage_limits={"llm": 1})
+    monkeypatch.setattr(summarize_service, "scheduler", scheduler)
+    monkeypatch.setattr(summarize_service, "_generation", lambda: _SlowGeneration)
+    return lambda: scheduler.stats()["stages"]["llm"]["active"]
+
+
+def _cancel_after(token: CancelToken, delay: float) -> None:
+    threading.Timer(delay, token.cancel).start()
+
+
+def _wait_released(active, timeout: float = 5.0) -> float:  # 返回阶段空位释放的时刻
+    deadline = time.monotonic() + timeout
+    while active() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert active() == 0
+    return time.monotonic()
+
+
+def test_slot_is_held_until_abandoned_call_exits(llm_stage):
+    token = CancelToken("held-task")
+    _cancel_after(token, 0.1)
+    started = time.monotonic()
+    with pytest.raises(TaskCancelled):
+        run_cancellable(token, summarize_service.summarize_transcript, "阶段占用测试。", cancel_token=token)
+    assert time.monotonic() - started < CALL_SECONDS  # 工作线程立即返回
+    assert llm_stage() == 1  # 被放弃的调用仍在运行，空位未释放
+    released = _wait_released(llm_stage)
+    assert released - token.cancelled_at >= CALL_SECONDS - 0.1 - 0.05  # 空位随调用结束才释放
+
+
+def test_streaming_call_stops_and_releases_slot_soon_after_cancel(llm_stage):
+    token = CancelToken("stream-task")
+    _cancel_after(token, 0.1)
+    with pytest.raises(TaskCancelled):
+        run_cancellable(token, summarize_service.summarize_transcript, "流式取消测试。", on_token=lambda text: None, cancel_token=token)
+    released = _wait_released(llm_stage)
+    assert released - token.cancelled_at < 0.5  # 流式读取循环内检查取消，很快结束
+    produced = _SlowGeneration.produced
+    time.sleep(0.1)
+    assert _SlowGeneration.produced == produced  # 被放弃的流式调用已停止
+
+
+SLOT_RELEASE_BOUND = 1.0  # 取消后阶段空位必须在该时间内释放（秒）
+
+
+@pytest.fixture
+def stages(monkeypatch):  # 转码、转写等待上限各为1的独立调度器
+    scheduler = TaskScheduler(workers=1, queue_limit=10, stage_limits={"transcode": 1, "asr": 1})
+    monkeypatch.setattr(summary_api, "scheduler", scheduler)
+    return lambda name: scheduler.stats()["stages"][name]["active"]
+
+
+def _run_in_background(fn, *args) -> list:  # 在后台线程中执行 fn，返回收集其异常的列表
+    errors = []
+
+    def run():
+        try:
+            fn(*args)
+        except BaseException as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return errors
+
+
+def _wait_active(active, timeout: float = 2.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not active() and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert active() == 1
+
+
+def test_transcode_cancel_kills_ffmpeg_and_frees_slot(stages, tmp_path, monkeypatch):
+    fake = tmp_path / "ffmpeg"
+    fake.write_text("#!/bin/sh\nexec sleep 30\n")  # 长时间没有输出的ffmpeg
+    fake.chmod(0o755)
+    monkeypatch.setenv("PATH", f"{tmp_path}{os.pathsep}{os.environ['PATH']}")
+    src = tmp_path / "lecture.mp4"
+    src.write_bytes(b"\0" * 16)
+    plan = plan_transcode(None, "lecture.mp4")  # 无探测信息时重新编码
+    token = CancelToken("transcode-task")
+    errors = _run_in_background(summary_api._upload_audio, "transcode-task", token, str(src), "lecture.mp4", plan)
+    active = lambda: stages("transcode")
+    _wait_active(active)
+    time.sleep(0.1)
+    token.cancel()
+    released = _wait_released(active)
+    assert released - token.cancelled_at < SLOT_RELEASE_BOUND
+    time.sleep(0.05)
+    assert isinstance(errors[0], TaskCancelled)
+
+
+def test_asr_cancel_stops_polling_and_frees_slot(stages, monkeypatch):
+    monkeypatch.setattr(fakes, "FAKE_ASR_LATENCY", 30)  # 转写结果迟迟不返回
+    token = CancelToken("asr-task")
+    errors = _run_in_background(summary_api._transcribe, token, "https://example.com/a.mp3", 60)
+    active = lambda: stages("asr")
+    _wait_active(active)
+    time.sleep(0.1)
+    token.cancel()
+    released = _wait_released(active)
+    assert released - token.cancelled_at < SLOT_RELEASE_BOUND
+    time.sleep(0.05)
+    assert isinstance(errors[0], TaskCancelled)
+
+
+class _SlowPartBucket(FakeBucket):  # 每个分片上传耗时 PART_SECONDS
+    PART_SECONDS = 0.2
+
+    def upload_part(self, key, upload_id, part_number, data):
+        time.sleep(self.PART_SECONDS)
+        return super().upload_part(key, upload_id, part_number, data)
+
+
+def test_multipart_cancel_aborts_upload_and_frees_slot(stages, monkeypatch):
+    monkeypatch.setattr(oss_service, "OSS_MULTIPART_THRESHOLD", 1024)
+    monkeypatch.setattr(oss_service, "OSS_PART_SIZE", 1024)
+    bucket = _SlowPartBucket()
+    token = CancelToken("oss-task")
+
+    def endless():  # 长度未知的转码输出
+        while True:
+            yield b"x" * 512
+
+    def upload():
+        with summary_api.scheduler.stage("transcode", token):
+            oss_service.upload_stream_and_get_url(endless(), "a.mp3", "audio/mpeg", bucket=bucket, cancel_token=token)
+
+    errors = _run_in_background(upload)
+    active = lambda: stages("transcode")
+    _wait_active(active)
+    time.sleep(0.3)
+    token.cancel()
+    released = _wait_released(active)
+    assert released - token.cancelled_at < _SlowPartBucket.PART_SECONDS * oss_service.OSS_UPLOAD_THREADS + SLOT_RELEASE_BOUND  # 最多等待在途分片完成
+    time.sleep(0.05)
+    assert isinstance(errors[0], TaskCancelled)
+    assert bucket._uploads == {}  # 分片上传已放弃
+    assert bucket.objects == {}
@@ -0,0 +1,26 @@
+import re
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from app.core import metrics
+from app.core.database import engine
+
+
+def _query_count() -> int:  # 已记录的 db_query_seconds 观测次数
+    match = re.search(r"^db_query_seconds_count (\d+)$", metrics.render_prometheus(), re.M)
+    return int(match.group(1)) if match else 0
+
+
+def test_only_successful_statements_are_timed():
+    with engine.connect() as conn:
+        conn.execute(text("SELECT 1"))  # 建立连接时的初始化语句不计入下面的断言
+        before = _query_count()
+        for _ in range(3):
+            with pytest.raises(OperationalError):
+                conn.execute(text("SELECT * FROM no_such_table"))
+            conn.rollback()
+        assert _query_count() == before  # 出错的语句不记录耗时
+        assert conn.execute(text("SELECT 1")).scalar() == 1
+        assert _query_count() == before + 1  # 成功的语句恰好记录一次
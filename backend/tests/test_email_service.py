@@ -0,0 +1,82 @@
+import smtplib
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import email_service
+from app.services.email_service import EmailOutbox
+
+
+class _FakeServer:  # 按预设依次抛出异常，之后发送成功
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.sent = []
+
+    def sendmail(self, sender, to_email, message):
+        if self.errors:
+            raise self.errors.pop(0)
+        self.sent.append(to_email)
+
+    def quit(self):
+        pass
+
+
+@pytest.fixture
+def outbox(monkeypatch):
+    monkeypatch.setattr(email_service, "time", SimpleNamespace(monotonic=time.monotonic, sleep=lambda seconds: None))  # 跳过退避等待
+    return EmailOutbox(workers=1, queue_limit=10, retries=2, idle_timeout=60)
+
+
+def _use_server(monkeypatch, server):
+    monkeypatch.setattr(email_service, "_connect", lambda: server)
+
+
+def test_transient_rejection_is_retried(monkeypatch, outbox):
+    server = _FakeServer([
+        smtplib.SMTPDataError(451, b"try again later"),
+        smtplib.SMTPRecipientsRefused({"a@example.com": (450, b"mailbox busy")}),
+    ])
+    _use_server(monkeypatch, server)
+    assert outbox._deliver(None, "a@example.com", "s", "<p>x</p>", None) is server
+    assert server.sent == ["a@example.com"]
+
+
+def test_permanent_rejection_is_not_retried(monkeypatch, outbox):
+    server = _FakeServer([smtplib.SMTPRecipientsRefused({"b@example.com": (550, b"no such user")})])
+    _use_server(monkeypatch, server)
+    assert outbox._deliver(None, "b@example.com", "s", "<p>x</p>", None) is server
+    assert server.sent == []
+    assert server.errors == []
+
+
+def test_bad_message_does_not_stop_worker(monkeypatch, outbox):
+    server = _FakeServer([])
+    _use_server(monkeypatch, server)
+    build = email_service._build_message
+
+    def build_or_fail(to_email, subject, html_content, text_content=None):
+        if subject == "bad":
+            raise ValueError("无法编码")
+        return build(to_email, subject, html_content, text_content)
+
+    monkeypatch.setattr(email_service, "_build_message", build_or_fail)
+    outbox.submit("bad@example.com", "bad", "<p>x</p>")
+    outbox.submit("good@example.com", "good", "<p>x</p>")
+    assert outbox.join(timeout=2) == 0  # 发信线程若退出，队列将永远不会清空
+    assert server.sent == ["good@example.com"]
+
+
+def test_join_gives_up_after_timeout(monkeypatch, outbox):
+    release = threading.Event()
+    server = _FakeServer([])
+    server.sendmail = lambda sender, to_email, message: release.wait()  # SMTP服务器无响应
+    _use_server(monkeypatch, server)
+    outbox.submit("slow@example.com", "s", "<p>x</p>")
+    outbox.submit("queued@example.com", "s", "<p>x</p>")
+    started = time.monotonic()
+    assert outbox.join(timeout=0.2) == 2  # 到期返回未处理完的数量，不无限等待
+    assert time.monotonic() - started < 1
+    release.set()
+    assert outbox.join(timeout=2) == 0
@@ -0,0 +1,74 @@
+import os
+
+import pytest
+
+from app.services import oss_service
+from app.services.fakes import FakeBucket
+
+PART = 1024
+
+
+class _FlakyBucket(FakeBucket):  # 第 fail_at 个分片上传时失败一次
+    def __init__(self, fail_at=None):
+        super().__init__()
+        self.fail_at = fail_at
+        self.uploaded_parts = []
+
+    def upload_part(self, key, upload_id, part_number, data):
+        if part_number == self.fail_at:
+            self.fail_at = None
+            raise RuntimeError("连接被重置")
+        self.uploaded_parts.append(part_number)
+        return super().upload_part(key, upload_id, part_number, data)
+
+
+@pytest.fixture(autouse=True)
+def small_parts(monkeypatch, tmp_path):
+    monkeypatch.setattr(oss_service, "OSS_MULTIPART_THRESHOLD", PART)
+    monkeypatch.setattr(oss_service, "OSS_PART_SIZE", PART)
+    monkeypatch.setattr(oss_service, "OSS_UPLOAD_THREADS", 1)
+    monkeypatch.setattr(oss_service, "OSS_CHECKPOINT_DIR", str(tmp_path / "checkpoints"))
+
+
+def _spooled(tmp_path, name):  # 每次提交都是新的随机命名暂存文件
+    path = tmp_path / name
+    path.write_bytes(b"x" * (PART * 3))
+    return str(path)
+
+
+def _checkpoint_files():
+    try:
+        return os.listdir(oss_service.OSS_CHECKPOINT_DIR)
+    except FileNotFoundError:
+        return []
+
+
+def test_resume_uses_content_key_across_spooled_files(tmp_path):
+    bucket = _FlakyBucket(fail_at=2)
+    with pytest.raises(RuntimeError):
+        oss_service.upload_file_and_get_url(_spooled(tmp_path, "a.tmp"), "a.mp3", "audio/mpeg", bucket=bucket, resume_key="sha256")
+    assert len(bucket._uploads) == 1  # 可续传：保留服务端分片
+    url = oss_service.upload_file_and_get_url(_spooled(tmp_path, "b.tmp"), "a.mp3", "audio/mpeg", bucket=bucket, resume_key="sha256")
+    assert sorted(bucket.uploaded_parts) == [1, 2, 3]  # 已上传的分片没有重复上传
+    assert oss_service.object_key_from_url(url) in bucket.objects
+    assert _checkpoint_files() == []
+
+
+def test_failure_without_resume_key_aborts_upload(tmp_path):
+    bucket = _FlakyBucket(fail_at=2)
+    with pytest.raises(RuntimeError):
+        oss_service.upload_file_and_get_url(_spooled(tmp_path, "a.tmp"), "a.mp3", "audio/mpeg", bucket=bucket)
+    assert bucket._uploads == {}
+    assert _checkpoint_files() == []
+
+
+def test_sweep_aborts_stale_checkpoints(tmp_path):
+    bucket = _FlakyBucket(fail_at=2)
+    with pytest.raises(RuntimeError):
+        oss_service.upload_file_and_get_url(_spooled(tmp_path, "a.tmp"), "a.mp3", "audio/mpeg", bucket=bucket, resume_key="sha256")
+    assert oss_service.sweep_checkpoints(3600, bucket=bucket) == 0  # 未过期的断点保留
+    for name in _checkpoint_files():
+        os.utime(os.path.join(oss_service.OSS_CHECKPOINT_DIR, name), (0, 0))
+    assert oss_service.sweep_checkpoints(3600, bucket=bucket) == 1
+    assert bucket._uploads == {}
+    assert _checkpoint_files() == []
@@ -0,0 +1,48 @@
+import time
+from concurrent.futures import Future
+
+import pytest
+
+from app.services.cancellation import CancelToken
+from app.services.segment_service import plan_segments, transcribe_segments
+
+
+def test_short_tail_is_merged_into_previous_segment():
+    segments = plan_segments(1205, [], max_len=600, min_len=120)  # 硬切会留下5秒的尾段
+    assert segments == [(0.0, 600.0), (600.0, 1205)]
+
+
+def test_long_enough_tail_is_kept():
+    segments = plan_segments(1330, [(1190, 1210)], max_len=600, min_len=120)
+    assert segments == [(0.0, 600.0), (600.0, 1200.0), (1200.0, 1330)]
+
+
+def test_failed_segment_aborts_others_before_returning():
+    uploaded, asr_futures, aborted = [], [], []
+
+    def prepare(index, start, end, abort):
+        if index == 0:
+            time.sleep(0.05)
+            raise RuntimeError("片段转码失败")
+        if index == 1:  # 上传进行中：中止后放弃上传
+            deadline = time.monotonic() + 2
+            while time.monotonic() < deadline:
+                if abort.is_cancelled():
+                    aborted.append(index)
+                    abort.raise_if_cancelled()
+                time.sleep(0.01)
+        uploaded.append(index)
+        return f"https://oss/part{index}.mp3"
+
+    def submit(link, duration):  # 转写轮询，不会自行结束
+        future = Future()
+        asr_futures.append(future)
+        return future
+
+    with pytest.raises(RuntimeError):
+        transcribe_segments([(0, 10), (10, 20), (20, 30)], prepare, submit, cancel_token=CancelToken("t"), concurrency=3)
+    snapshot = list(uploaded)
+    time.sleep(0.1)
+    assert uploaded == snapshot == [2]  # 返回后不再上传新对象，调用方清理时能看到全部对象
+    assert aborted == [1]
+    assert asr_futures and all(f.cancelled() for f in asr_futures)
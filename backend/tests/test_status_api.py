@@ -0,0 +1,40 @@
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+from app.api import summary as summary_api
+from app.main import app
+from app.services.task_scheduler import TaskScheduler
+from app.services.task_store import task_store
+
+client = TestClient(app)
+
+
+def test_queued_task_etag_is_stable_while_queue_stats_change(monkeypatch):
+    scheduler = TaskScheduler(workers=1, queue_limit=10, stage_limits={})
+    gate = threading.Event()
+    scheduler.submit("etag-block", lambda task_id: gate.wait())
+    time.sleep(0.05)
+    scheduler.submit("etag-queued", lambda task_id: None)
+    monkeypatch.setattr(summary_api, "scheduler", scheduler)
+    task_store.create("etag-queued", status="queued", progress=0, stage="queued")
+    try:
+        first = client.get("/api/summary/status", params={"task_id": "etag-queued"})
+        assert first.json()["queue_position"] == 1
+        assert "queue" not in first.json()
+        time.sleep(0.05)  # 最早入队任务的等待时长已变化
+        again = client.get("/api/summary/status", params={"task_id": "etag-queued"}, headers={"If-None-Match": first.headers["ETag"]})
+        assert again.status_code == 304
+
+        with_queue = client.get("/api/summary/status", params={"task_id": "etag-queued", "include": "queue"}, headers={"If-None-Match": first.headers["ETag"]})
+        assert with_queue.status_code == 200
+        assert with_queue.json()["queue"]["queue_depth"] == 1
+        assert "ETag" not in with_queue.headers
+
+        task_store.update("etag-queued", progress=5)  # 版本号变化后不再命中
+        changed = client.get("/api/summary/status", params={"task_id": "etag-queued"}, headers={"If-None-Match": first.headers["ETag"]})
+        assert changed.status_code == 200
+    finally:
+        gate.set()
+        task_store.delete("etag-queued")
@@ -0,0 +1,91 @@
+import threading
+import time
+from http import HTTPStatus
+from types import SimpleNamespace
+
+import pytest
+
+from app.api import summary as summary_api
+from app.services import summarize_service
+from app.services.result_cache import result_cache
+from app.services.summary_cache import summary_cache, summary_key
+from app.services.summarize_service import MODERATION_MESSAGE, SummaryFailed
+from app.services.task_scheduler import TaskScheduler
+from app.services.task_store import task_store
+
+
+class _RejectingGeneration:  # 模拟内容审核未通过的模型响应
+    @staticmethod
+    def call(**kwargs):
+        response = SimpleNamespace(status_code=HTTPStatus.BAD_REQUEST, code="DataInspectionFailed", output=None)
+        return iter([response]) if kwargs.get("stream") else response
+
+
+def test_moderation_failure_raises_and_is_not_cached(monkeypatch):
+    monkeypatch.setattr(summarize_service, "_generation", lambda: _RejectingGeneration)
+    transcript = "审核测试的转写文本。"
+    with pytest.raises(SummaryFailed) as info:
+        summarize_service.summarize_transcript(transcript)
+    assert info.value.result == MODERATION_MESSAGE
+    key = summary_key(transcript, summarize_service.SUMMARY_MODEL, summarize_service.PROMPT_VERSION)
+    assert summary_cache.get(key) is None
+
+
+def test_run_task_does_not_cache_or_upload_moderation_message(monkeypatch):
+    monkeypatch.setattr(summarize_service, "_generation", lambda: _RejectingGeneration)
+    uploads = []
+    monkeypatch.setattr(summary_api, "save_summary_artifact", lambda summary, on_done=None: uploads.append(summary))
+    digest = "moderation-test-digest"
+    result_cache.store(digest, transcript="另一段审核测试的转写文本。")  # 跳过转码与转写
+    task_store.create("moderation-task")
+
+    summary_api._run_task("moderation-task", "/nonexistent", "a.mp3", digest)
+
+    task = task_store.get("moderation-task")
+    assert task["status"] == "done"
+    assert task["summary"] == MODERATION_MESSAGE
+    assert "summary" not in result_cache.lookup(digest, count=False)
+    assert uploads == []
+
+
+def test_chunk_sentences_splits_oversize_sentence():
+    chunks = summarize_service.chunk_sentences(["短句。", "长" * 25, "尾句。"], budget=10)
+    assert all(summarize_service.estimate_tokens(chunk) <= 10 for chunk in chunks)
+    assert "".join(chunks) == "短句。" + "长" * 25 + "尾句。"
+
+
+def test_chunk_sentences_counts_separator_in_budget():
+    chunks = summarize_service.chunk_sentences(["a" * 4, "b" * 4, "c" * 4], budget=10, sep="\n\n")
+    assert chunks == ["aaaa\n\nbbbb", "cccc"]
+
+
+class _CountingGeneration:  # 记录同时进行的请求数与请求内容；每次返回40字的要点
+    lock = threading.Lock()
+    active = peak = 0
+    prompts = []
+
+    @classmethod
+    def call(cls, **kwargs):
+        with cls.lock:
+            cls.active += 1
+            cls.peak = max(cls.peak, cls.active)
+            cls.prompts.append(kwargs["messages"][-1]["content"])
+        time.sleep(0.02)
+        with cls.lock:
+            cls.active -= 1
+        response = SimpleNamespace(status_code=HTTPStatus.OK, output={"text": "要" * 40})
+        return iter([response]) if kwargs.get("stream") else response
+
+
+def test_map_reduce_caps_reduce_input_and_takes_a_permit_per_call(monkeypatch):
+    monkeypatch.setattr(summarize_service, "_generation", lambda: _CountingGeneration)
+    monkeypatch.setattr(summarize_service, "SUMMARY_CHUNK_TOKENS", 50)
+    monkeypatch.setattr(summarize_service, "SUMMARY_MAP_CONCURRENCY", 4)
+    monkeypatch.setattr(summarize_service, "scheduler", TaskScheduler(workers=1, queue_limit=10, stage_limits={"llm": 1}))
+    transcript = "".join(f"第{i}句分块测试内容。" for i in range(40))
+
+    summarize_service.summarize_transcript(transcript)
+
+    assert _CountingGeneration.peak == 1  # 分块并行的请求也受大模型阶段上限约束
+    reduce_input = len(_CountingGeneration.prompts[-1]) - len(summarize_service.REDUCE_PROMPT.format(transcript=""))
+    assert reduce_input <= 50  # 要点无法继续压缩时截断到预算内
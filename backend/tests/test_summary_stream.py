@@ -0,0 +1,114 @@
+import asyncio
+import socket
+import threading
+import time
+
+import httpx
+import pytest
+import uvicorn
+
+from app.api import summary as summary_api
+from app.main import app
+from app.services.task_store import task_store
+
+
+async def _take(stream, count):
+    messages = []
+    async for message in stream:
+        messages.append(message)
+        if len(messages) == count:
+            break
+    await stream.aclose()
+    return messages
+
+
+def test_tokens_of_task_on_other_worker_are_read_from_store(monkeypatch):
+    monkeypatch.setattr(summary_api, "SSE_STORE_POLL_SECONDS", 0.01)
+    task_store.create("remote-task", status="running", stage="summarizing")  # 本进程没有该任务的事件通道
+    task_store.save_partial("remote-task", "第一段")
+
+    async def stream():
+        events = summary_api._stream_events("remote-task", 0, "token")
+        first = await events.__anext__()
+        task_store.save_partial("remote-task", "第一段第二段")
+        second = await events.__anext__()
+        task_store.update("remote-task", status="done", stage="finished", summary="完整总结")
+        rest = await _take(events, 2)
+        return [first, second] + rest
+
+    first, second, summary, end = asyncio.run(stream())
+    assert '"第一段"' in first and "id:" not in first
+    assert '"第二段"' in second
+    assert summary.startswith("event: summary") and "完整总结" in summary
+    assert end.startswith("event: end")
+    assert task_store.get_partial("remote-task") is None  # 进入终态时清空
+
+
+def test_progress_of_task_on_other_worker_is_polled_independently_of_heartbeat(monkeypatch):
+    monkeypatch.setattr(summary_api, "SSE_HEARTBEAT_SECONDS", 60)
+    monkeypatch.setattr(summary_api, "SSE_STORE_POLL_SECONDS", 0.01)
+    task_store.create("remote-progress", status="running", stage="recognizing", progress=10)
+
+    async def stream():
+        events = summary_api._stream_events("remote-progress", 0, "progress")
+        first = await events.__anext__()
+        task_store.update("remote-progress", progress=40)
+        second = await asyncio.wait_for(events.__anext__(), 1)  # 不等心跳间隔；进度未变化时不重复推送
+        await events.aclose()
+        return first, second
+
+    first, second = asyncio.run(stream())
+    assert '"progress": 10' in first
+    assert '"progress": 40' in second
+    task_store.delete("remote-progress")
+
+
+SUBSCRIBERS = 45  # 超过 anyio 默认线程池容量（40）
+
+
+@pytest.fixture
+def server(monkeypatch):  # 真实的HTTP服务（TestClient 会等待整个响应结束，无法保持SSE连接）
+    monkeypatch.setattr(summary_api, "SSE_HEARTBEAT_SECONDS", 60)
+    monkeypatch.setattr(summary_api, "SSE_STORE_POLL_SECONDS", 0.05)
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    server = uvicorn.Server(uvicorn.Config(app, lifespan="off", log_level="warning"))
+    thread = threading.Thread(target=server.run, kwargs={"sockets": [sock]}, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    yield f"http://127.0.0.1:{sock.getsockname()[1]}"
+    server.should_exit = True
+    thread.join(5)
+
+
+def test_idle_subscribers_do_not_block_other_requests(server):
+    task_ids = [f"idle-{i}" for i in range(SUBSCRIBERS)]
+    for task_id in task_ids:
+        task_store.create(task_id, status="running", stage="recognizing")
+    ready, stop = threading.Semaphore(0), threading.Event()
+
+    def subscribe(task_id):
+        with httpx.stream("GET", f"{server}/api/summary/events", params={"task_id": task_id}, timeout=10) as resp:
+            for line in resp.iter_lines():
+                if line.startswith("event: progress"):
+                    break
+            ready.release()
+            stop.wait(10)
+
+    threads = [threading.Thread(target=subscribe, args=(task_id,), daemon=True) for task_id in task_ids]
+    for thread in threads:
+        thread.start()
+    try:
+        for _ in task_ids:
+            assert ready.acquire(timeout=10)
+        started = time.monotonic()
+        resp = httpx.get(f"{server}/api/summary/status", params={"task_id": task_ids[0], "compact": "true"}, timeout=10)
+        assert resp.status_code == 200
+        assert time.monotonic() - started < 1
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join(5)
+        for task_id in task_ids:
+            task_store.delete(task_id)
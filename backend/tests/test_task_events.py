@@ -0,0 +1,38 @@
+import asyncio
+import threading
+
+from app.services.task_events import TaskEventHub
+
+
+async def _collect(hub, task_id, **kwargs):
+    return [item async for item in hub.subscribe(task_id, **kwargs)]
+
+
+def test_publish_does_not_create_channel():
+    hub = TaskEventHub()
+    hub.publish("other-worker-task", "progress", {"cancelled": True})
+    assert not hub.has_channel("other-worker-task")
+    assert asyncio.run(_collect(hub, "other-worker-task", timeout=0.01)) == []
+
+
+def test_publish_to_open_channel_and_close():
+    hub = TaskEventHub()
+    hub.open("t1")
+    hub.publish("t1", "progress", {"progress": 10})
+    hub.close("t1")
+    assert asyncio.run(_collect(hub, "t1", timeout=0.01)) == [(1, "progress", {"progress": 10})]
+
+
+def test_publish_from_worker_thread_wakes_subscriber():
+    hub = TaskEventHub()
+    hub.open("t2")
+
+    def run_task():  # 模拟工作线程发布事件
+        hub.publish("t2", "token", "你好")
+        hub.close("t2")
+
+    async def subscribe():
+        threading.Timer(0.05, run_task).start()
+        return await asyncio.wait_for(_collect(hub, "t2", timeout=10), 2)  # 不依赖超时轮询即被唤醒
+
+    assert asyncio.run(subscribe()) == [(1, "token", "你好")]
@@ -0,0 +1,39 @@
+import threading
+import time
+
+from app.services.task_scheduler import BATCH_LANE, TaskScheduler
+
+
+def _blocked_scheduler():  # 单工作线程被占用，后续提交只排队
+    scheduler = TaskScheduler(workers=1, queue_limit=100, stage_limits={})
+    gate = threading.Event()
+    scheduler.submit("block", lambda task_id: gate.wait())
+    time.sleep(0.05)
+    return scheduler, gate
+
+
+def test_batches_share_one_lane():
+    scheduler, gate = _blocked_scheduler()
+    order, done = [], threading.Semaphore(0)
+
+    def run(task_id):
+        order.append(task_id)
+        done.release()
+
+    for i in range(3):  # 多个单项批次不能各占一个通道插队
+        scheduler.submit_many([(f"b{i}", run, ())], lane=BATCH_LANE)
+    scheduler.submit("s0", run)
+    scheduler.submit("s1", run)
+    assert scheduler.stats()["lanes"] == 2
+    assert scheduler.position("s1") == 4
+    gate.set()
+    for _ in range(5):
+        assert done.acquire(timeout=2)
+    assert order == ["b0", "s0", "b1", "s1", "b2"]
+
+
+def test_task_ids_lists_queued_and_running():
+    scheduler, gate = _blocked_scheduler()
+    scheduler.submit("waiting", lambda task_id: None)
+    assert sorted(scheduler.task_ids()) == ["block", "waiting"]
+    gate.set()
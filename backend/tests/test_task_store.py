@@ -0,0 +1,68 @@
+import time
+
+import pytest
+
+from app.core.database import Base, engine
+from app.models.task import SummaryTask  # noqa: F401  注册表结构
+from app.services.task_store import DatabaseTaskStore, MemoryTaskStore
+
+
+@pytest.fixture(params=["memory", "database"])
+def store(request):
+    if request.param == "memory":
+        return MemoryTaskStore()
+    Base.metadata.create_all(bind=engine)
+    return DatabaseTaskStore()
+
+
+def test_purge_task_created_as_done(store):
+    store.create("cached-hit", status="done", progress=100, stage="finished", summary="s")
+    store.create("queued-task", status="queued")
+    time.sleep(0.01)
+    assert store.purge_expired(0) == 1
+    assert store.get("cached-hit") is None
+    assert store.get("queued-task") is not None
+    store.delete("queued-task")
+
+
+def test_purge_keeps_recent_done_task(store):
+    store.create("recent", status="done")
+    assert store.purge_expired(3600) == 0
+    assert store.get("recent") is not None
+    store.delete("recent")
+
+
+def test_update_increments_version(store):
+    store.create("v", status="queued")
+    store.update("v", progress=10)
+    store.update("v", status="done")
+    assert store.get_version("v") == 2
+    store.purge_expired(0)
+
+
+def test_partial_summary_does_not_bump_version_and_is_cleared(store):
+    store.create("p", status="running", stage="summarizing")
+    store.save_partial("p", "生成中")
+    assert store.get_partial("p") == "生成中"
+    assert store.get_version("p") == 0
+    assert "partial_summary" not in store.get("p")
+    store.update("p", status="done", summary="完成")
+    assert store.get_partial("p") is None
+    store.save_partial("p", "迟到的片段")  # 结束后不再写入
+    assert store.get_partial("p") is None
+    store.delete("p")
+
+
+def test_reap_stale_marks_unheartbeated_tasks_as_error(store):
+    store.create("stale-task", status="running", stage="summarizing")
+    store.create("live-task", status="queued")
+    time.sleep(0.2)
+    store.touch(["live-task"])  # 所在进程仍在运行的任务定期记录心跳
+    assert store.reap_stale(0.1) == 1
+    stale = store.get("stale-task")
+    assert stale["status"] == "error" and stale["version"] == 1
+    assert store.get("live-task")["status"] == "queued"
+    assert store.get_version("live-task") == 0  # 心跳不增加版本号
+    time.sleep(0.01)
+    assert store.purge_expired(0) == 1  # 标记失败后按已结束任务清理
+    store.delete("live-task")
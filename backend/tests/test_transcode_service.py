@@ -0,0 +1,13 @@
+from app.services.transcode_service import TRANSCODE_PROFILE, probe_media, plan_transcode
+
+
+def test_probe_without_ffprobe_falls_back_to_encode(tmp_path, monkeypatch):
+    src = tmp_path / "lecture.mp4"
+    src.write_bytes(b"\0" * 16)
+    monkeypatch.setenv("PATH", str(tmp_path))  # PATH 中没有 ffprobe
+    media = probe_media(str(src))
+    assert media is None
+    plan = plan_transcode(media, "lecture.mp4")
+    assert plan.action == "encode"
+    assert plan.profile == TRANSCODE_PROFILE
+    assert plan.duration is None
@@ -0,0 +1,105 @@
+import asyncio
+import hashlib
+import os
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.api import summary as summary_api
+from app.main import app
+from app.services import upload_service
+from app.services.result_cache import result_cache
+from app.services.upload_service import UploadTooLargeError, spool_multipart
+
+client = TestClient(app)
+BOUNDARY = "test-boundary"
+
+
+def _multipart(name: str, filename: str, size: int) -> bytes:
+    head = f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n\r\n'.encode()
+    return head + b"x" * size + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+async def _chunks(data: bytes, size: int, consumed: list):
+    for i in range(0, len(data), size):
+        consumed.append(size)
+        yield data[i:i + size]
+
+
+@pytest.fixture
+def spool_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(upload_service, "UPLOAD_SPOOL_DIR", str(tmp_path))
+    return tmp_path
+
+
+def test_oversize_stream_stops_reading_and_leaves_no_file(spool_dir):
+    body = _multipart("file", "a.mp3", 100_000)
+    consumed = []
+    with pytest.raises(UploadTooLargeError):
+        asyncio.run(spool_multipart(f"multipart/form-data; boundary={BOUNDARY}", _chunks(body, 1000, consumed), "file", 1, max_bytes=10_000, chunk_size=4096))
+    assert len(consumed) < 20  # 超限后不再读取剩余请求体
+    assert os.listdir(spool_dir) == []
+
+
+def test_multipart_spools_files_and_fields(spool_dir):
+    file_part = _multipart("files", "a.wav", 5000)[:-len(f"--{BOUNDARY}--\r\n")]
+    field = f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="object_keys"\r\n\r\nuploads/batch/a.mp4\r\n--{BOUNDARY}--\r\n'.encode()
+    files, fields = asyncio.run(spool_multipart(f"multipart/form-data; boundary={BOUNDARY}", _chunks(file_part + field, 700, []), "files", 2, chunk_size=1024))
+    assert fields == {"object_keys": ["uploads/batch/a.mp4"]}
+    assert [(f.size, f.filename, f.digest) for f in files] == [(5000, "a.wav", hashlib.sha256(b"x" * 5000).hexdigest())]
+    assert os.path.getsize(files[0].path) == 5000 and files[0].path.endswith(".wav")
+    upload_service.remove_spooled(files[0].path)
+
+
+def test_start_rejects_declared_oversize_without_reading_body(monkeypatch):
+    monkeypatch.setattr(summary_api, "UPLOAD_MAX_BYTES", 1000)
+    reads = []
+
+    async def receive():
+        reads.append(1)
+        return {"type": "http.request", "body": b"x" * 1000, "more_body": True}
+
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST", "scheme": "http",
+        "path": "/api/summary/start", "raw_path": b"/api/summary/start", "root_path": "", "query_string": b"",
+        "headers": [(b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode()), (b"content-length", b"10000000")],
+        "client": ("127.0.0.1", 1), "server": ("testserver", 80),
+    }
+    asyncio.run(app(scope, receive, send))
+    assert sent[0]["status"] == 413
+    assert reads == []
+
+
+def test_start_spools_upload_and_hits_cache(spool_dir):
+    content = b"upload-api-test-content"
+    result_cache.store(hashlib.sha256(content).hexdigest(), transcript="转写", summary="已有总结")
+    resp = client.post("/api/summary/start", files={"file": ("a.mp3", content)})
+    assert resp.status_code == 200
+    assert resp.json()["cached"] is True
+    assert os.listdir(spool_dir) == []  # 命中缓存时暂存文件已删除
+
+
+def test_start_rejects_file_in_other_field(spool_dir):
+    resp = client.post("/api/summary/start", files={"upload": ("a.mp3", b"abc")})
+    assert resp.status_code == 400
+    assert os.listdir(spool_dir) == []
+
+
+def test_sweep_removes_orphaned_spool_files_only(spool_dir):
+    orphan = spool_dir / f"{upload_service.SPOOL_PREFIX}orphan.mp3"
+    other = spool_dir / "other.tmp"
+    for path in (orphan, other):
+        path.write_bytes(b"x")
+        os.utime(path, (0, 0))
+    live = upload_service._SpoolWriter("live.mp3", 100)
+    os.utime(live.path, (0, 0))  # 仍在使用的文件即使修改时间很旧也不会被删除
+    try:
+        assert upload_service.sweep_spooled(max_age=60) == 1
+        assert sorted(os.listdir(spool_dir)) == sorted([os.path.basename(live.path), "other.tmp"])
+    finally:
+        live.discard()
@@ -0,0 +1,28 @@
+from app.core.database import Base, SessionLocal, engine
+from app.models.profile import UserProfile
+from app.models.user import User
+from app.services.user_cache import UserCache
+
+
+def test_invalidate_in_one_worker_expires_snapshot_in_another():
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        user = User(username="cache-user", email="cache@example.com", password="x")
+        db.add(user)
+        db.commit()
+        worker_a, worker_b = UserCache(60, 10), UserCache(60, 10)  # 两个worker进程各自的缓存
+        assert worker_a.get_user(db, user.id, user.email).avatar_url is None
+
+        db.add(UserProfile(user_id=user.id, avatar_url="https://example.com/a.png"))
+        worker_b.invalidate(db, user.id)  # 另一进程修改资料
+        db.commit()
+
+        assert worker_a.get_user(db, user.id, user.email).avatar_url == "https://example.com/a.png"
+        cached = worker_a.get_user(db, user.id, user.email)
+        assert cached is worker_a.get_user(db, user.id, user.email)  # 版本号未变时复用快照
+    finally:
+        db.query(UserProfile).filter(UserProfile.user_id == user.id).delete()
+        db.query(User).filter(User.id == user.id).delete()
+        db.commit()
+        db.close()